@@ -0,0 +1,86 @@
+"""
+Import time profile of an entry point, as seen by a Lambda cold start.
+
+    python -m benchmarks.importtime --module lambda_handler --top 20
+
+Each run imports the module in a fresh interpreter with -X importtime and reports the
+wall time of the import and the slowest modules (cumulative, including their imports).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SCRIPT = "import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+
+
+def profile(module: str) -> tuple:
+    """
+    Import the module once in a fresh interpreter.
+
+    Returns:
+        tuple: (wall time in seconds, list of (module, self microseconds, cumulative microseconds))
+    """
+    # The background litellm preload would interleave with the profiled imports, it is off unless set
+    env = {**os.environ, "LAMBDA_PRELOAD_LITELLM": os.getenv("LAMBDA_PRELOAD_LITELLM", "false")}
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SCRIPT.format(module=module)],
+        capture_output=True, text=True, env=env
+    )
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1] if process.stderr.strip() else "import failed")
+
+    modules = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return float(process.stdout.strip().splitlines()[-1]), modules
+
+
+def top_level(modules: list) -> dict:
+    # Self time aggregated by top level package, e.g. all of botocore.* under botocore
+    packages = {}
+    for name, self_us, _ in modules:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    return packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time profile of an entry point")
+    parser.add_argument("--module", default="lambda_handler")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3, help="Imports to run, the median wall time is reported")
+    parser.add_argument("--json", help="Write the profile to this file")
+    args = parser.parse_args()
+
+    runs = [profile(args.module) for _ in range(args.repeat)]
+    wall_times = [wall_time for wall_time, _ in runs]
+    modules = runs[-1][1]
+    packages = sorted(top_level(modules).items(), key=lambda item: item[1], reverse=True)[:args.top]
+    slowest = sorted(modules, key=lambda item: item[2], reverse=True)[:args.top]
+
+    print(f"{args.module}: median import {statistics.median(wall_times) * 1000:.1f} ms over {args.repeat} runs, {len(modules)} modules")
+    print("\nby package (self ms)")
+    for package, self_us in packages:
+        print(f"  {self_us / 1000:9.1f}  {package}")
+    print("\nslowest imports (cumulative ms)")
+    for name, _, cumulative_us in slowest:
+        print(f"  {cumulative_us / 1000:9.1f}  {name}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "module": args.module,
+                "wall_times_ms": [round(wall_time * 1000, 2) for wall_time in wall_times],
+                "packages_ms": {package: self_us / 1000 for package, self_us in packages},
+                "modules": [{"module": name, "self_ms": self_us / 1000, "cumulative_ms": cumulative_us / 1000} for name, self_us, cumulative_us in modules]
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from core.planner import ALL_TOOLS, plan_tools
+from tools.tools import FUSED_SECTIONS
+
+# Canned results in the shapes the tools return
+SECTION_RESULTS = {
+    "sentiment": {"positive": 0.7, "negative": 0.2, "neutral": 0.1},
+    "topic": {"category": "Delivery", "score": 0.9},
+    "keywords": {"keywords": {"delivery": 0.9, "product": 0.8, "support": 0.4}},
+    "summary": {"summary": "Good product, late delivery.", "recommendations": ["Improve delivery times"]}
+}
+
+# Individual tool prompts by their opening words
+TOOL_PROMPTS = {
+    "Analyze the sentiment": "sentiment",
+    "Categorize the following": "topic",
+    "Extract context-aware keywords": "keywords",
+    "Summarize the following": "summary"
+}
+
+
+class LatencyModel:
+    """
+    Log-normal latency (seconds) around a median, the usual shape of network and LLM latencies.
+    scale multiplies every sample, e.g. 0.1 runs the whole benchmark ten times faster.
+    """
+    def __init__(self, median: float, sigma: float = 0.3, scale: float = 1.0, seed: int = 0) -> None:
+        self.median = median
+        self.sigma = sigma
+        self.scale = scale
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.sigma <= 0:
+                return self.median * self.scale
+            return self.median * math.exp(self._random.gauss(0, self.sigma)) * self.scale
+
+    def chance(self, rate: float) -> bool:
+        with self._lock:
+            return self._random.random() < rate
+
+
+class MockRateLimitError(Exception):
+    status_code = 429
+
+
+class MockServiceUnavailableError(Exception):
+    status_code = 503
+
+
+def _tool_call(name: str, arguments: dict) -> SimpleNamespace:
+    return SimpleNamespace(id=f"call_{name}", type="function", function=SimpleNamespace(name=name, arguments=json.dumps(arguments)))
+
+
+def _response(model: str, prompt: str, content: str = None, tool_calls: list = None) -> SimpleNamespace:
+    message = SimpleNamespace(role="assistant", content=content, tool_calls=tool_calls)
+    usage = SimpleNamespace(
+        prompt_tokens=len(prompt) // 4,
+        completion_tokens=len(content or json.dumps([vars(tool_call.function) for tool_call in tool_calls or []])) // 4,
+    )
+    usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+    return SimpleNamespace(
+        model=model,
+        choices=[SimpleNamespace(message=message, finish_reason="tool_calls" if tool_calls else "stop")],
+        usage=usage,
+        json=lambda: {"model": model, "content": content, "tool_calls": len(tool_calls or [])}
+    )
+
+
+def _json_block(output) -> str:
+    return f"```json\n{json.dumps(output)}\n```"
+
+
+class MockLLM:
+    """
+    Stand-in for litellm acompletion. It answers every prompt of the service
+    (master agent, sub agent, tools, fused and packed analysis) with well formed output.
+
+    Args:
+        latency (LatencyModel): Latency of each call.
+        error_rate (float): Share of calls failing with a 503.
+        rate_limit_rate (float): Share of calls failing with a 429.
+        script (dict): Optional tool names per agent, e.g. {"SubAgent": ["SummarizationTool"]}.
+            By default the sub agent picks the tools the instructions name (all four when none).
+    """
+    def __init__(self, latency: LatencyModel, error_rate: float = 0.0, rate_limit_rate: float = 0.0, script: dict = None) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.script = script or {}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _fail(self):
+        if self.latency.chance(self.rate_limit_rate):
+            raise MockRateLimitError("Mock rate limit exceeded")
+        if self.latency.chance(self.error_rate):
+            raise MockServiceUnavailableError("Mock service unavailable")
+
+    def respond(self, model: str, messages: list) -> SimpleNamespace:
+        # System prefix and user message
+        prompt = "\n".join(message["content"] for message in messages)
+
+        if prompt.startswith("You are a master agent"):
+            return _response(model, prompt, tool_calls=[_tool_call("SubAgent", {})])
+
+        if prompt.startswith("You are a specialized sub-agent"):
+            feedback = re.search(r"Feedback_text : (.*)", prompt).group(1).strip()
+            instructions = re.search(r"Instruction : (.*)", prompt).group(1).strip()
+            tool_names = self.script.get("SubAgent") or plan_tools(instructions) or ALL_TOOLS
+            return _response(model, prompt, tool_calls=[_tool_call(name, {"query": feedback}) for name in tool_names])
+
+        if "one object per item" in prompt:
+            sections = [section for section, _ in FUSED_SECTIONS.values() if f'"{section}": <{section} result>' in prompt]
+            items = [json.loads(line) for line in re.findall(r'^\s*(\{"id": .*\})\s*$', prompt, re.M)]
+            output = [{"id": item["id"], **{section: SECTION_RESULTS[section] for section in sections}} for item in items]
+            return _response(model, prompt, content=_json_block(output))
+
+        if "one entry per requested section" in prompt:
+            sections = [section for section, _ in FUSED_SECTIONS.values() if f'"{section}": <{section} result>' in prompt]
+            return _response(model, prompt, content=_json_block({section: SECTION_RESULTS[section] for section in sections}))
+
+        for opening, section in TOOL_PROMPTS.items():
+            if prompt.startswith(opening):
+                return _response(model, prompt, content=_json_block(SECTION_RESULTS[section]))
+        return _response(model, prompt, content="Hello! How can I help you with your feedback today?")
+
+    async def acompletion(self, model: str = "mock", messages: list = None, **kwargs):
+        with self._lock:
+            self.calls += 1
+        await asyncio.sleep(self.latency.sample())
+        self._fail()
+        return self.respond(model, messages)
+
+
+class MockDynamoDB:
+    """
+    In-memory stand-in for the FeedbackCache table (the low level client calls cache.py makes).
+    """
+    def __init__(self, latency: LatencyModel) -> None:
+        self.latency = latency
+        self.items = {}  # (feedback_id, cache_key) -> item
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _call(self) -> None:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency.sample())
+
+    @staticmethod
+    def _key(item: dict) -> tuple:
+        return item["feedback_id"]["S"], item["cache_key"]["S"]
+
+    def put_item(self, TableName: str, Item: dict, **kwargs) -> dict:
+        self._call()
+        with self._lock:
+            self.items[self._key(Item)] = Item
+        return {}
+
+    def get_item(self, TableName: str, Key: dict, **kwargs) -> dict:
+        self._call()
+        with self._lock:
+            item = self.items.get(self._key(Key))
+        return {"Item": item} if item else {}
+
+    def query(self, TableName: str, ExpressionAttributeValues: dict, **kwargs) -> dict:
+        self._call()
+        feedback_id = ExpressionAttributeValues[":fid"]["S"]
+        with self._lock:
+            return {"Items": [item for (partition, _), item in self.items.items() if partition == feedback_id]}
+
+    def batch_write_item(self, RequestItems: dict, **kwargs) -> dict:
+        self._call()
+        with self._lock:
+            for requests in RequestItems.values():
+                for request in requests:
+                    self.items[self._key(request["PutRequest"]["Item"])] = request["PutRequest"]["Item"]
+        return {"UnprocessedItems": {}}
+
+    def batch_get_item(self, RequestItems: dict, **kwargs) -> dict:
+        self._call()
+        with self._lock:
+            return {"Responses": {
+                table: [self.items[self._key(key)] for key in request["Keys"] if self._key(key) in self.items]
+                for table, request in RequestItems.items()
+            }}
+
+    def clear(self) -> None:
+        with self._lock:
+            self.items.clear()
+
+
+class MockBedrock:
+    """
+    Stand-in for bedrock-runtime apply_guardrail, intervening on the configured terms.
+    """
+    def __init__(self, latency: LatencyModel, blocked_terms: tuple = ("attack", "violence")) -> None:
+        self.latency = latency
+        self.blocked_pattern = re.compile("|".join(re.escape(term) for term in blocked_terms), re.I)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def apply_guardrail(self, content: list, **kwargs) -> dict:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency.sample())
+        text = " ".join(block["text"]["text"] for block in content)
+        if self.blocked_pattern.search(text):
+            return {
+                "action": "GUARDRAIL_INTERVENED",
+                "assessments": [{"contentPolicy": {"filters": [
+                    {"type": "VIOLENCE", "confidence": "HIGH", "filterStrength": "HIGH", "action": "BLOCKED"}
+                ]}}]
+            }
+        return {"action": "NONE", "assessments": []}
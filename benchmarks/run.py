@@ -0,0 +1,271 @@
+"""
+Offline benchmark of the service with a mock LLM, DynamoDB and guardrail.
+
+    python -m benchmarks.run --scenario all --target both --requests 100 --concurrency 16
+
+Configuration is read from the environment as in production, e.g.
+PLANNER_ENABLED=false or GUARD_SPECULATIVE=true, so configurations can be compared run by run.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from benchmarks.mocks import LatencyModel, MockLLM, MockDynamoDB, MockBedrock
+
+SCENARIOS = ("single", "batch50", "cache_hot", "cache_cold", "mixed")
+TARGETS = ("app", "lambda")
+
+FEEDBACK_TEXTS = [
+    "The product quality is great but the delivery was slow.",
+    "Customer support was helpful and solved my issue quickly.",
+    "The app keeps crashing after the latest update, very disappointing.",
+    "Love the design and the battery life, would recommend to friends.",
+    "The package arrived damaged and the refund took two weeks.",
+    "Good value for the price, the material feels cheap though.",
+    "Checkout was confusing and I could not apply my discount code.",
+    "Excellent service, fast shipping and easy returns."
+]
+INSTRUCTIONS = [
+    "Perform sentiment analysis, categorize the topic, extract keywords and summarize the feedback.",
+    "Perform sentiment analysis on the feedback.",
+    "Summarize the feedback and extract the keywords."
+]
+
+
+class _Handler:
+    # Stand-in for the queue handler the Lambda flushes after each invocation
+    def flush(self) -> None:
+        pass
+
+
+def null_logger() -> logging.Logger:
+    # Records are still created at INFO, so their cost stays in the measurement
+    logger = logging.getLogger("benchmark")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.handlers = [logging.NullHandler()]
+    return logger
+
+
+def make_record(index: int, unique: bool = True) -> dict:
+    text = FEEDBACK_TEXTS[index % len(FEEDBACK_TEXTS)]
+    return {
+        "feedback_id": f"bench-{index}",
+        "customer_name": "Benchmark",
+        "feedback_text": f"{text} (order {index})" if unique else text,
+        "timestamp": datetime(2024, 1, 1).isoformat(),
+        "instructions": INSTRUCTIONS[index % len(INSTRUCTIONS)]
+    }
+
+
+def percentile(values: list, pct: float) -> float:
+    # Nearest rank
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))]
+
+
+def install(args) -> dict:
+    """
+    Patch the LLM and AWS clients with the mocks, before the service modules create the real ones.
+    """
+    from utils import aws_clients
+    import core.llm
+
+    scale = args.time_scale
+    mocks = {
+        "llm": MockLLM(
+            LatencyModel(args.llm_latency, args.llm_sigma, scale, args.seed),
+            error_rate=args.llm_error_rate,
+            rate_limit_rate=args.llm_rate_limit_rate
+        ),
+        "dynamodb": MockDynamoDB(LatencyModel(args.dynamodb_latency, 0.2, scale, args.seed + 1)),
+        "guardrail": MockBedrock(LatencyModel(args.guardrail_latency, 0.25, scale, args.seed + 2))
+    }
+    core.llm.acompletion = mocks["llm"].acompletion
+    aws_clients._clients["dynamodb"] = mocks["dynamodb"]
+    aws_clients._clients["bedrock-runtime"] = mocks["guardrail"]
+    return mocks
+
+
+def reset(mocks: dict) -> None:
+    # Every scenario starts from empty caches
+    from cache.cache import memory_cache
+    from guard.gatekeeper import verdict_cache
+
+    memory_cache.clear()
+    verdict_cache.clear()
+    mocks["dynamodb"].clear()
+
+
+def build_operations(scenario: str, args) -> tuple:
+    """
+    Returns:
+        tuple: (warmup operations, measured operations, concurrency), an operation is
+        ("single", record) or ("batch", [records]).
+    """
+    rng = random.Random(args.seed)
+    n = args.requests
+    if scenario == "single":
+        return [], [("single", make_record(i)) for i in range(n)], 1
+    if scenario == "cache_cold":
+        return [], [("single", make_record(i)) for i in range(n)], args.concurrency
+    if scenario == "batch50":
+        batches = max(1, n // 50)
+        return [], [("batch", [make_record(b * 50 + i) for i in range(50)]) for b in range(batches)], args.concurrency
+
+    hot = [make_record(i) for i in range(args.hot_set)]
+    warmup = [("single", record) for record in hot]
+    if scenario == "cache_hot":
+        return warmup, [("single", rng.choice(hot)) for _ in range(n)], args.concurrency
+    # mixed: a share of repeated records, the rest new
+    operations = [
+        ("single", rng.choice(hot)) if rng.random() < args.hot_ratio else ("single", make_record(args.hot_set + i))
+        for i in range(n)
+    ]
+    return warmup, operations, args.concurrency
+
+
+def count_errors(response: dict) -> int:
+    if "output" in response:
+        return sum(1 for result in response["output"] if not isinstance(result, dict) or "error" in result)
+    return 1 if "error" in response else 0
+
+
+async def run_app(operations: list, concurrency: int) -> tuple:
+    import httpx
+    import main
+    from utils.event_loop import install_executor, set_loop
+
+    # The ASGI transport does not run the lifespan, set up what it would
+    main.logger = null_logger()
+    install_executor()
+    set_loop(asyncio.get_running_loop())
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://benchmark", timeout=None) as client:
+        async def execute(operation):
+            nonlocal errors
+            kind, payload = operation
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    if kind == "batch":
+                        response = await client.post("/batch-invoke", json={"requests": payload})
+                    else:
+                        response = await client.post("/invoke", json=payload)
+                    errors += count_errors(response.json())
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[execute(operation) for operation in operations])
+        return latencies, errors, time.perf_counter() - start
+
+
+def run_lambda(operations: list, concurrency: int) -> tuple:
+    import lambda_handler
+    from config import metrics_config
+
+    lambda_handler.logger, lambda_handler.cloudwatch_handler = null_logger(), _Handler()
+    metrics_config["emf_enabled"] = False
+    latencies, errors = [], 0
+
+    def execute(operation):
+        kind, payload = operation
+        event = {
+            "path": "/invoke-agent",
+            "httpMethod": "POST",
+            "body": json.dumps({"stream": "BatchInvoke" if kind == "batch" else "SingleInvoke", "request": payload})
+        }
+        start = time.perf_counter()
+        try:
+            response = json.loads(lambda_handler.lambda_handler(event, None)["body"])
+            failed = count_errors(response)
+        except Exception:
+            failed = 1
+        return time.perf_counter() - start, failed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency, failed in pool.map(execute, operations):
+            latencies.append(latency)
+            errors += failed
+    return latencies, errors, time.perf_counter() - start
+
+
+def run_scenario(scenario: str, target: str, args, mocks: dict) -> dict:
+    reset(mocks)
+    warmup, operations, concurrency = build_operations(scenario, args)
+    runner = run_lambda if target == "lambda" else (lambda ops, workers: asyncio.run(run_app(ops, workers)))
+    if warmup:
+        runner(warmup, concurrency)
+
+    calls = {name: mock.calls for name, mock in mocks.items()}
+    latencies, errors, elapsed = runner(operations, concurrency)
+    records = sum(len(payload) if kind == "batch" else 1 for kind, payload in operations)
+    return {
+        "scenario": scenario,
+        "target": target,
+        "operations": len(operations),
+        "records": records,
+        "concurrency": concurrency,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        "req_per_s": round(len(operations) / elapsed, 2) if elapsed else 0.0,
+        "records_per_s": round(records / elapsed, 2) if elapsed else 0.0,
+        **{f"{name}_calls": mock.calls - calls[name] for name, mock in mocks.items()}
+    }
+
+
+def print_report(results: list) -> None:
+    columns = ["scenario", "target", "operations", "errors", "p50_ms", "p95_ms", "p99_ms", "mean_ms",
+               "req_per_s", "records_per_s", "llm_calls", "dynamodb_calls", "guardrail_calls"]
+    widths = {column: max(len(column), *(len(str(result[column])) for result in results)) for column in columns}
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for result in results:
+        print("  ".join(str(result[column]).ljust(widths[column]) for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark with a mock LLM, DynamoDB and guardrail")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--target", choices=TARGETS + ("both",), default="app")
+    parser.add_argument("--requests", type=int, default=100, help="Measured requests per scenario (records for batch50)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--hot-set", type=int, default=20, help="Distinct records of the cache_hot and mixed scenarios")
+    parser.add_argument("--hot-ratio", type=float, default=0.5, help="Share of repeated records in the mixed scenario")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Median LLM latency in seconds")
+    parser.add_argument("--llm-sigma", type=float, default=0.35)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--guardrail-latency", type=float, default=0.15)
+    parser.add_argument("--dynamodb-latency", type=float, default=0.005)
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiplier of every mock latency")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    mocks = install(args)
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    targets = TARGETS if args.target == "both" else (args.target,)
+    results = [run_scenario(scenario, target, args, mocks) for target in targets for scenario in scenarios]
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,76 +1,370 @@
-import boto3
+import asyncio
+import contextvars
+import hashlib
 import json
 import os
+import random
+import threading
+import time
 from datetime import datetime
+from config import cache_config, llm_config, aws_config
+from cache.memory_cache import MemoryCache, MISS, NEGATIVE
+from utils.aws_clients import get_client
+from utils.metrics import metrics
+from core.prompts import prompt_version
+
+# L1: in-process cache in front of the DynamoDB (L2) table
+memory_cache = MemoryCache(
+    max_entries=cache_config["l1_max_entries"],
+    max_bytes=cache_config["l1_max_bytes"],
+    ttl=cache_config["ttl"],
+    negative_ttl=cache_config["l1_negative_ttl"]
+)
+
+cache_stats = {
+    "l1": {"hits": 0, "misses": 0, "negative_hits": 0},
+    "l2": {"hits": 0, "misses": 0, "errors": 0}
+}
+_stats_lock = threading.Lock()
+
+# DynamoDB limit of keys per batch_get_item call
+BATCH_GET_MAX_KEYS = 100
+
+# Set while an agent runs speculatively (before the guardrail cleared the request):
+# tool cache writes are collected here and only stored once the request is cleared
+deferred_writes = contextvars.ContextVar("deferred_writes", default=None)
+
+
+def _record(tier: str, outcome: str) -> None:
+    with _stats_lock:
+        cache_stats[tier][outcome] += 1
+    metrics.inc("cache_requests_total", tier=tier, outcome=outcome)
+
+
+def get_cache_stats() -> dict:
+    """
+    Return the hit/miss counters per tier and the L1 occupancy.
+    """
+    with _stats_lock:
+        stats = {tier: dict(counters) for tier, counters in cache_stats.items()}
+    stats["l1"].update(memory_cache.stats())
+    return stats
+
+
+def build_cache_key(feedback_text: str, instructions: str) -> str:
+    """
+    Build the cache key for a request.
+
+    In "feedback_id" mode the key is the hash of the raw text, instructions and prompt version and is scoped to the feedback_id.
+    In "content" mode the text and instructions are normalized (whitespace collapsed, case folded) and
+    hashed together with the model and prompt version, so identical feedback shares one result across feedback_ids.
+    """
+    if cache_config["mode"] != "content":
+        cache_key_name = f"{feedback_text}_and_{instructions}_and_{prompt_version()}"
+        return hashlib.sha256(cache_key_name.encode()).hexdigest()
+
+    normalize = lambda text: " ".join((text or "").split()).casefold()
+    cache_key_name = "\x1f".join([
+        normalize(feedback_text),
+        normalize(instructions),
+        llm_config["model"],
+        prompt_version()
+    ])
+    return hashlib.sha256(cache_key_name.encode()).hexdigest()
+
+
+def _partition_key(feedback_id: str, cache_key: str) -> str:
+    # Content addressed results live under their own partition, the feedback_id only holds an alias
+    if cache_config["mode"] == "content":
+        return f"content#{cache_key}"
+    return feedback_id
+
+
+def _put_cached_item(partition_key: str, cache_key: str, cached_result, ttl_seconds: int, alias_id: str = None) -> str:
+    """
+    Write an item to the L1 cache and the DynamoDB table (write-through).
+    When alias_id is given an alias item pointing at the partition is written as well.
+    """
+    TABLE_NAME = "FeedbackCache"
+
+    last_updated = datetime.now().isoformat()
+    ttl = int(datetime.now().timestamp()) + ttl_seconds
+
+    if cache_config["l1_enabled"]:
+        memory_cache.set(
+            f"{partition_key}#{cache_key}",
+            {cache_key: {"cached_result": cached_result, "last_updated": last_updated}},
+            ttl=ttl_seconds
+        )
+
+    dynamodb = get_client("dynamodb")
+
+    item = {
+        "feedback_id": {"S": partition_key},
+        "cache_key": {"S": cache_key},
+        "cached_result": {"S": json.dumps(cached_result)},
+        "last_updated": {"S": last_updated},
+        "ttl": {"N": str(ttl)}
+    }
+    dynamodb.put_item(TableName=TABLE_NAME, Item=item)
+    if alias_id is not None:
+        # Written after the result, so an alias never points at a missing item
+        alias = {
+            "feedback_id": {"S": alias_id},
+            "cache_key": {"S": cache_key},
+            "alias_of": {"S": partition_key},
+            "last_updated": {"S": last_updated},
+            "ttl": {"N": str(ttl)}
+        }
+        dynamodb.put_item(TableName=TABLE_NAME, Item=alias)
+    return last_updated
+
+
+def _batch_get_items(dynamodb, table_name: str, keys: list) -> list:
+    """
+    Read items by key with batch_get_item, BATCH_GET_MAX_KEYS keys per call. Unprocessed keys
+    (throttling) are read again with jittered backoff, up to aws_config max_attempts times.
+    """
+    items = []
+    for start in range(0, len(keys), BATCH_GET_MAX_KEYS):
+        request = {table_name: {"Keys": keys[start:start + BATCH_GET_MAX_KEYS]}}
+        for attempt in range(aws_config["max_attempts"]):
+            if attempt:
+                time.sleep(random.uniform(0, min(1, 0.05 * 2 ** attempt)))
+            response = dynamodb.batch_get_item(RequestItems=request)
+            items.extend(response.get("Responses", {}).get(table_name, []))
+            request = response.get("UnprocessedKeys") or {}
+            if not request:
+                break
+        else:
+            raise RuntimeError(f"{len(request[table_name]['Keys'])} keys still unprocessed after {aws_config['max_attempts']} attempts")
+    return items
+
+
+def _get_l1_item(partition_key: str, cache_key: str):
+    """
+    Read an item from the L1 cache only, MISS when the DynamoDB table has to be read.
+    It never blocks, the async path calls it on the event loop.
+    """
+    if not cache_config["l1_enabled"]:
+        return MISS
+    cached = memory_cache.get(f"{partition_key}#{cache_key}")
+    if cached is NEGATIVE:
+        _record("l1", "negative_hits")
+        return None
+    if cached is not MISS:
+        _record("l1", "hits")
+        return cached
+    _record("l1", "misses")
+    return MISS
+
+
+def _get_cached_item(partition_key: str, cache_key: str, ttl_seconds: int, l1: bool = True):
+    """
+    Read an item from the L1 cache first and then the DynamoDB table (read-through).
+    l1=False skips the L1 lookup when the caller already missed it.
+    """
+    TABLE_NAME = "FeedbackCache"
+    l1_key = f"{partition_key}#{cache_key}"
+
+    if l1:
+        cached = _get_l1_item(partition_key, cache_key)
+        if cached is not MISS:
+            return cached
+
+    dynamodb = get_client("dynamodb")
+
+    response = dynamodb.get_item(
+        TableName=TABLE_NAME,
+        Key={
+            "feedback_id": {"S": partition_key},
+            "cache_key": {"S": cache_key}
+        }
+    )
+    if "Item" in response:
+        _record("l2", "hits")
+        output = {
+            response["Item"]["cache_key"]["S"]: {
+                "cached_result": json.loads(response["Item"]["cached_result"]["S"]),
+                "last_updated": response["Item"]["last_updated"]["S"]
+            }
+        }
+        if cache_config["l1_enabled"]:
+            # Do not keep the entry in L1 longer than it lives in DynamoDB
+            l1_ttl = ttl_seconds
+            if "ttl" in response["Item"]:
+                l1_ttl = min(l1_ttl, max(int(response["Item"]["ttl"]["N"]) - datetime.now().timestamp(), 0))
+            memory_cache.set(l1_key, output, ttl=l1_ttl)
+        return output
+    _record("l2", "misses")
+    if cache_config["l1_enabled"]:
+        memory_cache.set_negative(l1_key)
+    return None
 
 
 def store_feedback_cache(feedback_id, cache_key, cached_result, logger):
     """
-    Store the feedback cache in the DynamoDB table.
+    Store the feedback cache in the L1 cache and the DynamoDB table.
     """
     try:
-        TABLE_NAME = "FeedbackCache"
-        dynamodb = boto3.client("dynamodb", region_name="us-east-1")
-        
-        last_updated = datetime.now().isoformat()
-        ttl = int(datetime.now().timestamp()) + 60  # 1 minute
-
-        dynamodb.put_item(
-            TableName=TABLE_NAME,
-            Item={
-                "feedback_id": {"S": feedback_id},
-                "cache_key": {"S": cache_key},
-                "cached_result": {"S": json.dumps(cached_result)},
-                "last_updated": {"S": last_updated},
-                "ttl": {"N": str(ttl)}
-            }
+        partition_key = _partition_key(feedback_id, cache_key)
+        return _put_cached_item(
+            partition_key,
+            cache_key,
+            cached_result,
+            ttl_seconds=cache_config["ttl"],
+            alias_id=feedback_id if partition_key != feedback_id else None
         )
-        return last_updated
     except Exception as e:
         logger.error(f"Error storing feedback cache for feedback_id: {feedback_id} with cache_key: {cache_key} with error: {e}")
 
-def retrieve_feedback_cache(feedback_id: str, cache_key=None, logger=None):
+def retrieve_feedback_cache(feedback_id: str, cache_key=None, logger=None, l1: bool = True):
     """
-    Retrieve the feedback cache from the DynamoDB table.
+    Retrieve the feedback cache, from the L1 cache first and then the DynamoDB table.
     """
     try:
         TABLE_NAME = "FeedbackCache"
 
-        dynamodb = boto3.client("dynamodb", region_name="us-east-1")
-        
         if cache_key:
-            response = dynamodb.get_item(
-                TableName=TABLE_NAME,
-                Key={
-                    "feedback_id": {"S": feedback_id},
-                    "cache_key": {"S": cache_key}
-                }
-            )
-            if "Item" in response:
-                return {
-                    response["Item"]["cache_key"]["S"]: {
-                        "cached_result": json.loads(response["Item"]["cached_result"]["S"]),
-                        "last_updated": response["Item"]["last_updated"]["S"]
-                    }
-                }
-            return None
+            return _get_cached_item(_partition_key(feedback_id, cache_key), cache_key, ttl_seconds=cache_config["ttl"], l1=l1)
         
         else:
+            dynamodb = get_client("dynamodb")
             response = dynamodb.query(
                 TableName=TABLE_NAME,
                 KeyConditionExpression="feedback_id = :fid",
                 ExpressionAttributeValues={":fid": {"S": feedback_id}}
             )
+            items = response.get("Items", [])
+
+            # Resolve content addressed aliases to their results
+            aliases = [item for item in items if "alias_of" in item]
+            if aliases:
+                resolved = _batch_get_items(
+                    dynamodb,
+                    TABLE_NAME,
+                    [{"feedback_id": item["alias_of"], "cache_key": item["cache_key"]} for item in aliases]
+                )
+                items = [item for item in items if "alias_of" not in item]
+                items.extend(resolved)
+
             output = {
                 item["cache_key"]["S"]: {
                     "cached_result": json.loads(item["cached_result"]["S"]),
                     "last_updated": item["last_updated"]["S"]
-                } for item in response.get("Items", [])
+                } for item in items
             }
             if output:
                 return output
             else:
                 return None
     except Exception as e:
+        _record("l2", "errors")
         logger.error(f"Error retrieving feedback cache for feedback_id: {feedback_id} with cache_key: {cache_key} with error: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+async def astore_feedback_cache(feedback_id, cache_key, cached_result, logger):
+    """
+    Async version of store_feedback_cache, the boto3 call runs on a worker thread.
+    """
+    return await asyncio.to_thread(store_feedback_cache, feedback_id, cache_key, cached_result, logger)
+
+
+async def aretrieve_feedback_cache(feedback_id: str, cache_key=None, logger=None):
+    """
+    Async version of retrieve_feedback_cache. L1 hits are served on the event loop,
+    only the boto3 call runs on a worker thread.
+    """
+    if cache_key:
+        cached = _get_l1_item(_partition_key(feedback_id, cache_key), cache_key)
+        if cached is not MISS:
+            return cached
+        return await asyncio.to_thread(retrieve_feedback_cache, feedback_id, cache_key, logger, False)
+    return await asyncio.to_thread(retrieve_feedback_cache, feedback_id, cache_key, logger)
+
+
+def build_tool_cache_key(tool_name: str, query: str) -> str:
+    """
+    Build the cache key for a single tool (or routing) result: tool name, normalized input, model and prompt version.
+    """
+    cache_key_name = "\x1f".join([
+        tool_name,
+        " ".join((query or "").split()).casefold(),
+        llm_config["model"],
+        prompt_version()
+    ])
+    return hashlib.sha256(cache_key_name.encode()).hexdigest()
+
+
+def retrieve_tool_cache(tool_name: str, query: str, logger=None, l1: bool = True):
+    """
+    Retrieve a cached tool result, None when it is missing.
+    """
+    try:
+        if not cache_config["tool_cache_enabled"]:
+            return None
+        cache_key = build_tool_cache_key(tool_name, query)
+        cached = _get_cached_item(f"tool#{cache_key}", cache_key, ttl_seconds=cache_config["tool_ttl"], l1=l1)
+        if cached:
+            return cached[cache_key]["cached_result"]
+        return None
+    except Exception as e:
+        _record("l2", "errors")
+        logger.error(f"Error retrieving tool cache for tool: {tool_name} with error: {e}")
+        return None
+
+
+def store_tool_cache(tool_name: str, query: str, result, logger=None):
+    """
+    Store a tool result, failed results are never cached.
+    """
+    try:
+        if not cache_config["tool_cache_enabled"]:
+            return None
+        if isinstance(result, dict) and "error" in result:
+            return None
+        writes = deferred_writes.get()
+        if writes is not None:
+            writes.append((tool_name, query, result))
+            return None
+        cache_key = build_tool_cache_key(tool_name, query)
+        return _put_cached_item(f"tool#{cache_key}", cache_key, result, ttl_seconds=cache_config["tool_ttl"])
+    except Exception as e:
+        logger.error(f"Error storing tool cache for tool: {tool_name} with error: {e}")
+
+
+def flush_deferred_writes(writes: list, logger=None):
+    """
+    Store the tool cache writes held back during a speculative run.
+    """
+    for tool_name, query, result in writes:
+        store_tool_cache(tool_name, query, result, logger)
+
+
+async def aretrieve_tool_cache(tool_name: str, query: str, logger=None):
+    """
+    Async version of retrieve_tool_cache. L1 hits are served on the event loop,
+    only the boto3 call runs on a worker thread.
+    """
+    if not cache_config["tool_cache_enabled"]:
+        return None
+    cache_key = build_tool_cache_key(tool_name, query)
+    cached = _get_l1_item(f"tool#{cache_key}", cache_key)
+    if cached is not MISS:
+        return cached[cache_key]["cached_result"] if cached else None
+    return await asyncio.to_thread(retrieve_tool_cache, tool_name, query, logger, False)
+
+
+async def astore_tool_cache(tool_name: str, query: str, result, logger=None):
+    """
+    Async version of store_tool_cache, the boto3 call runs on a worker thread.
+    """
+    return await asyncio.to_thread(store_tool_cache, tool_name, query, result, logger)
+
+
+async def aflush_deferred_writes(writes: list, logger=None):
+    """
+    Async version of flush_deferred_writes, the boto3 calls run on a worker thread.
+    """
+    return await asyncio.to_thread(flush_deferred_writes, writes, logger)
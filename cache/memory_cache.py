@@ -0,0 +1,73 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Sentinels returned by MemoryCache.get
+MISS = object()
+NEGATIVE = object()
+
+
+class MemoryCache:
+    """
+    In-process LRU cache with per-entry TTL, bounded by entry count and total bytes.
+    It also remembers recent misses (negative entries) for a short TTL.
+    """
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024, ttl: float = 60, negative_ttl: float = 5) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _pop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        """
+        Return the cached value, NEGATIVE for a remembered miss or MISS.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISS
+            expires_at, _, value = entry
+            if expires_at <= time.monotonic():
+                self._pop(key)
+                return MISS
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None) -> None:
+        size = len(json.dumps(value, default=str)) if value is not NEGATIVE else 0
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (expires_at, size, value)
+            self._bytes += size
+            # Evict least recently used entries until both bounds hold
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def set_negative(self, key) -> None:
+        self.set(key, NEGATIVE, ttl=self.negative_ttl)
+
+    def delete(self, key) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
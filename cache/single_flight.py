@@ -0,0 +1,94 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one in-flight computation.
+    The first caller (leader) runs the function, concurrent callers with the same key
+    wait for it and receive the same result. Nothing is kept once the call completes.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+        self._waiters = {}  # task -> number of coroutines awaiting it
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Run fn once for all threads calling with the same key.
+
+        Returns:
+            tuple: (result, shared) where shared is True for callers that did not run fn.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result, False
+
+    async def ado(self, key, coro_fn, *args, **kwargs):
+        """
+        Run coro_fn once for all coroutines awaiting the same key on the event loop.
+        The computation runs as its own task, so a cancelled caller (e.g. a timed out
+        batch record) does not cancel it for the others. A caller whose computation was
+        cancelled for another caller (see cancel) starts it again.
+
+        Returns:
+            tuple: (result, shared) where shared is True for callers that did not start coro_fn.
+        """
+        while True:
+            task = self._tasks.get(key)
+            shared = task is not None and not task.done()
+            if not shared:
+                task = asyncio.ensure_future(coro_fn(*args, **kwargs))
+                self._tasks[key] = task
+                task.add_done_callback(lambda done: self._tasks.pop(key) if self._tasks.get(key) is done else None)
+            self._waiters[task] = self._waiters.get(task, 0) + 1
+            try:
+                return await asyncio.shield(task), shared
+            except asyncio.CancelledError:
+                if task.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+            finally:
+                self._waiters[task] -= 1
+                if not self._waiters[task]:
+                    del self._waiters[task]
+
+    def cancel(self, key) -> bool:
+        """
+        Cancel the in-flight async computation for key (e.g. a speculative run the guardrail
+        blocked), only when the caller is its sole waiter: a run other requests are awaiting
+        is left to complete for them.
+        """
+        task = self._tasks.get(key)
+        if task is None or self._waiters.get(task, 0) > 1:
+            return False
+        return task.cancel()
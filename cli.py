@@ -0,0 +1,50 @@
+import argparse
+import asyncio
+import sys
+import main as service
+from config import batch_config
+from core.batch import BatchExecutor
+from customLogger.cw_logger import setup_cloudwatch_logger
+from utils.aws_clients import warm_clients
+from utils.event_loop import install_executor, set_loop
+from utils.jsonl import iter_jsonl_file, to_ndjson
+
+
+async def process_file(input_path: str, output, max_workers: int) -> None:
+    install_executor()
+    set_loop(asyncio.get_running_loop())
+    batch_executor = BatchExecutor(max_workers=max_workers, record_timeout=batch_config["record_timeout"], logger=service.logger)
+    async for index, result in batch_executor.astream(iter_jsonl_file(input_path), service.process_jsonl_record):
+        output.write(to_ndjson(index, result))
+        output.flush()
+
+
+def main() -> None:
+    """
+    Offline batch processing: reads a JSONL file (one request per line) and writes the
+    results as NDJSON lines as each record completes.
+
+    Usage: python cli.py feedback.jsonl -o results.ndjson
+    """
+    parser = argparse.ArgumentParser(description="Process a JSONL file of feedback requests")
+    parser.add_argument("input", help="Path of the JSONL input file")
+    parser.add_argument("-o", "--output", help="Path of the NDJSON output file, defaults to stdout")
+    parser.add_argument("-w", "--workers", type=int, default=batch_config["max_workers"], help="Number of records processed concurrently")
+    args = parser.parse_args()
+
+    # Same setup as the FastAPI lifespan, without the job worker
+    service.logger, cloudwatch_handler = setup_cloudwatch_logger()
+    warm_clients()
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        asyncio.run(process_file(args.input, output, args.workers))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        service.logger.removeHandler(cloudwatch_handler)
+        cloudwatch_handler.close()
+
+
+if __name__ == "__main__":
+    main()
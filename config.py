@@ -1,4 +1,5 @@
 from dotenv import load_dotenv
+import json
 import os   
 
 # Model Config
@@ -9,4 +10,169 @@ llm_config = {
     "api_key": os.getenv("AZURE_API_KEY"),
     "base_url": os.getenv("AZURE_ENDPOINT"),
     "api_version": os.getenv("AZURE_API_VERSION")
-}
\ No newline at end of file
+}
+
+# Rate Limit Config
+# Provider quota of the deployment, a limit of 0 is not metered
+rate_limit_config = {
+    "rpm": int(os.getenv("LLM_RPM", 0)),
+    "tpm": int(os.getenv("LLM_TPM", 0)),
+    "burst_seconds": float(os.getenv("LLM_BURST_SECONDS", 5)),
+    # Completion tokens reserved per call when max_tokens is not set
+    "completion_tokens": int(os.getenv("LLM_COMPLETION_TOKENS", 500)),
+    # Share of the budget batch calls leave to /invoke
+    "batch_reserve": float(os.getenv("LLM_BATCH_RESERVE", 0.2)),
+    "min_scale": float(os.getenv("LLM_MIN_SCALE", 0.1)),
+    "increase": float(os.getenv("LLM_RATE_INCREASE", 0.05)),
+    "decrease": float(os.getenv("LLM_RATE_DECREASE", 0.5)),
+    # Calls slower than this (seconds) count as overload, 0 disables the latency signal
+    "latency_threshold": float(os.getenv("LLM_LATENCY_THRESHOLD", 0)),
+    # Pause after a 429 without a retry-after header
+    "cooldown": float(os.getenv("LLM_COOLDOWN", 1))
+}
+
+# Resilience Config
+resilience_config = {
+    # Deployments as a JSON list, each entry overrides llm_config keys (model, api_key, base_url, api_version)
+    # and may set a routing weight. An empty entry {} is the llm_config deployment itself.
+    "deployments": json.loads(os.getenv("LLM_DEPLOYMENTS", "[{}]")),
+    "max_retries": int(os.getenv("LLM_MAX_RETRIES", 2)),
+    "backoff_base": float(os.getenv("LLM_BACKOFF_BASE", 0.5)),
+    "backoff_max": float(os.getenv("LLM_BACKOFF_MAX", 8)),
+    # A failing deployment gets no traffic for this long while others are healthy
+    "failover_cooldown": float(os.getenv("LLM_FAILOVER_COOLDOWN", 30)),
+    # Send a second request when the first is slower than the latency percentile
+    "hedge_enabled": os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true",
+    "hedge_percentile": float(os.getenv("LLM_HEDGE_PERCENTILE", 95)),
+    "hedge_min_delay": float(os.getenv("LLM_HEDGE_MIN_DELAY", 2)),
+    "hedge_min_samples": int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))
+}
+
+# Logging Config
+logging_config = {
+    # Comma separated sinks: "cloudwatch", "stdout" (local development, Lambda log capture) or "file".
+    # Lambda ships stdout to CloudWatch itself, a cloudwatch sink there would block every response on its flush.
+    "sinks": [sink.strip() for sink in os.getenv("LOG_SINKS", "stdout" if os.getenv("AWS_LAMBDA_FUNCTION_NAME") else "cloudwatch").split(",") if sink.strip()],
+    "file_path": os.getenv("LOG_FILE_PATH", "feedback-analysis.log"),
+    "level": os.getenv("LOG_LEVEL", "INFO").upper(),
+    "json": os.getenv("LOG_JSON", "true").lower() == "true",
+    "queue_size": int(os.getenv("LOG_QUEUE_SIZE", 10000)),
+    # Seconds between CloudWatch batches
+    "send_interval": float(os.getenv("LOG_SEND_INTERVAL", 5)),
+    # Longer messages are truncated, payload_sample_rate of them are kept whole
+    "max_message_chars": int(os.getenv("LOG_MAX_MESSAGE_CHARS", 2000)),
+    "payload_sample_rate": float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", 0.01))
+}
+
+# Metrics Config
+metrics_config = {
+    "namespace": os.getenv("METRICS_NAMESPACE", "FeedbackAnalysis"),
+    # Emit one embedded metric format record per Lambda invocation
+    "emf_enabled": os.getenv("METRICS_EMF_ENABLED", "true").lower() == "true",
+    # Price of the deployment, used for the estimated cost counter
+    "prompt_cost_per_1k": float(os.getenv("LLM_PROMPT_COST_PER_1K", 0)),
+    "completion_cost_per_1k": float(os.getenv("LLM_COMPLETION_COST_PER_1K", 0))
+}
+
+# Batch Config
+# Default worker count: number of cores on the machine * 2 (requests are I/O bound)
+batch_config = {
+    "max_workers": int(os.getenv("BATCH_MAX_WORKERS", (os.cpu_count() or 1) * 2)),
+    "record_timeout": float(os.getenv("BATCH_RECORD_TIMEOUT", 120))
+}
+
+# Tool Executor Config
+tool_executor_config = {
+    "parallel": os.getenv("TOOL_EXECUTOR_PARALLEL", "true").lower() == "true",
+    "max_concurrency": int(os.getenv("TOOL_EXECUTOR_MAX_CONCURRENCY", 4)),
+    # Run the analysis tools sharing one feedback text as a single fused completion
+    "fused": os.getenv("TOOL_EXECUTOR_FUSED", "false").lower() == "true",
+    # Pack the analysis of several batch records into one completion
+    "packed": os.getenv("TOOL_EXECUTOR_PACKED", "false").lower() == "true",
+    "packed_max_items": int(os.getenv("TOOL_EXECUTOR_PACKED_MAX_ITEMS", 10)),
+    "packed_max_tokens": int(os.getenv("TOOL_EXECUTOR_PACKED_MAX_TOKENS", 4000)),
+    "packed_window": float(os.getenv("TOOL_EXECUTOR_PACKED_WINDOW", 0.05)),
+    # Provider JSON mode of the tool completions: "off", "json_object" or "json_schema"
+    "json_mode": os.getenv("TOOL_JSON_MODE", "off").lower(),
+    # One repair completion for malformed tool output, only the output is sent back
+    "json_repair": os.getenv("TOOL_JSON_REPAIR", "true").lower() == "true",
+    "json_repair_max_chars": int(os.getenv("TOOL_JSON_REPAIR_MAX_CHARS", 8000)),
+    # Modules registering extra tools, each defines register_tools(registry)
+    "plugins": [module.strip() for module in os.getenv("TOOL_PLUGINS", "").split(",") if module.strip()]
+}
+
+# AWS Config
+aws_config = {
+    "region_name": os.getenv("AWS_SERVICES_REGION", "us-east-1"),
+    "max_pool_connections": int(os.getenv("AWS_MAX_POOL_CONNECTIONS", 50)),
+    # Threads of the blocking boto3 calls made from the event loop, one per pooled connection
+    "executor_workers": int(os.getenv("AWS_EXECUTOR_WORKERS", os.getenv("AWS_MAX_POOL_CONNECTIONS", 50))),
+    "connect_timeout": float(os.getenv("AWS_CONNECT_TIMEOUT", 2)),
+    "read_timeout": float(os.getenv("AWS_READ_TIMEOUT", 10)),
+    "max_attempts": int(os.getenv("AWS_MAX_ATTEMPTS", 3)),
+    "retry_mode": os.getenv("AWS_RETRY_MODE", "standard")
+}
+
+# Cache Config
+cache_config = {
+    # "feedback_id": results are scoped to a feedback_id, "content": shared by normalized text + instructions
+    "mode": os.getenv("CACHE_MODE", "feedback_id"),
+    "prompt_version": os.getenv("PROMPT_VERSION", "1"),
+    "ttl": int(os.getenv("CACHE_TTL", 60)),
+    "tool_cache_enabled": os.getenv("TOOL_CACHE_ENABLED", "true").lower() == "true",
+    "tool_ttl": int(os.getenv("TOOL_CACHE_TTL", os.getenv("CACHE_TTL", 60))),
+    "l1_enabled": os.getenv("CACHE_L1_ENABLED", "true").lower() == "true",
+    "l1_max_entries": int(os.getenv("CACHE_L1_MAX_ENTRIES", 1024)),
+    "l1_max_bytes": int(os.getenv("CACHE_L1_MAX_BYTES", 16 * 1024 * 1024)),
+    "l1_negative_ttl": float(os.getenv("CACHE_L1_NEGATIVE_TTL", 5))
+}
+
+# Guard Config
+guard_config = {
+    "guardrail_id": os.getenv("GUARDRAIL_ID", "8j0uvjqavz1m"),
+    "guardrail_version": os.getenv("GUARDRAIL_VERSION", "1"),
+    "verdict_cache_enabled": os.getenv("GUARD_VERDICT_CACHE_ENABLED", "true").lower() == "true",
+    "verdict_max_entries": int(os.getenv("GUARD_VERDICT_MAX_ENTRIES", 10000)),
+    # Retention of allowed and blocked verdicts (seconds)
+    "allowed_ttl": float(os.getenv("GUARD_ALLOWED_TTL", 3600)),
+    "blocked_ttl": float(os.getenv("GUARD_BLOCKED_TTL", 86400)),
+    # Batch records are sent to the guardrail together, up to this many characters per call
+    "batch_max_chars": int(os.getenv("GUARD_BATCH_MAX_CHARS", 20000)),
+    # Start the agent while the guardrail runs, its result is dropped if the guardrail intervenes
+    "speculative": os.getenv("GUARD_SPECULATIVE", "false").lower() == "true"
+}
+
+# Pre-filter Config
+prefilter_config = {
+    # "off", "shadow" (decide and count, the guardrail still checks everything) or "enforce"
+    "mode": os.getenv("PREFILTER_MODE", "shadow"),
+    # Longer texts are not scanned locally, they are escalated to the guardrail
+    "max_chars": int(os.getenv("PREFILTER_MAX_CHARS", 20000)),
+    # Risk lexicon score at which a text is blocked locally
+    "block_score": int(os.getenv("PREFILTER_BLOCK_SCORE", 6)),
+    "max_non_ascii_ratio": float(os.getenv("PREFILTER_MAX_NON_ASCII_RATIO", 0.3))
+}
+
+# Planner Config
+planner_config = {
+    "enabled": os.getenv("PLANNER_ENABLED", "true").lower() == "true"
+}
+
+# Jobs Config
+jobs_config = {
+    # Opt-in, the queue needs an explicit JOBS_DB_PATH shared by every worker process
+    "enabled": os.getenv("JOBS_ENABLED", "false").lower() == "true",
+    "db_path": os.getenv("JOBS_DB_PATH"),
+    "max_workers": int(os.getenv("JOBS_MAX_WORKERS", (os.cpu_count() or 1) * 2)),
+    "poll_interval": float(os.getenv("JOBS_POLL_INTERVAL", 1)),
+    # Claimed records that are not acknowledged within this time are delivered again,
+    # up to max_attempts deliveries, then they are dead-lettered
+    "visibility_timeout": float(os.getenv("JOBS_VISIBILITY_TIMEOUT", 300)),
+    "max_attempts": int(os.getenv("JOBS_MAX_ATTEMPTS", 3))
+}
+
+# Lambda Config
+lambda_config = {
+    # Import litellm in the background at cold start instead of on the first LLM call
+    "preload_litellm": os.getenv("LAMBDA_PRELOAD_LITELLM", "true").lower() == "true"
+}
@@ -1,117 +1,187 @@
-from tools.tool_executor import ToolExecutor
-from litellm import completion
+import json
+from config import planner_config
+from core.planner import plan_tools
+from tools.tool_executor import tool_executor, serialize_tool_calls, deserialize_tool_calls
+from tools.registry import tool_registry
+from tools.tool_schemas import SubAgent
+from cache.cache import aretrieve_tool_cache, astore_tool_cache
+from core.llm import achat_completion
+from utils.event_loop import run_sync
+from core.prompts import MASTER_AGENT_PROMPT, SUB_AGENT_PROMPT
+
+
+def master_agent_messages(input_request: dict) -> list:
+    """
+    Build the master agent messages from the user inputs.
+    """
+    return MASTER_AGENT_PROMPT.messages(
+        feedback_text=input_request.get("feedback_text", "N/A"),
+        instructions=input_request.get("instructions", "N/A")
+    )
+
+
+def sub_agent_messages(input_request: dict) -> list:
+    """
+    Build the sub agent messages from the user inputs.
+    """
+    return SUB_AGENT_PROMPT.messages(
+        feedback_text=input_request.get("feedback_text", "N/A"),
+        instructions=input_request.get("instructions", "N/A")
+    )
+
+
+def routing_query(input_request: dict) -> str:
+    """
+    The routing decision only depends on the feedback text and the instructions.
+    """
+    return f"{input_request.get('feedback_text', 'N/A')}\n{input_request.get('instructions', 'N/A')}"
+
+
+def routing_decision(response) -> dict:
+    """
+    Reduce an agent completion to a cacheable routing decision.
+    """
+    return {
+        "tool_calls": serialize_tool_calls(response.choices[0].message.tool_calls or []),
+        "content": response.choices[0].message.content
+    }
+
+
+def fused_mode(input_request: dict):
+    """
+    Per request analysis mode, None falls back to the global tool executor config.
+    """
+    analysis_mode = input_request.get("analysis_mode")
+    if analysis_mode is None:
+        return None
+    return analysis_mode == "fused"
+
+
+def planned_tool_calls(input_request: dict):
+    """
+    Tool calls decided by the instruction planner, None when the LLM router is needed.
+    """
+    if not planner_config["enabled"]:
+        return None
+    tool_names = plan_tools(input_request.get("instructions", ""))
+    if not tool_names:
+        return None
+    arguments = json.dumps({"query": input_request.get("feedback_text", "N/A")})
+    return deserialize_tool_calls([{"name": tool_name, "arguments": arguments} for tool_name in tool_names])
+
 
 # Master Agent
-def master_agent(input_request: dict, tools: list, config: dict, logger=None):
+async def amaster_agent(input_request: dict, tools: list, config: dict, logger=None):
     """
     This is the master agent that handles general user interactions, greetings, and generic inquiries.
     When the user provides instructions or mentions product-related details, it delegates the task to a specialized sub-agent.
     """
     try:
-        # This is master agent Prompt
-        prompt = """You are a master agent responsible for handling general user interactions, greetings, and generic inquiries. 
-        However, when the user provides instructions or mentions product-related details, you must delegate the task to a specialized sub-agent.  
-
-        NOTE:
-        - If the input is a general inquiry, greeting, or small talk, respond directly.  
-        - If the user input contains instructions or product-related details, do not respond directly. 
-        Instead, forward the request to the sub-agent using the exact instruction and feedback text provided by the user.
-        - Make sure you only call sub-agent once.
-        - Ensure responses are clear and structured.
-
-        This keeps the master agent focused on general conversations while offloading specific tasks to the sub-agent.
-
-        USER_INPUTS:
-            Feedback_text: {feedback_text}
-            Instructions: {instructions}
-        """.format(
-            feedback_text=input_request.get("feedback_text", "N/A"),
-            instructions=input_request.get("instructions", "N/A")
-        )
-
-        logger.info(f"Master Agent LLM call initiated for feedback_id: {input_request.get('feedback_id', 'N/A')}")
-        # LLm call
-        response = completion(
-            **config, 
-            messages=[{"role": "user", "content": prompt}],
-            tools=tools
-        )
-
-        logger.info(f"Master Agent Response : {response.json()}")
+        # Deterministic fast path, the planner picks the tools without the routing LLM calls
+        tool_calls = planned_tool_calls(input_request)
+        if tool_calls:
+            logger.info(f"Planner selected {[tool_call.function.name for tool_call in tool_calls]} for feedback_id: {input_request.get('feedback_id', 'N/A')}")
+            result = await tool_executor.bind(config, fused=fused_mode(input_request)).acall(
+                input_request=input_request,
+                tool_calls=tool_calls,
+                logger=logger
+            )
+            logger.info("Master Agent Final Answer: %s", result)
+            return result
+
+        # Routing decision, served from the cache when the same feedback was routed before
+        decision = await aretrieve_tool_cache("MasterAgent", routing_query(input_request), logger)
+        if decision is None:
+            # This is master agent Prompt
+            messages = master_agent_messages(input_request)
+
+            logger.info(f"Master Agent LLM call initiated for feedback_id: {input_request.get('feedback_id', 'N/A')}")
+            # LLm call
+            response = await achat_completion(
+                config,
+                messages=messages,
+                tools=tools,
+                logger=logger
+            )
+
+            logger.info("Master Agent Response : %s", response)
+            decision = routing_decision(response)
+            await astore_tool_cache("MasterAgent", routing_query(input_request), decision, logger)
+        else:
+            logger.info(f"Master Agent routing served from cache for feedback_id: {input_request.get('feedback_id', 'N/A')}")
 
         # sub agent call
-        if response.choices[0].message.tool_calls:
-            logger.info(f"Number of tool calls : {len(response.choices[0].message.tool_calls)}")
-            master_tools_executor = ToolExecutor(config=config)
-            result = master_tools_executor(
+        if decision["tool_calls"]:
+            tool_calls = deserialize_tool_calls(decision["tool_calls"])
+            logger.info(f"Number of tool calls : {len(tool_calls)}")
+            master_tools_executor = tool_executor.bind(config, fused=fused_mode(input_request))
+            result = await master_tools_executor.acall(
                 input_request=input_request, 
-                tool_calls=response.choices[0].message.tool_calls,
+                tool_calls=tool_calls,
                 logger=logger
             )
-            logger.info(f"Master Agent Final Answer: {result}")
+            logger.info("Master Agent Final Answer: %s", result)
             input_request["agent_response"] = result["agent_response"][0]["subagent"]
             return result
-        input_request["agent_response"] = [response.choices[0].message.content]
+        input_request["agent_response"] = [decision["content"]]
 
-        logger.info(f"Master Agent Final Answer: {input_request}")
+        logger.info("Master Agent Final Answer: %s", input_request)
         return input_request
     except Exception as e:
         logger.error(f"Error in master agent for feedback_id: {input_request.get('feedback_id', 'N/A')} with error: {e}")
         return {"error": str(e)}
 
 
+def master_agent(input_request: dict, tools: list, config: dict, logger=None):
+    """Sync version of amaster_agent, for the Lambda path."""
+    return run_sync(amaster_agent(input_request, tools, config, logger))
+
+
 # Sub Agent
-def sub_agent(input_request: dict, tools: list, config: dict, logger=None):
+async def asub_agent(input_request: dict, tools: list, config: dict, logger=None):
     """
     This is the sub-agent that handles specific tasks related to product-related details.
     """
     try:
         logger.info(f"Sub Agent initiated for feedback_id: {input_request.get('feedback_id', 'N/A')}")
-        prompt = """You are a specialized sub-agent equipped with four tools:  
-
-        1. SentimentAnalysisTool – Analyzes sentiment (positive, negative, neutral) with confidence scores.  
-        2. TopicCategorizationTool – Categorizes feedback into predefined topics (`Product Quality`, `Delivery`, `Support`).  
-        3. KeywordContextualizationTool – Extracts context-aware keywords with relevance scores.  
-        4. SummarizationTool – Generates concise summaries and actionable recommendations.  
-
-        Your task is to answer the user based on feedback and instruction given.   
-            - If an instruction is provided, select only the relevant tools accordingly.  
-            - If no instruction is provided, use **all four tools** to extract comprehensive insights.  
-            - You can use multiple tools at once when necessary.  
-
-        #### **User Input:**  
-            Feedback_text : {feedback_text}
-            Instruction : {instructions}
-        """.format(
-            feedback_text=input_request.get("feedback_text", "N/A"),
-            instructions=input_request.get("instructions", "N/A")
-        )
-
-        # LLm call
-        logger.info(f"Sub Agent LLM call initiated for feedback_id: {input_request.get('feedback_id', 'N/A')}")
-        response = completion(
-            **config, 
-            messages=[
-                {"role": "user", "content": prompt},
-                ],
-            tools=tools
-        )
-        
-        logger.info(f"Sub Agent Response : {response}")
+
+        # Tool selection, served from the cache when the same feedback was routed before
+        decision = await aretrieve_tool_cache("SubAgent", routing_query(input_request), logger)
+        if decision is None:
+            messages = sub_agent_messages(input_request)
+
+            # LLm call
+            logger.info(f"Sub Agent LLM call initiated for feedback_id: {input_request.get('feedback_id', 'N/A')}")
+            response = await achat_completion(
+                config,
+                messages=messages,
+                tools=tools,
+                logger=logger
+            )
+            
+            logger.info("Sub Agent Response : %s", response)
+            decision = routing_decision(response)
+            await astore_tool_cache("SubAgent", routing_query(input_request), decision, logger)
+        else:
+            logger.info(f"Sub Agent routing served from cache for feedback_id: {input_request.get('feedback_id', 'N/A')}")
         
         # sub agent call
-        if response.choices[0].message.tool_calls:
-            sub_agent_tools_executor = ToolExecutor(config=config)
-            result = sub_agent_tools_executor(
+        if decision["tool_calls"]:
+            sub_agent_tools_executor = tool_executor.bind(config, fused=fused_mode(input_request))
+            result = await sub_agent_tools_executor.acall(
                 input_request=input_request, 
-                tool_calls=response.choices[0].message.tool_calls,
+                tool_calls=deserialize_tool_calls(decision["tool_calls"]),
                 logger=logger
             )
-            logger.info(f"Sub Agent Final Answer: {result}")
+            logger.info("Sub Agent Final Answer: %s", result)
             return result["agent_response"]
         
-        logger.info(f"Sub Agent Final Answer: {response.choices[0].message.content}")
-        return response.choices[0].message.content
+        logger.info("Sub Agent Final Answer: %s", decision['content'])
+        return decision["content"]
     except Exception as e:
         logger.error(f"Error in sub agent for feedback_id: {input_request.get('feedback_id', 'N/A')} with error: {e}")
         return {"error": str(e)}
+
+
+# The sub agent is the tool of the master agent
+tool_registry.register(SubAgent, async_tool=asub_agent, sub_agent=False)
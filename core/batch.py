@@ -0,0 +1,127 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+# Set while a record runs inside a batch, the tool layer reads it to enable batch-only optimizations
+batch_context = contextvars.ContextVar("batch_context", default=False)
+
+
+def in_batch() -> bool:
+    return batch_context.get()
+
+
+class BatchExecutor:
+    """
+    This class is responsible for executing a batch of records concurrently.
+    It bounds the number of in-flight records, applies a per-record timeout,
+    isolates per-record errors and returns the results in the input order.
+    """
+    def __init__(self, max_workers: int = 8, record_timeout: float = None, logger=None) -> None:
+        self.max_workers = max(1, int(max_workers))
+        self.record_timeout = record_timeout
+        self.logger = logger
+
+    def _record_id(self, record):
+        if isinstance(record, dict):
+            return record.get("feedback_id", "N/A")
+        return getattr(record, "feedback_id", "N/A")
+
+    async def _execute(self, index: int, record, worker, semaphore: asyncio.Semaphore, pool: ThreadPoolExecutor):
+        async with semaphore:
+            record_id = self._record_id(record)
+            try:
+                batch_context.set(True)
+                if asyncio.iscoroutinefunction(worker):
+                    task = worker(record)
+                else:
+                    # Thread pool workers do not inherit the context, hand it over explicitly
+                    context = contextvars.copy_context()
+                    task = asyncio.get_running_loop().run_in_executor(pool, context.run, worker, record)
+                return await asyncio.wait_for(task, timeout=self.record_timeout)
+            except asyncio.TimeoutError:
+                self.logger.error(f"Batch record {index} with feedback_id: {record_id} timed out after {self.record_timeout}s")
+                return {"feedback_id": record_id, "error": f"Timed out after {self.record_timeout} seconds"}
+            except Exception as e:
+                self.logger.error(f"Batch record {index} with feedback_id: {record_id} failed with error: {e}")
+                return {"feedback_id": record_id, "error": str(e)}
+
+    async def arun(self, records: list, worker, key=None) -> list:
+        """
+        Run the worker over every record from inside an event loop.
+        Coroutine workers run on the loop, plain functions run on a bounded thread pool.
+        When a key function is given, records with the same key are executed once
+        and the result is fanned out to every duplicate.
+        """
+        semaphore = asyncio.Semaphore(self.max_workers)
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="batch-worker")
+        try:
+            # Index of the first record for each key, duplicates point to it
+            leaders = {}
+            positions = []
+            for index, record in enumerate(records):
+                record_key = key(record) if key else index
+                positions.append(leaders.setdefault(record_key, index))
+
+            unique = sorted(set(positions))
+            if len(unique) < len(records):
+                self.logger.info(f"Batch executor deduplicated {len(records) - len(unique)} of {len(records)} records")
+
+            tasks = [
+                self._execute(index, records[index], worker, semaphore, pool)
+                for index in unique
+            ]
+            self.logger.info(f"Batch executor started for {len(tasks)} records with {self.max_workers} workers")
+            # gather keeps the results in the same order as the records
+            results = dict(zip(unique, await asyncio.gather(*tasks)))
+            return [results[position] for position in positions]
+        finally:
+            # Do not wait for timed out records, their results are already discarded
+            pool.shutdown(wait=False)
+
+    def run(self, records: list, worker, key=None) -> list:
+        """
+        Run the worker over every record from synchronous code (e.g. the Lambda handler).
+        """
+        return asyncio.run(self.arun(records, worker, key=key))
+
+    async def _execute_indexed(self, index: int, record, worker, semaphore: asyncio.Semaphore, pool: ThreadPoolExecutor):
+        return index, await self._execute(index, record, worker, semaphore, pool)
+
+    async def astream(self, records, worker):
+        """
+        Run the worker over a (sync or async) iterable of records and yield (index, result)
+        as soon as each record completes. Records are pulled from the iterable only when a
+        worker is free, so memory stays constant in the batch size.
+        """
+        semaphore = asyncio.Semaphore(self.max_workers)
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="batch-worker")
+        pending = set()
+        try:
+            index = 0
+            async for record in _aiter(records):
+                if len(pending) >= self.max_workers:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+                pending.add(asyncio.create_task(self._execute_indexed(index, record, worker, semaphore, pool)))
+                index += 1
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+            self.logger.info(f"Batch executor streamed {index} records")
+        finally:
+            # The consumer went away (e.g. client disconnected), drop the remaining records
+            for task in pending:
+                task.cancel()
+            pool.shutdown(wait=False)
+
+
+async def _aiter(records):
+    if hasattr(records, "__aiter__"):
+        async for record in records:
+            yield record
+    else:
+        for record in records:
+            yield record
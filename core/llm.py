@@ -0,0 +1,373 @@
+import asyncio
+import importlib
+import json
+import random
+import threading
+import time
+from collections import deque
+from config import rate_limit_config, resilience_config
+from core.batch import in_batch
+from utils.utils import estimate_tokens
+from utils.metrics import metrics, record_llm_call
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+# Shortest sleep between two acquire attempts
+MIN_WAIT = 0.01
+
+
+class _Bucket:
+    """
+    Token bucket refilled at limit per minute (scaled by the AIMD factor).
+    The level may go negative: a call larger than the bucket is admitted and paid back over time.
+    """
+    def __init__(self, limit: int, burst_seconds: float) -> None:
+        self.limit = limit
+        self.capacity = max(1.0, limit / 60 * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def rate(self, scale: float) -> float:
+        return self.limit / 60 * scale
+
+    def refill(self, now: float, scale: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate(scale))
+        self.updated = now
+
+    def time_to(self, level: float, scale: float) -> float:
+        return max(MIN_WAIT, (level - self.level) / self.rate(scale))
+
+
+class RateLimiter:
+    """
+    This class meters LLM calls against the provider requests-per-minute and tokens-per-minute
+    limits, shared by every caller in the process (threads and event loop).
+
+    The admitted rate adapts AIMD-style: it is cut multiplicatively on 429s and slow calls and
+    grows back additively on healthy calls. Interactive calls have priority over batch calls:
+    batch calls leave batch_reserve of each bucket untouched and wait while an interactive
+    call is waiting.
+    """
+    def __init__(self, rpm: int = 0, tpm: int = 0, burst_seconds: float = 5, completion_tokens: int = 500,
+                 batch_reserve: float = 0.2, min_scale: float = 0.1, increase: float = 0.05, decrease: float = 0.5,
+                 latency_threshold: float = 0, cooldown: float = 1) -> None:
+        self.buckets = {
+            name: _Bucket(limit, burst_seconds)
+            for name, limit in (("requests", rpm), ("tokens", tpm)) if limit > 0
+        }
+        self.completion_tokens = completion_tokens
+        self.batch_reserve = batch_reserve
+        self.min_scale = min_scale
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_threshold = latency_threshold
+        self.cooldown = cooldown
+        self.scale = 1.0
+        self.paused_until = 0.0
+        self._last_decrease = 0.0
+        self._interactive_waiting = 0
+        self._lock = threading.Lock()
+
+    def estimate(self, messages: list, **kwargs) -> int:
+        """Estimated tokens of a call: prompt, tool schemas and the reserved completion."""
+        prompt = "".join(str(message.get("content") or "") for message in messages)
+        tools = json.dumps(kwargs["tools"]) if kwargs.get("tools") else ""
+        return estimate_tokens(prompt) + estimate_tokens(tools) + (kwargs.get("max_tokens") or self.completion_tokens)
+
+    def _try_acquire(self, tokens: int, priority: str) -> float:
+        """Take the budget for one call, or return how long to wait before trying again."""
+        now = time.monotonic()
+        with self._lock:
+            if now < self.paused_until:
+                return self.paused_until - now
+            if priority == BATCH and self._interactive_waiting:
+                return MIN_WAIT * 10
+
+            wait = 0
+            for bucket in self.buckets.values():
+                bucket.refill(now, self.scale)
+                threshold = bucket.capacity * self.batch_reserve if priority == BATCH else 0
+                if bucket.level <= threshold:
+                    wait = max(wait, bucket.time_to(threshold, self.scale))
+            if wait:
+                return wait
+
+            costs = {"requests": 1, "tokens": tokens}
+            for name, bucket in self.buckets.items():
+                bucket.level -= costs[name]
+            return 0
+
+    def _waiting(self, priority: str, delta: int) -> None:
+        if priority == INTERACTIVE:
+            with self._lock:
+                self._interactive_waiting += delta
+
+    def try_acquire(self, tokens: int, priority: str = INTERACTIVE) -> bool:
+        """Take the budget for one call only when it is available right now."""
+        return not self._try_acquire(tokens, priority)
+
+    async def aacquire(self, tokens: int, priority: str = INTERACTIVE) -> float:
+        """Wait until the call is admitted without blocking the event loop, returns the time spent waiting."""
+        wait = self._try_acquire(tokens, priority)
+        if not wait:
+            return 0
+        start = time.monotonic()
+        self._waiting(priority, 1)
+        try:
+            while wait:
+                await asyncio.sleep(wait)
+                wait = self._try_acquire(tokens, priority)
+        finally:
+            self._waiting(priority, -1)
+        return time.monotonic() - start
+
+    def record(self, tokens: int, latency: float, used_tokens: int = None, rate_limited: bool = False,
+               retry_after: float = None, failed: bool = False, logger=None) -> None:
+        """Feed the outcome of a call back into the limiter. A failed call used no tokens,
+        its estimate is refunded."""
+        now = time.monotonic()
+        if failed and used_tokens is None:
+            used_tokens = 0
+        with self._lock:
+            # Settle the estimate against the real usage
+            if used_tokens is not None and "tokens" in self.buckets:
+                bucket = self.buckets["tokens"]
+                bucket.level = min(bucket.capacity, bucket.level + tokens - used_tokens)
+
+            slow = self.latency_threshold and latency > self.latency_threshold
+            if rate_limited:
+                self.paused_until = max(self.paused_until, now + (retry_after or self.cooldown))
+            if rate_limited or (slow and not failed):
+                # Concurrent calls report the same overload, decrease once per cooldown
+                if now - self._last_decrease >= self.cooldown:
+                    self._last_decrease = now
+                    self.scale = max(self.min_scale, self.scale * self.decrease)
+                    if logger:
+                        reason = "rate limited" if rate_limited else f"slow call ({latency:.2f}s)"
+                        logger.warning(f"LLM rate limiter backing off to {self.scale:.2f} of the limit after {reason}")
+            elif not failed:
+                # Other errors (5xx, timeouts) say nothing about the admitted rate
+                self.scale = min(1.0, self.scale + self.increase)
+
+
+rate_limiter = RateLimiter(**rate_limit_config)
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def retry_after(error: Exception):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def used_tokens(response):
+    return getattr(getattr(response, "usage", None), "total_tokens", None)
+
+
+def call_priority() -> str:
+    # Batch records run inside the batch context, everything else is an interactive /invoke
+    return BATCH if in_batch() else INTERACTIVE
+
+
+# Errors that fail the same way on every attempt (bad request, context length, content policy)
+PERMANENT_STATUS_CODES = {400, 413, 422}
+PERMANENT_ERRORS = {"BadRequestError", "ContextWindowExceededError", "ContentPolicyViolationError"}
+
+
+def is_retryable(error: Exception) -> bool:
+    if getattr(error, "status_code", None) in PERMANENT_STATUS_CODES:
+        return False
+    return type(error).__name__ not in PERMANENT_ERRORS
+
+
+class DeploymentRouter:
+    """
+    This class spreads calls over the configured deployments by weight. A deployment that
+    fails is skipped for the cooldown while another one is healthy, a success restores it.
+    """
+    def __init__(self, deployments: list, cooldown: float = 30) -> None:
+        self.deployments = [dict(deployment) for deployment in deployments] or [{}]
+        self.weights = [float(deployment.pop("weight", 1)) for deployment in self.deployments]
+        self.cooldown = cooldown
+        self.unhealthy_until = [0.0] * len(self.deployments)
+        self._lock = threading.Lock()
+
+    def choose(self, exclude: list = ()) -> int:
+        """Pick a deployment, preferring healthy ones not tried yet by the current call."""
+        now = time.monotonic()
+        indexes = range(len(self.deployments))
+        with self._lock:
+            healthy = [index for index in indexes if self.unhealthy_until[index] <= now]
+        for candidates in (
+            [index for index in healthy if index not in exclude],
+            healthy,
+            [index for index in indexes if index not in exclude],
+            list(indexes)
+        ):
+            if candidates:
+                return random.choices(candidates, weights=[self.weights[index] for index in candidates])[0]
+
+    def config(self, index: int, config: dict) -> dict:
+        return {**config, **self.deployments[index]}
+
+    def success(self, index: int) -> None:
+        with self._lock:
+            self.unhealthy_until[index] = 0.0
+
+    def failure(self, index: int) -> None:
+        with self._lock:
+            self.unhealthy_until[index] = time.monotonic() + self.cooldown
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies, used to decide when to hedge."""
+    def __init__(self, window: int = 200) -> None:
+        self.latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self.latencies.append(latency)
+
+    def percentile(self, percentile: float, min_samples: int = 1):
+        with self._lock:
+            latencies = sorted(self.latencies)
+        if len(latencies) < max(1, min_samples):
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100))]
+
+
+router = DeploymentRouter(resilience_config["deployments"], resilience_config["failover_cooldown"])
+latency_tracker = LatencyTracker()
+
+
+def hedge_delay():
+    """Seconds to wait before hedging, None when hedging is off or there is no latency history yet."""
+    if not resilience_config["hedge_enabled"]:
+        return None
+    percentile = latency_tracker.percentile(resilience_config["hedge_percentile"], resilience_config["hedge_min_samples"])
+    if percentile is None:
+        return None
+    return max(resilience_config["hedge_min_delay"], percentile)
+
+
+def backoff(attempt: int, error: Exception) -> float:
+    # Full jitter, never shorter than the provider retry-after
+    delay = random.uniform(0, min(resilience_config["backoff_max"], resilience_config["backoff_base"] * 2 ** attempt))
+    return max(delay, retry_after(error) or 0)
+
+
+# Completion
+# litellm takes seconds to import, it is loaded by the first call (or preload) instead of at import time
+async def acompletion(**kwargs):
+    from litellm import acompletion as litellm_acompletion
+    return await litellm_acompletion(**kwargs)
+
+
+def preload() -> threading.Thread:
+    """
+    Import litellm on a background thread, so the import overlaps the rest of a cold start
+    and requests that never reach the LLM (cache hits, blocked requests) do not wait for it.
+    """
+    thread = threading.Thread(target=importlib.import_module, args=("litellm",), name="litellm-preload", daemon=True)
+    thread.start()
+    return thread
+
+
+async def _acall(index: int, tokens: int, config: dict, messages: list, logger=None, **kwargs):
+    # One call on one deployment, the rate limiter budget is taken by the caller
+    start = time.monotonic()
+    model = router.config(index, config).get("model")
+    try:
+        response = await acompletion(**router.config(index, config), messages=messages, **kwargs)
+    except asyncio.CancelledError:
+        # The losing call of a hedge: settle its reserved budget like a failed call
+        latency = time.monotonic() - start
+        record_llm_call(model, index, latency, "cancelled")
+        rate_limiter.record(tokens, latency, failed=True, logger=logger)
+        raise
+    except Exception as e:
+        # A bad request fails on every deployment, only transient errors mark this one unhealthy
+        if is_retryable(e):
+            router.failure(index)
+        record_llm_call(model, index, time.monotonic() - start, "error")
+        rate_limiter.record(tokens, time.monotonic() - start, rate_limited=is_rate_limited(e),
+                            retry_after=retry_after(e), failed=True, logger=logger)
+        raise
+    latency = time.monotonic() - start
+    router.success(index)
+    record_llm_call(model, index, latency, "ok", getattr(response, "usage", None))
+    latency_tracker.record(latency)
+    rate_limiter.record(tokens, latency, used_tokens=used_tokens(response), logger=logger)
+    return response
+
+
+async def _ahedged_call(tried: list, config: dict, messages: list, logger=None, **kwargs):
+    # The limiter wait happens before the hedge timer starts, it is not provider latency
+    tokens = rate_limiter.estimate(messages, **kwargs)
+    priority = call_priority()
+    await rate_limiter.aacquire(tokens, priority)
+    index = router.choose(tried)
+    tried.append(index)
+    delay = hedge_delay()
+    if delay is None:
+        return await _acall(index, tokens, config, messages, logger, **kwargs)
+
+    tasks = {asyncio.ensure_future(_acall(index, tokens, config, messages, logger, **kwargs))}
+    done, _ = await asyncio.wait(tasks, timeout=delay)
+    # No hedge while the limiter is holding calls back, it would only add to the overload
+    if not done and rate_limiter.try_acquire(tokens, priority):
+        index = router.choose(tried)
+        tried.append(index)
+        metrics.inc("llm_hedges_total")
+        if logger:
+            logger.info(f"Hedging LLM call on deployment {index} after {delay:.2f}s")
+        tasks.add(asyncio.ensure_future(_acall(index, tokens, config, messages, logger, **kwargs)))
+
+    # First success wins, the slower call is cancelled
+    error = None
+    try:
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def achat_completion(config: dict, messages: list, logger=None, **kwargs):
+    """Resilient, rate limited litellm completion, shared by the agents and the tools.
+    Transient errors are retried with jittered backoff on the next deployment, slow calls
+    are hedged when enabled.
+
+    Args:
+        config (dict): The LLM config.
+        messages (list): The chat messages.
+        logger: Logger for the retry and back off events.
+        **kwargs: Extra completion arguments (e.g. tools).
+
+    Returns:
+        The litellm response, errors are raised to the caller once the retries are exhausted.
+    """
+    tried = []
+    for attempt in range(resilience_config["max_retries"] + 1):
+        try:
+            return await _ahedged_call(tried, config, messages, logger, **kwargs)
+        except Exception as e:
+            if attempt == resilience_config["max_retries"] or not is_retryable(e):
+                raise
+            delay = backoff(attempt, e)
+            metrics.inc("llm_retries_total")
+            if logger:
+                logger.warning(f"LLM call failed on attempt {attempt + 1} with error: {e}, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
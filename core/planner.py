@@ -0,0 +1,68 @@
+import re
+
+# Tools in the order the sub agent lists them
+ALL_TOOLS = [
+    "SentimentAnalysisTool",
+    "TopicCategorizationTool",
+    "KeywordContextualizationTool",
+    "SummarizationTool"
+]
+
+# Instruction keywords that name a tool, whole words with their inflections ("tone" does not match "toner")
+TOOL_PATTERNS = {
+    "SentimentAnalysisTool": re.compile(
+        r"\b(sentiments?|tones?|emotion(s|al)?|moods?|feelings?)\b",
+        re.I
+    ),
+    "TopicCategorizationTool": re.compile(
+        r"\b(topics?|categor(y|ies|i[sz]e|i[sz]ed|i[sz]ing|i[sz]ation)|classif(y|ies|ied|ying|ications?)|themes?)\b",
+        re.I
+    ),
+    "KeywordContextualizationTool": re.compile(r"\b(keywords?|key words?|key ?phrases?|key terms?)\b", re.I),
+    "SummarizationTool": re.compile(
+        r"\b(summar(y|ies|i[sz]e|i[sz]ed|i[sz]ing|i[sz]ation)|recommend(s|ed|ing|ations?)?|actionable|action items?|"
+        r"tl;?dr|overviews?)\b",
+        re.I
+    )
+}
+
+# Instructions asking for every tool
+ALL_TOOLS_PATTERN = re.compile(
+    r"\b(all (four |4 )?(tools|analys[ie]s)|full analysis|complete analysis|comprehensive|everything)\b", re.I
+)
+
+# Left to the LLM router: negations and exclusions, "insights" (read as a request for the
+# full analysis) and polarity words, which are often qualifiers ("summarize the negative points")
+AMBIGUOUS_PATTERN = re.compile(
+    r"\b(not|no|don'?t|do not|except|without|skip|exclude|instead|only if|unless|insights?|"
+    r"positiv(e|es|ely|ity)|negativ(e|es|ely|ity)|neutral(ity)?)\b",
+    re.I
+)
+
+EMPTY_INSTRUCTIONS = {"", "n/a", "na", "none", "null", "-"}
+
+
+def plan_tools(instructions: str):
+    """Map instructions directly to the tools to run.
+
+    Args:
+        instructions (str): The user instructions.
+
+    Returns:
+        list | None: The tool names to run, or None when the instructions are ambiguous
+        and the LLM router has to decide.
+    """
+    text = (instructions or "").strip()
+
+    # No instructions means all four tools
+    if text.lower().strip(" .") in EMPTY_INSTRUCTIONS:
+        return list(ALL_TOOLS)
+
+    if AMBIGUOUS_PATTERN.search(text):
+        return None
+
+    if ALL_TOOLS_PATTERN.search(text):
+        return list(ALL_TOOLS)
+
+    tool_names = [tool_name for tool_name in ALL_TOOLS if TOOL_PATTERNS[tool_name].search(text)]
+    return tool_names or None
@@ -0,0 +1,260 @@
+import hashlib
+from config import cache_config
+from utils.utils import estimate_tokens
+from utils.metrics import metrics
+
+metrics.describe("prompt_tokens_estimated_total", "Estimated prompt tokens by template and message part")
+
+TEMPLATES = {}
+# Plain str.format prompts of registered tools, part of the templates version with TEMPLATES
+PLAIN_PROMPTS = {}
+_templates_version = None
+
+
+def _invalidate_version() -> None:
+    global _templates_version
+    _templates_version = None
+
+
+def register_plain_prompt(name: str, prompt: str) -> None:
+    """
+    Track a plain str.format prompt (a tool registered without a PromptTemplate) in the templates version.
+    """
+    PLAIN_PROMPTS[name] = prompt
+    _invalidate_version()
+
+
+def compact(text: str) -> str:
+    """
+    Strip the indentation and trailing spaces of every line and collapse repeated blank lines.
+    """
+    lines = [line.strip() for line in text.strip().splitlines()]
+    return "\n".join(line for index, line in enumerate(lines) if line or (index and lines[index - 1]))
+
+
+class PromptTemplate:
+    """
+    This class splits a prompt into a static system message, rendered once and byte-identical
+    on every call so the provider can cache the prefix, and a user message holding the
+    request fields. Both are whitespace compacted.
+
+    Args:
+        name (str): Template name, used for the token accounting.
+        system (str): The static instructions, without fields (braces escaped as in str.format).
+        user (str): The per request part, a str.format template.
+    """
+    def __init__(self, name: str, system: str, user: str) -> None:
+        self.name = name
+        self.system = compact(system).format()
+        self.user = compact(user)
+        self.system_tokens = estimate_tokens(self.system)
+        self.version = hashlib.sha256(f"{self.system}\x1f{self.user}".encode()).hexdigest()[:12]
+        TEMPLATES[name] = self
+        _invalidate_version()
+
+    def render(self, **fields) -> str:
+        return self.user.format(**fields)
+
+    def messages(self, **fields) -> list:
+        user = self.render(**fields)
+        metrics.inc("prompt_tokens_estimated_total", self.system_tokens, template=self.name, part="system")
+        metrics.inc("prompt_tokens_estimated_total", estimate_tokens(user), template=self.name, part="user")
+        return [{"role": "system", "content": self.system}, {"role": "user", "content": user}]
+
+
+# Master Agent
+MASTER_AGENT_PROMPT = PromptTemplate(
+    "master_agent",
+    system="""You are a master agent responsible for handling general user interactions, greetings, and generic inquiries.
+        However, when the user provides instructions or mentions product-related details, you must delegate the task to a specialized sub-agent.
+
+        NOTE:
+        - If the input is a general inquiry, greeting, or small talk, respond directly.
+        - If the user input contains instructions or product-related details, do not respond directly.
+        Instead, forward the request to the sub-agent using the exact instruction and feedback text provided by the user.
+        - Make sure you only call sub-agent once.
+        - Ensure responses are clear and structured.
+
+        This keeps the master agent focused on general conversations while offloading specific tasks to the sub-agent.
+        """,
+    user="""USER_INPUTS:
+            Feedback_text: {feedback_text}
+            Instructions: {instructions}
+        """
+)
+
+# Sub Agent
+SUB_AGENT_PROMPT = PromptTemplate(
+    "sub_agent",
+    system="""You are a specialized sub-agent equipped with four tools:
+
+        1. SentimentAnalysisTool – Analyzes sentiment (positive, negative, neutral) with confidence scores.
+        2. TopicCategorizationTool – Categorizes feedback into predefined topics (`Product Quality`, `Delivery`, `Support`).
+        3. KeywordContextualizationTool – Extracts context-aware keywords with relevance scores.
+        4. SummarizationTool – Generates concise summaries and actionable recommendations.
+
+        Your task is to answer the user based on feedback and instruction given.
+            - If an instruction is provided, select only the relevant tools accordingly.
+            - If no instruction is provided, use **all four tools** to extract comprehensive insights.
+            - You can use multiple tools at once when necessary.
+        """,
+    user="""#### **User Input:**
+            Feedback_text : {feedback_text}
+            Instruction : {instructions}
+        """
+)
+
+# Sentiment Analysis Tool
+SENTIMENT_ANALYSIS_PROMPT = PromptTemplate(
+    "sentiment_analysis",
+    system="""Analyze the sentiment of the following user feedback and provide a JSON response with sentiment scores for positive, negative, and neutral categories.
+
+        NOTE: Ensure the sum of all values equals 1. Do not provide any explanation.
+
+        Output format:
+        ```json
+        {{ "positive": <score>, "negative": <score>, "neutral": <score>}}
+        ```
+        """,
+    user="Feedback: {user_feedback}"
+)
+
+# Topic Categorization Tool
+TOPIC_CATEGORIZATION_PROMPT = PromptTemplate(
+    "topic_categorization",
+    system="""Categorize the following user feedback into one of the predefined topics: `Product Quality`, `Delivery`, `Support`.
+
+        NOTE: Select only one category and assign it a confidence score between 0 and 1.
+        Do not provide any explanation.
+
+        Output format:
+        ```json
+        {{ "category": <Selected Category>, "score": <confidence_score>}}
+        ```"
+        """,
+    user="Feedback: {user_feedback}"
+)
+
+# Keyword Contextualization Tool
+KEYWORD_CONTEXTUALIZATION_PROMPT = PromptTemplate(
+    "keyword_contextualization",
+    system="""Extract context-aware keywords from the following user feedback along with their relevance scores.
+
+        NOTE: Provide a JSON response where each keyword is mapped to a relevance score between 0 and 1.
+        Do not provide any explanation.
+
+        Output format:
+        ```json
+        {{ "keywords": {{ "<keyword1>": <score>, "<keyword2>": <score>, "<keyword3>": <score> }}}}
+        ```"
+        """,
+    user="Feedback: {user_feedback}"
+)
+
+# Summarization Tool
+SUMMARIZATION_PROMPT = PromptTemplate(
+    "summarization",
+    system="""Summarize the following user feedback concisely and provide actionable recommendations.
+
+        NOTE: Ensure the summary captures the core message, and the recommendations are practical and relevant.
+        Do not provide any explanation.
+
+        Output format:
+        ```json
+        {{
+        "summary": "<short concise summary>",
+        "recommendations": ["<short actionable recommendation 1>", "<short actionable recommendation 2>"]
+        }}
+        ```"
+        """,
+    user="Feedback: {user_feedback}"
+)
+
+# Fused and Packed Analysis Tools
+# Format of each section, the requested sections are listed in the user message
+SECTION_FORMATS = {
+    section: compact(template).format()
+    for section, template in {
+        "sentiment": """"sentiment": sentiment scores for positive, negative, and neutral categories, the sum of all values equals 1.
+            {{ "positive": <score>, "negative": <score>, "neutral": <score>}}""",
+        "topic": """"topic": one of the predefined topics `Product Quality`, `Delivery`, `Support` with a confidence score between 0 and 1.
+            {{ "category": <Selected Category>, "score": <confidence_score>}}""",
+        "keywords": """"keywords": context-aware keywords, each mapped to a relevance score between 0 and 1.
+            {{ "keywords": {{ "<keyword1>": <score>, "<keyword2>": <score>, "<keyword3>": <score> }}}}""",
+        "summary": """"summary": a concise summary capturing the core message and practical, relevant recommendations.
+            {{ "summary": "<short concise summary>", "recommendations": ["<short actionable recommendation 1>", "<short actionable recommendation 2>"] }}"""
+    }.items()
+}
+
+FUSED_ANALYSIS_PROMPT = PromptTemplate(
+    "fused_analysis",
+    system="""Analyze the following user feedback and provide a single JSON response with one entry per requested section.
+
+        NOTE: Provide only the requested sections, each in its own format. Do not provide any explanation.
+        """,
+    user="""Requested sections:
+            {sections}
+
+        Output format:
+        ```json
+        {{ {section_names} }}
+        ```
+
+        Feedback: {user_feedback}
+        """
+)
+
+PACKED_ANALYSIS_PROMPT = PromptTemplate(
+    "packed_analysis",
+    system="""Analyze each of the following user feedback items and provide a JSON array with one object per item.
+
+        NOTE: Each object must contain the "id" of its item and only the requested sections, each in its own format.
+        Do not provide any explanation.
+        """,
+    user="""Requested sections:
+            {sections}
+
+        Output format:
+        ```json
+        [{{ "id": "<item id>", {section_names} }}]
+        ```
+
+        Feedback items:
+        {items}
+        """
+)
+
+# Repair of malformed tool output
+REPAIR_PROMPT = PromptTemplate(
+    "repair",
+    system="""Return the output given by the user as valid JSON.
+
+        NOTE: Keep the content unchanged, only fix the format. Do not provide any explanation.
+        """,
+    user="""The following output could not be parsed ({error}). Return it as valid JSON{expected}.
+
+        Output:
+        {output}
+        """
+)
+
+def templates_version() -> str:
+    """
+    Hash of every template, plain prompt and section format, a prompt change invalidates the
+    cached results. Computed on first use after a change, so templates registered by plugins count.
+    """
+    global _templates_version
+    version = _templates_version
+    if version is None:
+        parts = [template.version for _, template in sorted(TEMPLATES.items())]
+        parts += [f"{name}\x1f{prompt}" for name, prompt in sorted(PLAIN_PROMPTS.items())]
+        parts += [SECTION_FORMATS[section] for section in sorted(SECTION_FORMATS)]
+        version = _templates_version = hashlib.sha256("\x1f".join(parts).encode()).hexdigest()[:12]
+    return version
+
+
+def prompt_version() -> str:
+    """
+    Cache key component: the PROMPT_VERSION setting (a manual bump) and the templates hash.
+    """
+    return f"{cache_config['prompt_version']}-{templates_version()}"
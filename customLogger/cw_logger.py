@@ -1,33 +1,181 @@
+import copy
+import json
 import logging
+import queue
+import random
+import reprlib
+import sys
+import threading
 import watchtower
-import boto3
 import os
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from config import logging_config
+from utils.aws_clients import get_client
+from utils.metrics import metrics
 
-def setup_cloudwatch_logger():
-    LOG_GROUP = "Expedite-Commerce-Feedback-Analysis"
-    LOG_STREAM = "Expedite-Commerce-Feedback-Analysis-Stream"
+LOG_GROUP = "Expedite-Commerce-Feedback-Analysis"
+LOG_STREAM = "Expedite-Commerce-Feedback-Analysis-Stream"
 
-    client_logs = boto3.client(
-        "logs",
-        region_name="us-east-1"
-    )
+# Attributes every LogRecord has, anything else was passed through extra= and is emitted as a field
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
 
-    logger = logging.getLogger("cloudwatch_logger")
-    logger.setLevel(logging.INFO)
 
-    # Clear any existing handlers
-    logger.handlers.clear()
+metrics.describe("log_records_dropped_total", "Log records dropped because the log queue was full")
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as one JSON object per line.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": message
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class AsyncQueueHandler(QueueHandler):
+    """
+    Hand records to a background listener thread that formats and ships them to the sinks.
+    The request path only builds a bounded message and enqueues it, records are dropped
+    (and counted in log_records_dropped_total) when the queue is full.
+
+    Messages are capped at max_message_chars, except for a sample_rate share of them that
+    are kept whole for debugging.
+    """
+    def __init__(self, sinks: list, queue_size: int = 10000, max_message_chars: int = 2000, sample_rate: float = 0.0) -> None:
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.sinks = sinks
+        self.max_message_chars = max_message_chars
+        self.sample_rate = sample_rate
+        # Containers are rendered up to a bounded size instead of stringified whole
+        self.repr = reprlib.Repr()
+        self.repr.maxlevel = 4
+        self.repr.maxdict = self.repr.maxlist = self.repr.maxtuple = self.repr.maxset = 20
+        self.repr.maxstring = self.repr.maxother = max_message_chars or 2000
+        self.dropped = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self.listener = QueueListener(self.queue, *sinks, respect_handler_level=True)
+        self.listener.start()
+
+    def _bounded(self, arg):
+        if arg is None or isinstance(arg, (bool, int, float)):
+            return arg
+        if isinstance(arg, str):
+            return arg if len(arg) <= self.repr.maxstring else arg[:self.repr.maxstring]
+        return self.repr.repr(arg)
+
+    def _message(self, record: logging.LogRecord) -> str:
+        if random.random() < self.sample_rate:
+            return record.getMessage()
+        args = record.args
+        if args:
+            # Payloads passed as arguments are rendered bounded, not stringified whole
+            if isinstance(args, dict):
+                args = {key: self._bounded(value) for key, value in args.items()}
+            else:
+                args = tuple(self._bounded(arg) for arg in args)
+        message = str(record.msg) % args if args else str(record.msg)
+        if self.max_message_chars and len(message) > self.max_message_chars:
+            message = f"{message[:self.max_message_chars]}...[truncated {len(message) - self.max_message_chars} chars]"
+        return message
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The message is built on the caller, as the default prepare does: callers mutate what
+        # they logged right after the call. It is bounded here, so a large payload is never
+        # stringified whole on the request path. JSON and exception formatting are left to the listener.
+        record = copy.copy(record)
+        record.msg = self._message(record)
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            metrics.inc("log_records_dropped_total")
 
-    cloudwatch_handler = watchtower.CloudWatchLogHandler(
+    def flush(self) -> None:
+        """
+        Wait until the queued records are handed to the sinks and flush them (e.g. before a Lambda freeze).
+        """
+        self.queue.join()
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self) -> None:
+        # Called by the app shutdown and again by logging at interpreter exit
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        try:
+            self.listener.stop()
+            for sink in self.sinks:
+                sink.close()
+        finally:
+            super().close()
+
+
+def build_sink(sink: str) -> logging.Handler:
+    if sink == "stdout":
+        return logging.StreamHandler(sys.stdout)
+    if sink == "file":
+        return logging.FileHandler(logging_config["file_path"], encoding="utf-8")
+    return watchtower.CloudWatchLogHandler(
         log_group=LOG_GROUP,
         stream_name=LOG_STREAM,
-        boto3_client=client_logs,
-        send_interval=1,
+        boto3_client=get_client("logs"),
+        send_interval=logging_config["send_interval"],
         create_log_group=False  # Add this to prevent creation attempts
     )
 
-    formatter = logging.Formatter('%(asctime)s : %(levelname)s - %(message)s')
-    cloudwatch_handler.setFormatter(formatter)
 
-    logger.addHandler(cloudwatch_handler)
-    return logger, cloudwatch_handler
\ No newline at end of file
+def setup_cloudwatch_logger():
+    """
+    Set up the application logger: records are queued on the request path and shipped
+    by a background listener to the configured sinks (cloudwatch, stdout or file).
+
+    Returns:
+        tuple: (logger, handler), closing the handler flushes and stops the pipeline.
+    """
+    logger = logging.getLogger("cloudwatch_logger")
+    logger.setLevel(logging_config["level"])
+    logger.propagate = False
+
+    # Clear any existing handlers
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+    if logging_config["json"]:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s : %(levelname)s - %(message)s')
+
+    sinks = []
+    for sink_name in logging_config["sinks"]:
+        sink = build_sink(sink_name)
+        sink.setFormatter(formatter)
+        sinks.append(sink)
+
+    queue_handler = AsyncQueueHandler(
+        sinks,
+        logging_config["queue_size"],
+        max_message_chars=logging_config["max_message_chars"],
+        sample_rate=logging_config["payload_sample_rate"]
+    )
+    logger.addHandler(queue_handler)
+    return logger, queue_handler
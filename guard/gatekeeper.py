@@ -1,5 +1,13 @@
-from boto3 import client
+import asyncio
+import hashlib
 import os
+from config import guard_config
+from cache.memory_cache import MemoryCache, MISS
+from guard.prefilter import prefilter_check, record_disagreement, BLOCK
+from utils.aws_clients import get_client
+
+# Verdicts by normalized text, allowed and blocked verdicts have their own TTL
+verdict_cache = MemoryCache(max_entries=guard_config["verdict_max_entries"], ttl=guard_config["allowed_ttl"])
 
 def parse_guardrail_response(response: dict, logger=None) -> dict:
     try:
@@ -43,24 +51,155 @@ def parse_guardrail_response(response: dict, logger=None) -> dict:
         return {"error": str(e)}
 
 
+def guardrail_text(feedback_text: str, instructions: str) -> str:
+    """
+    The user supplied text the guardrail evaluates, request metadata (timestamp, customer_name) is left out.
+    """
+    return f"{feedback_text or ''}\n{instructions or ''}"
+
+
+def verdict_key(text: str) -> str:
+    # Whitespace collapsed and case folded, scoped to the guardrail version
+    normalized = " ".join((text or "").split()).casefold()
+    return hashlib.sha256(
+        f"{guard_config['guardrail_id']}|{guard_config['guardrail_version']}|{normalized}".encode("utf-8")
+    ).hexdigest()
+
+
+def _cached_verdict(key: str):
+    if not guard_config["verdict_cache_enabled"]:
+        return MISS
+    return verdict_cache.get(key)
+
+
+def _store_verdict(key: str, result: dict) -> None:
+    # Failed checks are not cached
+    if not guard_config["verdict_cache_enabled"] or "error" in result:
+        return
+    ttl = guard_config["blocked_ttl"] if result["is_blocked"] else guard_config["allowed_ttl"]
+    verdict_cache.set(key, result, ttl=ttl)
+
+
+def _apply_guardrail(texts: list) -> dict:
+    bedrock = get_client("bedrock-runtime")
+    return bedrock.apply_guardrail(
+        guardrailIdentifier=guard_config["guardrail_id"],
+        guardrailVersion=guard_config["guardrail_version"],
+        source="INPUT",
+        content=[{"text": {"text": text}} for text in texts]
+    )
+
+
+def _compare_verdict(decision: str, result: dict) -> None:
+    # Shadow mode: count the texts the pre-filter would have blocked and the guardrail let through
+    if decision == BLOCK and "error" not in result and not result["is_blocked"]:
+        record_disagreement()
+
+
+def _remote_check(text: str, key: str, logger=None) -> dict:
+    # Bedrock guardrail, the verdict is cached
+    result = parse_guardrail_response(_apply_guardrail([text]), logger)
+    _store_verdict(key, result)
+    return result
+
+
 def security_check(text: str, logger=None) -> dict:
     """
-    Check the security of the text using the Bedrock guardrail.
+    Check the security of the text using the verdict cache, the local pre-filter and the
+    Bedrock guardrail. A cached verdict skips the pre-filter, so a text checked by
+    security_check_batch is counted once in the pre-filter stats.
     """
     try:
-        bedrock = client(
-            "bedrock-runtime", 
-            region_name="us-east-1"
-        )
-
-        response = bedrock.apply_guardrail(
-            guardrailIdentifier="8j0uvjqavz1m",
-            guardrailVersion="1",
-            source="INPUT",
-                content=[{"text": {"text": text}}] 
-            )
-
-        return parse_guardrail_response(response)
+        key = verdict_key(text)
+        cached = _cached_verdict(key)
+        if cached is not MISS:
+            logger.info(f"Security check verdict served from cache: {cached['status']}")
+            return cached
+
+        decision, verdict = prefilter_check(text, logger)
+        if verdict is not None:
+            _store_verdict(key, verdict)
+            return verdict
+
+        result = _remote_check(text, key, logger)
+        _compare_verdict(decision, result)
+        return result
     except Exception as e:
         logger.error(f"Error in security check with error: {e}")
         return {"error": str(e)}
+
+
+def security_check_batch(texts: list, logger=None) -> list:
+    """
+    Check many texts with as few guardrail calls as possible. Cached verdicts are reused, the
+    pre-filter settles what it can, duplicates are checked once and the remaining texts are
+    sent together, up to batch_max_chars per call. A group the guardrail lets through is
+    allowed as a whole, a group it blocks is checked again text by text to attribute the verdicts.
+
+    Returns:
+        list: One verdict per text, in the input order.
+    """
+    keys = [verdict_key(text) for text in texts]
+    verdicts = {}
+    decisions = {}
+    pending = {}
+    for key, text in zip(keys, texts):
+        if key in verdicts or key in pending:
+            continue
+        verdict = _cached_verdict(key)
+        if verdict is MISS:
+            decisions[key], verdict = prefilter_check(text, logger)
+            if verdict is None:
+                pending[key] = text
+                continue
+            # Cached so the per-record checks of the batch do not run the pre-filter again
+            _store_verdict(key, verdict)
+        verdicts[key] = verdict
+
+    # Group the unchecked texts by size
+    groups, group, size = [], [], 0
+    for key, text in pending.items():
+        if group and size + len(text) > guard_config["batch_max_chars"]:
+            groups.append(group)
+            group, size = [], 0
+        group.append((key, text))
+        size += len(text)
+    if group:
+        groups.append(group)
+
+    if groups:
+        logger.info(f"Security check for {len(pending)} texts in {len(groups)} guardrail calls, {len(verdicts)} settled locally or from cache")
+    for group in groups:
+        try:
+            result = parse_guardrail_response(_apply_guardrail([text for _, text in group]), logger)
+        except Exception as e:
+            logger.error(f"Error in batch security check with error: {e}")
+            result = {"error": str(e)}
+
+        for key, text in group:
+            if len(group) > 1 and ("error" in result or result["is_blocked"]):
+                try:
+                    verdicts[key] = _remote_check(text, key, logger)
+                except Exception as e:
+                    logger.error(f"Error in security check with error: {e}")
+                    verdicts[key] = {"error": str(e)}
+            else:
+                verdicts[key] = result
+                _store_verdict(key, result)
+            _compare_verdict(decisions[key], verdicts[key])
+
+    return [verdicts[key] for key in keys]
+
+
+async def asecurity_check(text: str, logger=None) -> dict:
+    """
+    Async version of security_check, the boto3 call runs on a worker thread.
+    """
+    return await asyncio.to_thread(security_check, text, logger)
+
+
+async def asecurity_check_batch(texts: list, logger=None) -> list:
+    """
+    Async version of security_check_batch.
+    """
+    return await asyncio.to_thread(security_check_batch, texts, logger)
@@ -0,0 +1,136 @@
+import re
+import threading
+import unicodedata
+from config import prefilter_config
+
+BLOCK = "block"
+ESCALATE = "escalate"
+
+# The pre-filter only settles obvious attacks locally: a text is blocked or escalated to the
+# guardrail, never allowed, since no word list is evidence that a text is harmless.
+
+# Prompt injection and jailbreak phrasing, blocked without asking the guardrail
+BLOCK_PATTERNS = {
+    "PROMPT_ATTACK": re.compile(
+        r"\b(ignore|disregard|forget|override)\b.{0,40}\b(previous|prior|above|earlier|all|your|system)\b.{0,20}"
+        r"\b(instructions?|prompts?|rules|guidelines|directions)\b"
+        r"|\b(reveal|print|show|repeat|leak)\b.{0,30}\b(system prompt|hidden instructions|your instructions)\b"
+        r"|\byou are now\b.{0,40}\b(unrestricted|jailbroken|without (any )?(rules|restrictions|filters))\b"
+        r"|\b(jailbreak|do anything now|developer mode enabled)\b",
+        re.I | re.S
+    ),
+    "MARKUP_INJECTION": re.compile(r"<\s*/?\s*(script|iframe|object|embed)\b|\bjavascript\s*:", re.I)
+}
+
+# Risk lexicon: word prefix -> weight, the score of a text is the sum of the matched weights
+RISK_LEXICON = {
+    "kill": 2, "murder": 3, "bomb": 2, "shoot": 2, "stab": 3, "weapon": 2, "explosive": 3, "attack": 1,
+    "suicid": 3, "self-harm": 3, "hang myself": 3,
+    "hate": 1, "racis": 2, "nazi": 3, "slur": 2,
+    "fuck": 2, "shit": 1, "bitch": 2, "bastard": 2, "asshole": 2,
+    "porn": 3, "nude": 2, "sex": 2,
+    "password": 1, "credit card": 1, "ssn": 2, "social security": 2,
+    "hack": 1, "malware": 2, "exploit": 1
+}
+RISK_PATTERN = re.compile(r"\b(" + "|".join(re.escape(word) for word in RISK_LEXICON) + r")", re.I)
+
+# Zero width and bidirectional control characters, used to hide text from filters
+HIDDEN_CHARACTERS = re.compile("[\u200b-\u200f\u202a-\u202e\u2060-\u2064\u2066-\u2069\ufeff]")
+
+prefilter_stats = {"block": 0, "escalate": 0, "disagreements": 0}
+_stats_lock = threading.Lock()
+
+
+def _record(outcome: str) -> None:
+    with _stats_lock:
+        prefilter_stats[outcome] += 1
+
+
+def get_prefilter_stats() -> dict:
+    """
+    Decision counts of the pre-filter and the share of texts it settled locally.
+    """
+    with _stats_lock:
+        stats = dict(prefilter_stats)
+    total = stats["block"] + stats["escalate"]
+    stats["mode"] = prefilter_config["mode"]
+    stats["local_rate"] = round(stats["block"] / total, 4) if total else 0.0
+    return stats
+
+
+def record_disagreement() -> None:
+    # Shadow mode: the pre-filter would have blocked a text the guardrail let through
+    _record("disagreements")
+
+
+def _encoding_reasons(text: str) -> list:
+    reasons = []
+    if HIDDEN_CHARACTERS.search(text):
+        reasons.append("HIDDEN_CHARACTERS")
+    control = sum(1 for char in text if unicodedata.category(char) in ("Cc", "Cs", "Co") and char not in "\n\r\t")
+    if control:
+        reasons.append("CONTROL_CHARACTERS")
+    if text and sum(1 for char in text if not char.isascii()) / len(text) > prefilter_config["max_non_ascii_ratio"]:
+        reasons.append("NON_ASCII_TEXT")
+    return reasons
+
+
+def screen(text: str) -> dict:
+    """Screen a text locally before the Bedrock guardrail.
+
+    Args:
+        text (str): The text the guardrail would evaluate.
+
+    Returns:
+        dict: decision ("block" or "escalate"), reasons and risk score.
+    """
+    text = text or ""
+    reasons = []
+
+    # Long texts are not scanned, the guardrail decides
+    if len(text) > prefilter_config["max_chars"]:
+        reasons.append("TEXT_TOO_LONG")
+        return {"decision": ESCALATE, "reasons": reasons, "score": None}
+
+    for name, pattern in BLOCK_PATTERNS.items():
+        if pattern.search(text):
+            reasons.append(name)
+    if reasons:
+        return {"decision": BLOCK, "reasons": reasons, "score": None}
+
+    reasons.extend(_encoding_reasons(text))
+
+    matches = [match.lower() for match in RISK_PATTERN.findall(text)]
+    score = sum(RISK_LEXICON[match] for match in matches)
+    if matches:
+        reasons.append(f"RISK_TERMS:{','.join(sorted(set(matches)))}")
+    if score >= prefilter_config["block_score"]:
+        return {"decision": BLOCK, "reasons": reasons, "score": score}
+
+    return {"decision": ESCALATE, "reasons": reasons, "score": score}
+
+
+def prefilter_check(text: str, logger=None):
+    """
+    Run the pre-filter and count its decision.
+
+    Returns:
+        tuple: (decision, verdict) where verdict has the security_check shape for a local
+        block in enforce mode, None when the guardrail has to decide.
+    """
+    if prefilter_config["mode"] == "off":
+        return ESCALATE, None
+    result = screen(text)
+    decision = result["decision"]
+    _record(decision)
+    if decision == ESCALATE or prefilter_config["mode"] != "enforce":
+        return decision, None
+
+    if logger:
+        logger.info(f"Pre-filter decision: {decision} with reasons: {result['reasons']}")
+    return decision, {
+        "status": "PREFILTER_BLOCKED",
+        "is_blocked": True,
+        "reasons": [{"type": reason, "action": "BLOCKED"} for reason in result["reasons"]],
+        "details": {"source": "prefilter", "score": result["score"]}
+    }
@@ -0,0 +1,183 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+
+class JobQueue(ABC):
+    """
+    SQS-style interface for the job queue. A job is a list of records, each record is a
+    message: receive() claims messages and hides them for visibility_timeout seconds,
+    ack() stores the result and removes the message. Messages that are not acknowledged
+    (e.g. the process restarted) become visible again and are delivered to another worker,
+    up to max_attempts times, then they are dead-lettered with an error result.
+    """
+    @abstractmethod
+    def submit(self, records: list) -> str:
+        pass
+
+    @abstractmethod
+    def receive(self, max_messages: int, visibility_timeout: float) -> list:
+        pass
+
+    @abstractmethod
+    def ack(self, job_id: str, index: int, result) -> None:
+        pass
+
+    @abstractmethod
+    def status(self, job_id: str):
+        pass
+
+    @abstractmethod
+    def results(self, job_id: str, offset: int = 0, limit: int = 100) -> list:
+        pass
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    Durable local job queue backed by SQLite. Every record is checkpointed on its own,
+    so the progress of a job survives restarts. Several processes (e.g. uvicorn workers)
+    can share the same database, records are claimed atomically.
+    """
+    def __init__(self, db_path: str, max_attempts: int = 3) -> None:
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    total INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS job_records (
+                    job_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    result TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    visible_at REAL NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (job_id, idx)
+                );
+                CREATE INDEX IF NOT EXISTS job_records_pending ON job_records (status, visible_at);
+                """
+            )
+
+    @contextmanager
+    def _connect(self, immediate: bool = False):
+        # One short-lived connection per operation, committed on success and always closed.
+        # immediate takes the write lock up front, so a read-then-update is atomic across processes.
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None if immediate else "")
+        try:
+            if immediate:
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    yield connection
+                except BaseException:
+                    connection.execute("ROLLBACK")
+                    raise
+                connection.execute("COMMIT")
+            else:
+                with connection:
+                    yield connection
+        finally:
+            connection.close()
+
+    def submit(self, records: list) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                "INSERT INTO jobs (job_id, total, created_at) VALUES (?, ?, ?)",
+                (job_id, len(records), now)
+            )
+            connection.executemany(
+                "INSERT INTO job_records (job_id, idx, payload, updated_at) VALUES (?, ?, ?, ?)",
+                [(job_id, index, json.dumps(record), now) for index, record in enumerate(records)]
+            )
+        return job_id
+
+    def receive(self, max_messages: int, visibility_timeout: float) -> list:
+        """
+        Claim up to max_messages visible records. Visible records that were already
+        delivered max_attempts times are dead-lettered instead.
+
+        Returns:
+            list: dicts with job_id, index, attempts and record.
+        """
+        now = time.time()
+        with self._lock, self._connect(immediate=True) as connection:
+            connection.execute(
+                """
+                UPDATE job_records SET status = 'dead', result = ?, updated_at = ?
+                WHERE status IN ('pending', 'running') AND visible_at <= ? AND attempts >= ?
+                """,
+                (json.dumps({"error": f"Not acknowledged after {self.max_attempts} attempts"}), now, now, self.max_attempts)
+            )
+            rows = connection.execute(
+                """
+                SELECT job_id, idx, payload, attempts FROM job_records
+                WHERE status IN ('pending', 'running') AND visible_at <= ? AND attempts < ?
+                ORDER BY rowid LIMIT ?
+                """,
+                (now, self.max_attempts, max_messages)
+            ).fetchall()
+            connection.executemany(
+                """
+                UPDATE job_records SET status = 'running', attempts = attempts + 1, visible_at = ?, updated_at = ?
+                WHERE job_id = ? AND idx = ?
+                """,
+                [(now + visibility_timeout, now, job_id, index) for job_id, index, _, _ in rows]
+            )
+        return [
+            {"job_id": job_id, "index": index, "attempts": attempts + 1, "record": json.loads(payload)}
+            for job_id, index, payload, attempts in rows
+        ]
+
+    def ack(self, job_id: str, index: int, result) -> None:
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                "UPDATE job_records SET status = 'done', result = ?, updated_at = ? WHERE job_id = ? AND idx = ?",
+                (json.dumps(result), time.time(), job_id, index)
+            )
+
+    def status(self, job_id: str):
+        with self._connect() as connection:
+            job = connection.execute("SELECT total, created_at FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            counts = dict(connection.execute(
+                "SELECT status, COUNT(*) FROM job_records WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+        total, created_at = job
+        done, dead = counts.get("done", 0), counts.get("dead", 0)
+        return {
+            "job_id": job_id,
+            "status": "completed" if done + dead == total else ("running" if done or dead or counts.get("running") else "pending"),
+            "total": total,
+            "pending": counts.get("pending", 0),
+            "running": counts.get("running", 0),
+            "done": done,
+            "dead": dead,
+            "created_at": created_at
+        }
+
+    def results(self, job_id: str, offset: int = 0, limit: int = 100) -> list:
+        # Dead-lettered records are listed with their error result
+        with self._connect() as connection:
+            rows = connection.execute(
+                """
+                SELECT idx, result FROM job_records
+                WHERE job_id = ? AND status IN ('done', 'dead')
+                ORDER BY idx LIMIT ? OFFSET ?
+                """,
+                (job_id, limit, offset)
+            ).fetchall()
+        return [{"index": index, "result": json.loads(result)} for index, result in rows]
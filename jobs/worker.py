@@ -0,0 +1,99 @@
+import asyncio
+from core.batch import batch_context
+from jobs.job_queue import JobQueue
+
+
+class JobWorker:
+    """
+    This class drains the job queue with a rolling pool of max_workers records: a slot is
+    refilled from the queue as soon as its record completes. Every record result is
+    acknowledged (checkpointed) as soon as it completes, records that keep failing or
+    timing out are acknowledged with their error after max_attempts.
+    """
+    def __init__(self, queue: JobQueue, process, max_workers: int = 8, poll_interval: float = 1,
+                 visibility_timeout: float = 300, max_attempts: int = 3, record_timeout: float = None, logger=None) -> None:
+        self.queue = queue
+        self.process = process
+        self.max_workers = max(1, int(max_workers))
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.record_timeout = record_timeout
+        self.logger = logger
+        self._stopped = asyncio.Event()
+        self._in_flight = set()
+
+    def _finish(self, message: dict, result) -> None:
+        failed = isinstance(result, dict) and "error" in result
+        if failed and message["attempts"] < self.max_attempts:
+            # Leave the message unacknowledged, it is delivered again after the visibility timeout
+            self.logger.error(f"Job {message['job_id']} record {message['index']} failed on attempt {message['attempts']}")
+            return
+        self.queue.ack(message["job_id"], message["index"], result)
+
+    async def _process_message(self, message: dict):
+        record = message["record"]
+        record_id = record.get("feedback_id", "N/A") if isinstance(record, dict) else "N/A"
+        batch_context.set(True)
+        try:
+            result = await asyncio.wait_for(self.process(record), timeout=self.record_timeout)
+        except asyncio.TimeoutError:
+            result = {"feedback_id": record_id, "error": f"Timed out after {self.record_timeout} seconds"}
+        except asyncio.CancelledError:
+            # Stopped mid record: the last attempt is acknowledged with an error, earlier ones are delivered again
+            if message["attempts"] >= self.max_attempts:
+                self.queue.ack(message["job_id"], message["index"], {"feedback_id": record_id, "error": "Cancelled"})
+            raise
+        except Exception as e:
+            result = {"feedback_id": record_id, "error": str(e)}
+        await asyncio.to_thread(self._finish, message, result)
+        return result
+
+    async def run_once(self) -> int:
+        """
+        Claim records for the free slots and start them, without waiting for them to complete.
+
+        Returns:
+            int: The number of records claimed.
+        """
+        free = self.max_workers - len(self._in_flight)
+        if free <= 0:
+            return 0
+        messages = await asyncio.to_thread(self.queue.receive, free, self.visibility_timeout)
+        if messages:
+            self.logger.info(f"Job worker received {len(messages)} records")
+        for message in messages:
+            task = asyncio.create_task(self._process_message(message))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+        return len(messages)
+
+    async def run(self) -> None:
+        self.logger.info(f"Job worker started with {self.max_workers} workers")
+        stopped = asyncio.create_task(self._stopped.wait())
+        try:
+            while not self._stopped.is_set():
+                try:
+                    received = await self.run_once()
+                except Exception as e:
+                    self.logger.error(f"Error in job worker with error: {e}")
+                    received = 0
+                if received and len(self._in_flight) < self.max_workers:
+                    # More records may be waiting, claim them right away
+                    continue
+                # Wait for a free slot, or the poll interval when the queue was empty
+                await asyncio.wait(
+                    self._in_flight | {stopped},
+                    timeout=None if len(self._in_flight) >= self.max_workers else self.poll_interval,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+            # Let the records in flight finish and checkpoint
+            if self._in_flight:
+                await asyncio.gather(*self._in_flight, return_exceptions=True)
+        finally:
+            stopped.cancel()
+            for task in self._in_flight:
+                task.cancel()
+
+    def stop(self) -> None:
+        self._stopped.set()
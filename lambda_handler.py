@@ -1,19 +1,30 @@
+import contextvars
 import json
-import hashlib
-import uvicorn
-from fastapi import FastAPI
-from config import llm_config
+from concurrent.futures import ThreadPoolExecutor
+from config import llm_config, batch_config, guard_config, metrics_config, lambda_config
 from core.agents import master_agent
-from tools.tool_schemas import SubAgent
-from utils.utils import generate_function_schema
-from guard.gatekeeper import security_check
-from cache.cache import retrieve_feedback_cache, store_feedback_cache
+from core.llm import preload
+from core.batch import BatchExecutor
+from tools.registry import tool_registry
+from guard.gatekeeper import security_check, security_check_batch, guardrail_text
+from cache.single_flight import SingleFlight
+from cache.cache import build_cache_key, retrieve_feedback_cache, store_feedback_cache, deferred_writes, flush_deferred_writes
 from customLogger.cw_logger import setup_cloudwatch_logger
+from utils.aws_clients import warm_clients
+from utils.metrics import span, request_spans, emit_emf
+from typing import Literal, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
 logger, cloudwatch_handler = None, None
-logger, cloudwatch_handler = setup_cloudwatch_logger()
+# Built once per container at cold start: AWS clients, the master agent tool schema and litellm (in the background)
+warm_clients()
+if lambda_config["preload_litellm"]:
+    preload()
+MASTER_AGENT_TOOLS = tool_registry.schemas(["SubAgent"])
+single_flight = SingleFlight()
+# Speculative agent runs, one per batch worker
+speculation_pool = ThreadPoolExecutor(max_workers=batch_config["max_workers"], thread_name_prefix="speculative-agent")
 
 class Request(BaseModel):
     feedback_id: str
@@ -21,15 +32,52 @@ class Request(BaseModel):
     feedback_text: str
     timestamp: str
     instructions: str
+    # "fused" or "individual", defaults to the tool executor config
+    analysis_mode: Optional[Literal["fused", "individual"]] = None
+
+
+def speculative_agent(request: Request, cache_key: str, agent_kwargs: dict):
+    """
+    Run the master agent on the speculation pool while the security check runs. The agent
+    tool cache writes are held back until the guardrail clears the request. A blocked
+    request returns at once, but a run that already started cannot be interrupted: it keeps
+    its speculation pool thread and makes its LLM calls until it finishes, then its result
+    and cache writes are dropped.
+
+    Returns:
+        tuple: (response, shared) of the agent run, or (guardrail response, None) when blocked.
+    """
+    writes = []
+    context = contextvars.copy_context()
+    context.run(deferred_writes.set, writes)
+
+    logger.info(f"Security check and speculative master agent initiated for feedback_id: {request.feedback_id}")
+    agent_future = speculation_pool.submit(context.run, single_flight.do, cache_key, master_agent, **agent_kwargs)
+    cleared = False
+    try:
+        with span("security_check"):
+            response = security_check(text=guardrail_text(request.feedback_text, request.instructions), logger=logger)
+        if response["is_blocked"]:
+            logger.info("Security check failed for feedback_id: %s with response: %s", request.feedback_id, response)
+            return response, None
+        cleared = True
+    finally:
+        if not cleared:
+            agent_future.cancel()
+
+    with span("master_agent"):
+        response, shared = agent_future.result()
+    flush_deferred_writes(writes, logger)
+    return response, shared
 
 
 def invoke(request: Request):
     logger.info(f"Received request for feedback_id: {request.feedback_id}")
     # Check if the request is cached
-    cache_key_name = f"{request.feedback_text}_and_{request.instructions}"
-    cache_key = hashlib.sha256(cache_key_name.encode()).hexdigest()
+    cache_key = build_cache_key(request.feedback_text, request.instructions)
     logger.info(f"Cache key for feedback_id: {request.feedback_id} is: {cache_key}")
-    cached_result = retrieve_feedback_cache(request.feedback_id, cache_key, logger)
+    with span("feedback_cache"):
+        cached_result = retrieve_feedback_cache(request.feedback_id, cache_key, logger)
     if cached_result:
         output = {
             "cache_key": cache_key,
@@ -37,40 +85,86 @@ def invoke(request: Request):
             "cached_result": cached_result[cache_key]["cached_result"],
             "last_updated": cached_result[cache_key]["last_updated"]
         }
-        logger.info(f"Cache Hit: {output}")
+        logger.info("Cache Hit: %s", output)
         return output
 
-    # Security check
-    logger.info(f"Security check for feedback_id: {request.feedback_id}")
-    response = security_check(text=request.model_dump_json(), logger=logger)
-    if response["is_blocked"]:
-        logger.info(f"Security check failed for feedback_id: {request.feedback_id} with response: {response}")
-        return response
-    
-    logger.info(f"Master agent initiated for feedback_id: {request.feedback_id}")
-    response = master_agent(
-        input_request=request.model_dump(),
-        tools=[generate_function_schema(SubAgent)],
-        config=llm_config,
-        logger=logger
-    )
+    agent_kwargs = {
+        "input_request": request.model_dump(exclude_none=True),
+        "tools": MASTER_AGENT_TOOLS,
+        "config": llm_config,
+        "logger": logger
+    }
+    if guard_config["speculative"]:
+        response, shared = speculative_agent(request, cache_key, agent_kwargs)
+        if shared is None:
+            return response
+    else:
+        # Security check
+        logger.info(f"Security check for feedback_id: {request.feedback_id}")
+        with span("security_check"):
+            response = security_check(text=guardrail_text(request.feedback_text, request.instructions), logger=logger)
+        if response["is_blocked"]:
+            logger.info("Security check failed for feedback_id: %s with response: %s", request.feedback_id, response)
+            return response
 
-    logger.info(f"Master agent completed for feedback_id: {request.feedback_id} with response: {response}")
+        logger.info(f"Master agent initiated for feedback_id: {request.feedback_id}")
+        # Concurrent requests for the same cache key share one agent run
+        with span("master_agent"):
+            response, shared = single_flight.do(cache_key, master_agent, **agent_kwargs)
+    if shared and "agent_response" in response:
+        logger.info(f"Master agent result shared for feedback_id: {request.feedback_id} with cache_key: {cache_key}")
+        response = {**request.model_dump(exclude_none=True), "agent_response": response["agent_response"]}
+
+    logger.info("Master agent completed for feedback_id: %s with response: %s", request.feedback_id, response)
     # Store the response in the cache
-    last_updated = store_feedback_cache(request.feedback_id, cache_key, response["agent_response"], logger)
+    with span("store_cache"):
+        last_updated = store_feedback_cache(request.feedback_id, cache_key, response["agent_response"], logger)
     logger.info(f"Response stored in cache for feedback_id: {request.feedback_id} with cache_key: {cache_key}")
     response["last_updated"] = last_updated
     return response
 
 
 def batch_invoke(requests: list):
-    responses = []
-    for request in requests:
-        response = invoke(Request(**request))
-        responses.append(response)
-    return responses
+    batch_executor = BatchExecutor(**batch_config, logger=logger)
+    # Check the whole batch with grouped guardrail calls, the records then hit the verdict cache
+    if guard_config["verdict_cache_enabled"]:
+        with span("security_check_batch"):
+            security_check_batch([guardrail_text(request.get("feedback_text", ""), request.get("instructions", "")) for request in requests], logger)
+    # Duplicate records in the batch are executed once
+    return batch_executor.run(
+        requests,
+        lambda request: invoke(Request(**request)),
+        key=lambda request: (
+            request.get("feedback_id"),
+            build_cache_key(request.get("feedback_text", ""), request.get("instructions", ""))
+        )
+    )
+
+def setup_logger():
+    # The log pipeline is created on the first invocation instead of at import time
+    global logger, cloudwatch_handler
+    if logger is None:
+        logger, cloudwatch_handler = setup_cloudwatch_logger()
+    return logger
+
 
 def lambda_handler(event, context):
+    setup_logger()
+    # Stage timings of this invocation, written as one EMF record
+    spans = []
+    token = request_spans.set(spans)
+    try:
+        with span("request", route=event.get("path", "unknown")):
+            return route(event)
+    finally:
+        request_spans.reset(token)
+        if metrics_config["emf_enabled"]:
+            emit_emf(spans, event.get("path", "unknown"))
+        # Write the queued records out before the container is frozen (stdout by default on Lambda)
+        cloudwatch_handler.flush()
+
+
+def route(event):
     body = json.loads(event.get("body", "{'stream': False, 'request': None}"))
     if event["path"] == "/handshake" and event["httpMethod"] == "GET":
         return {
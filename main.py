@@ -1,26 +1,65 @@
-import hashlib
+import asyncio
+import json
 import uvicorn
-from fastapi import FastAPI
-from config import llm_config
-from core.agents import master_agent
-from tools.tool_schemas import SubAgent
-from utils.utils import generate_function_schema
-from guard.gatekeeper import security_check
-from cache.cache import retrieve_feedback_cache, store_feedback_cache
+from fastapi import FastAPI, HTTPException, Request as HTTPRequest
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from config import llm_config, batch_config, jobs_config, guard_config
+from core.agents import amaster_agent
+from core.batch import BatchExecutor
+from tools.registry import tool_registry
+from guard.gatekeeper import asecurity_check, asecurity_check_batch, guardrail_text
+from guard.prefilter import get_prefilter_stats
+from cache.single_flight import SingleFlight
+from cache.cache import build_cache_key, aretrieve_feedback_cache, astore_feedback_cache, get_cache_stats, deferred_writes, aflush_deferred_writes
 from customLogger.cw_logger import setup_cloudwatch_logger
+from utils.aws_clients import warm_clients
+from utils.event_loop import install_executor, set_loop
+from utils.jsonl import iter_lines, to_ndjson
+from utils.metrics import metrics, span, RequestTimingMiddleware
+from jobs.job_queue import SQLiteJobQueue
+from jobs.worker import JobWorker
 
 
+from typing import Literal, Optional
 from pydantic import BaseModel
 from datetime import datetime
 from contextlib import asynccontextmanager
 
 logger, cloudwatch_handler = None, None
+job_queue, job_worker = None, None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global logger, cloudwatch_handler
+    global logger, cloudwatch_handler, job_queue, job_worker
     logger, cloudwatch_handler = setup_cloudwatch_logger()
+    # Blocking boto3 calls run on a thread pool sized to the connection pool,
+    # sync callers (e.g. the packed batcher threads) run their coroutines on this loop
+    install_executor()
+    set_loop(asyncio.get_running_loop())
+    warm_clients()
+
+    # Background worker draining the job queue
+    worker_task = None
+    if jobs_config["enabled"]:
+        if not jobs_config["db_path"]:
+            raise ValueError("JOBS_DB_PATH must be set when JOBS_ENABLED is true")
+        job_queue = SQLiteJobQueue(jobs_config["db_path"], max_attempts=jobs_config["max_attempts"])
+        job_worker = JobWorker(
+            queue=job_queue,
+            process=process_job_record,
+            max_workers=jobs_config["max_workers"],
+            poll_interval=jobs_config["poll_interval"],
+            visibility_timeout=jobs_config["visibility_timeout"],
+            max_attempts=jobs_config["max_attempts"],
+            record_timeout=batch_config["record_timeout"],
+            logger=logger
+        )
+        worker_task = asyncio.create_task(job_worker.run())
     yield
+    if worker_task is not None:
+        job_worker.stop()
+        await worker_task
+    set_loop(None)
     try:
         logger.removeHandler(cloudwatch_handler)
         cloudwatch_handler.close()
@@ -28,6 +67,9 @@ async def lifespan(app: FastAPI):
         print(f"Error during cleanup: {e}")
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(RequestTimingMiddleware)
+single_flight = SingleFlight()
+MASTER_AGENT_TOOLS = tool_registry.schemas(["SubAgent"])
 
 
 class Request(BaseModel):
@@ -36,6 +78,44 @@ class Request(BaseModel):
     feedback_text: str
     timestamp: str
     instructions: str
+    # "fused" or "individual", defaults to the tool executor config
+    analysis_mode: Optional[Literal["fused", "individual"]] = None
+
+
+async def speculative_agent(request: Request, cache_key: str, agent_kwargs: dict):
+    """
+    Run the master agent concurrently with the security check. The agent tool cache writes
+    are held back until the guardrail clears the request, a blocked request cancels the run.
+
+    Returns:
+        tuple: (response, shared) of the agent run, or (guardrail response, None) when blocked.
+    """
+    writes = []
+
+    async def run_agent():
+        deferred_writes.set(writes)
+        return await single_flight.ado(cache_key, amaster_agent, **agent_kwargs)
+
+    logger.info(f"Security check and speculative master agent initiated for feedback_id: {request.feedback_id}")
+    agent_task = asyncio.ensure_future(run_agent())
+    cleared = False
+    try:
+        with span("security_check"):
+            response = await asecurity_check(text=guardrail_text(request.feedback_text, request.instructions), logger=logger)
+        if response["is_blocked"]:
+            logger.info("Security check failed for feedback_id: %s with response: %s", request.feedback_id, response)
+            # Stop the run unless other requests are awaiting it
+            single_flight.cancel(cache_key)
+            return response, None
+        cleared = True
+    finally:
+        if not cleared:
+            agent_task.cancel()
+
+    with span("master_agent"):
+        response, shared = await agent_task
+    await aflush_deferred_writes(writes, logger)
+    return response, shared
 
 
 @app.post("/invoke")
@@ -43,10 +123,10 @@ async def root(request: Request):
     try:
         logger.info(f"Received request for feedback_id: {request.feedback_id}")
         # Check if the request is cached
-        cache_key_name = f"{request.feedback_text}_and_{request.instructions}"
-        cache_key = hashlib.sha256(cache_key_name.encode()).hexdigest()
+        cache_key = build_cache_key(request.feedback_text, request.instructions)
         logger.info(f"Cache key for feedback_id: {request.feedback_id} is: {cache_key}")
-        cached_result = retrieve_feedback_cache(request.feedback_id, cache_key, logger)
+        with span("feedback_cache"):
+            cached_result = await aretrieve_feedback_cache(request.feedback_id, cache_key, logger)
         if cached_result:
             output = {
                 "cache_key": cache_key,
@@ -54,27 +134,40 @@ async def root(request: Request):
                 "cached_result": cached_result[cache_key]["cached_result"],
                 "last_updated": cached_result[cache_key]["last_updated"]
             }
-            logger.info(f"Cache Hit: {output}")
+            logger.info("Cache Hit: %s", output)
             return output
 
-        # Security check
-        logger.info(f"Security check for feedback_id: {request.feedback_id}")
-        response = security_check(text=request.model_dump_json(), logger=logger)
-        if response["is_blocked"]:
-            logger.info(f"Security check failed for feedback_id: {request.feedback_id} with response: {response}")
-            return response
-        
-        logger.info(f"Master agent initiated for feedback_id: {request.feedback_id}")
-        response = master_agent(
-            input_request=request.model_dump(),
-            tools=[generate_function_schema(SubAgent)],
-            config=llm_config,
-            logger=logger
-        )
+        agent_kwargs = {
+            "input_request": request.model_dump(exclude_none=True),
+            "tools": MASTER_AGENT_TOOLS,
+            "config": llm_config,
+            "logger": logger
+        }
+        if guard_config["speculative"]:
+            response, shared = await speculative_agent(request, cache_key, agent_kwargs)
+            if shared is None:
+                return response
+        else:
+            # Security check
+            logger.info(f"Security check for feedback_id: {request.feedback_id}")
+            with span("security_check"):
+                response = await asecurity_check(text=guardrail_text(request.feedback_text, request.instructions), logger=logger)
+            if response["is_blocked"]:
+                logger.info("Security check failed for feedback_id: %s with response: %s", request.feedback_id, response)
+                return response
 
-        logger.info(f"Master agent completed for feedback_id: {request.feedback_id} with response: {response}")
+            logger.info(f"Master agent initiated for feedback_id: {request.feedback_id}")
+            # Concurrent requests for the same cache key share one agent run
+            with span("master_agent"):
+                response, shared = await single_flight.ado(cache_key, amaster_agent, **agent_kwargs)
+        if shared and "agent_response" in response:
+            logger.info(f"Master agent result shared for feedback_id: {request.feedback_id} with cache_key: {cache_key}")
+            response = {**request.model_dump(exclude_none=True), "agent_response": response["agent_response"]}
+
+        logger.info("Master agent completed for feedback_id: %s with response: %s", request.feedback_id, response)
         # Store the response in the cache
-        last_updated = store_feedback_cache(request.feedback_id, cache_key, response["agent_response"], logger)
+        with span("store_cache"):
+            last_updated = await astore_feedback_cache(request.feedback_id, cache_key, response["agent_response"], logger)
         logger.info(f"Response stored in cache for feedback_id: {request.feedback_id} with cache_key: {cache_key}")
         response["last_updated"] = last_updated
         return response
@@ -89,22 +182,96 @@ class BatchRequest(BaseModel):
 @app.post("/batch-invoke")
 async def batch_invoke(request: BatchRequest):
     try:
-        # TODO: Make parallel requests for faster processing
-        # Calculation : number of cores on the machine * 2 (for parallel processing)
-        # Example : 4 cores = 8 requests per second
-        # TODO: ADD a queue to the requests
         logger.info(f"Received batch request for {len(request.requests)} requests")
-        output = []
-        for req in request.requests:
-            logger.info(f"Processing request: {req.feedback_id}")
-            response = await root(req)
-            logger.info(f"Response for request: {req.feedback_id} is: {response}")
-            output.append(response)
+        batch_executor = BatchExecutor(**batch_config, logger=logger)
+        # Check the whole batch with grouped guardrail calls, the records then hit the verdict cache
+        if guard_config["verdict_cache_enabled"]:
+            with span("security_check_batch"):
+                await asecurity_check_batch([guardrail_text(req.feedback_text, req.instructions) for req in request.requests], logger)
+        # Duplicate records in the batch are executed once
+        output = await batch_executor.arun(
+            request.requests,
+            root,
+            key=lambda req: (req.feedback_id, build_cache_key(req.feedback_text, req.instructions))
+        )
+        logger.info(f"Batch request processed for {len(output)} requests")
         return {"message": "Batch request processed successfully", "output": output}
     except Exception as e:
         logger.error(f"Error in batch invoke with error: {e}")
         return {"error": str(e)}
 
+
+async def process_jsonl_record(line):
+    return await root(Request(**json.loads(line)))
+
+
+@app.post("/batch-invoke/stream")
+async def batch_invoke_stream(http_request: HTTPRequest):
+    """
+    Streaming batch: the body is JSONL (one request per line) and the results are streamed
+    back as NDJSON lines ({"index": ..., "result": ...}) in completion order.
+    """
+    logger.info("Received streaming batch request")
+    # The body has to be read before the response starts, the streaming response listens
+    # on the same channel for client disconnects. Records are still parsed one at a time.
+    body = await http_request.body()
+    batch_executor = BatchExecutor(**batch_config, logger=logger)
+
+    async def results():
+        async for index, result in batch_executor.astream(iter_lines(body), process_jsonl_record):
+            yield to_ndjson(index, result)
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+async def process_job_record(record: dict):
+    return await root(Request(**record))
+
+
+@app.post("/jobs")
+async def submit_job(request: BatchRequest):
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="Job queue is disabled")
+    job_id = await asyncio.to_thread(job_queue.submit, [req.model_dump(exclude_none=True) for req in request.requests])
+    logger.info(f"Job {job_id} submitted with {len(request.requests)} requests")
+    return {"job_id": job_id, "status": "pending", "total": len(request.requests)}
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="Job queue is disabled")
+    status = await asyncio.to_thread(job_queue.status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
+
+
+@app.get("/jobs/{job_id}/results")
+async def job_results(job_id: str, offset: int = 0, limit: int = 100):
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="Job queue is disabled")
+    status = await asyncio.to_thread(job_queue.status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    results = await asyncio.to_thread(job_queue.results, job_id, offset, limit)
+    return {**status, "offset": offset, "results": results}
+
+
+@app.get("/cache-stats")
+async def cache_stats():
+    return get_cache_stats()
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/guard-stats")
+async def guard_stats():
+    return get_prefilter_stats()
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
 
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import time
+from core.batch import BatchExecutor, in_batch
+
+logger = logging.getLogger("test")
+
+
+def test_results_keep_the_input_order():
+    async def worker(record):
+        # Later records finish first
+        await asyncio.sleep(0.01 * (5 - record["n"]))
+        return record["n"]
+
+    records = [{"feedback_id": str(n), "n": n} for n in range(5)]
+    assert BatchExecutor(max_workers=5, logger=logger).run(records, worker) == [0, 1, 2, 3, 4]
+
+
+def test_sync_workers_run_on_the_pool_in_order():
+    def worker(record):
+        time.sleep(0.01 * (3 - record))
+        return record * 2
+
+    assert BatchExecutor(max_workers=3, logger=logger).run([0, 1, 2], worker) == [0, 2, 4]
+
+
+def test_in_flight_records_are_bounded():
+    running, peak = 0, 0
+
+    async def worker(record):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return record
+
+    BatchExecutor(max_workers=2, logger=logger).run(list(range(6)), worker)
+    assert peak == 2
+
+
+def test_timeout_and_errors_only_fail_their_record():
+    async def worker(record):
+        if record["feedback_id"] == "slow":
+            await asyncio.sleep(1)
+        if record["feedback_id"] == "bad":
+            raise ValueError("boom")
+        return record["feedback_id"]
+
+    records = [{"feedback_id": "ok"}, {"feedback_id": "slow"}, {"feedback_id": "bad"}]
+    results = BatchExecutor(max_workers=3, record_timeout=0.05, logger=logger).run(records, worker)
+    assert results[0] == "ok"
+    assert results[1] == {"feedback_id": "slow", "error": "Timed out after 0.05 seconds"}
+    assert results[2] == {"feedback_id": "bad", "error": "boom"}
+
+
+def test_workers_run_in_the_batch_context():
+    assert BatchExecutor(logger=logger).run([1], lambda record: in_batch()) == [True]
+    assert not in_batch()
+
+
+def test_duplicate_records_run_once_and_share_the_result():
+    calls = []
+
+    async def worker(record):
+        calls.append(record["feedback_id"])
+        return {"feedback_id": record["feedback_id"], "text": record["text"]}
+
+    records = [
+        {"feedback_id": "1", "text": "late"},
+        {"feedback_id": "2", "text": "late"},
+        {"feedback_id": "1", "text": "late"},
+    ]
+    results = BatchExecutor(logger=logger).run(records, worker, key=lambda record: (record["feedback_id"], record["text"]))
+    assert sorted(calls) == ["1", "2"]
+    assert results[0] == results[2] == {"feedback_id": "1", "text": "late"}
+    assert results[1]["feedback_id"] == "2"
+
+
+def test_streaming_yields_every_index_as_records_complete():
+    async def worker(record):
+        await asyncio.sleep(0.02 * (3 - record))
+        return record
+
+    async def collect():
+        return [item async for item in BatchExecutor(max_workers=3, logger=logger).astream(iter(range(3)), worker)]
+
+    results = asyncio.run(collect())
+    assert [index for index, _ in results] == [2, 1, 0]
+    assert all(index == result for index, result in results)
@@ -0,0 +1,87 @@
+import json
+import logging
+import pytest
+from cache import cache
+from config import cache_config
+
+logger = logging.getLogger("tests")
+
+
+class FakeDynamoDB:
+    """Records the calls, batch_get_item leaves the first unprocessed_calls key lists unprocessed."""
+    def __init__(self, items: list = (), unprocessed_calls: int = 0) -> None:
+        self.items = {(item["feedback_id"]["S"], item["cache_key"]["S"]): item for item in items}
+        self.unprocessed_calls = unprocessed_calls
+        self.calls = []
+
+    def put_item(self, TableName, Item):
+        self.calls.append(("put_item", Item))
+        self.items[(Item["feedback_id"]["S"], Item["cache_key"]["S"])] = Item
+
+    def query(self, TableName, KeyConditionExpression, ExpressionAttributeValues):
+        feedback_id = ExpressionAttributeValues[":fid"]["S"]
+        return {"Items": [item for (partition, _), item in self.items.items() if partition == feedback_id]}
+
+    def batch_get_item(self, RequestItems):
+        (table_name, request), = RequestItems.items()
+        keys = request["Keys"]
+        assert len(keys) <= 100
+        self.calls.append(("batch_get_item", len(keys)))
+        if self.unprocessed_calls:
+            self.unprocessed_calls -= 1
+            return {"Responses": {table_name: []}, "UnprocessedKeys": RequestItems}
+        found = [self.items[(key["feedback_id"]["S"], key["cache_key"]["S"])] for key in keys]
+        return {"Responses": {table_name: found}, "UnprocessedKeys": {}}
+
+
+@pytest.fixture
+def dynamodb(monkeypatch):
+    fake = FakeDynamoDB()
+    monkeypatch.setattr(cache, "get_client", lambda name: fake)
+    monkeypatch.setattr(cache.time, "sleep", lambda seconds: None)
+    monkeypatch.setitem(cache_config, "l1_enabled", False)
+    return fake
+
+
+def result_item(partition_key: str, cache_key: str) -> dict:
+    return {
+        "feedback_id": {"S": partition_key}, "cache_key": {"S": cache_key},
+        "cached_result": {"S": json.dumps([cache_key])}, "last_updated": {"S": "now"}
+    }
+
+
+def alias_item(feedback_id: str, cache_key: str) -> dict:
+    return {
+        "feedback_id": {"S": feedback_id}, "cache_key": {"S": cache_key},
+        "alias_of": {"S": f"content#{cache_key}"}, "last_updated": {"S": "now"}
+    }
+
+
+def test_alias_is_written_after_the_result(dynamodb, monkeypatch):
+    monkeypatch.setitem(cache_config, "mode", "content")
+    cache.store_feedback_cache("f1", "k1", ["result"], logger)
+    assert [item["feedback_id"]["S"] for _, item in dynamodb.calls] == ["content#k1", "f1"]
+    assert dynamodb.calls[1][1]["alias_of"]["S"] == "content#k1"
+
+
+def test_aliases_are_resolved_in_chunks(dynamodb):
+    for index in range(250):
+        dynamodb.items[(f"content#k{index}", f"k{index}")] = result_item(f"content#k{index}", f"k{index}")
+        dynamodb.items[("f1", f"k{index}")] = alias_item("f1", f"k{index}")
+    output = cache.retrieve_feedback_cache("f1", logger=logger)
+    assert len(output) == 250
+    assert dynamodb.calls == [("batch_get_item", 100), ("batch_get_item", 100), ("batch_get_item", 50)]
+
+
+def test_unprocessed_keys_are_retried(dynamodb):
+    dynamodb.items[("content#k1", "k1")] = result_item("content#k1", "k1")
+    dynamodb.items[("f1", "k1")] = alias_item("f1", "k1")
+    dynamodb.unprocessed_calls = 2
+    assert cache.retrieve_feedback_cache("f1", logger=logger) == {"k1": {"cached_result": ["k1"], "last_updated": "now"}}
+    assert len(dynamodb.calls) == 3
+
+
+def test_keys_left_unprocessed_fail_the_lookup(dynamodb):
+    dynamodb.items[("f1", "k1")] = alias_item("f1", "k1")
+    dynamodb.unprocessed_calls = 100
+    assert cache.retrieve_feedback_cache("f1", logger=logger) is None
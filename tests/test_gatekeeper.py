@@ -0,0 +1,77 @@
+import logging
+import pytest
+import guard.gatekeeper as gatekeeper
+from config import guard_config, prefilter_config
+from cache.memory_cache import MemoryCache
+
+logger = logging.getLogger("test")
+
+
+class Guardrail:
+    """Fake Bedrock guardrail that intervenes on texts mentioning an attack."""
+    def __init__(self) -> None:
+        self.calls = []
+
+    def __call__(self, texts: list) -> dict:
+        self.calls.append(list(texts))
+        if any("attack" in text for text in texts):
+            return {"action": "GUARDRAIL_INTERVENED", "assessments": []}
+        return {"action": "NONE"}
+
+
+@pytest.fixture
+def guardrail(monkeypatch):
+    fake = Guardrail()
+    monkeypatch.setattr(gatekeeper, "_apply_guardrail", fake)
+    monkeypatch.setattr(gatekeeper, "verdict_cache", MemoryCache(max_entries=100, ttl=60))
+    monkeypatch.setitem(guard_config, "verdict_cache_enabled", True)
+    monkeypatch.setitem(prefilter_config, "mode", "off")
+    return fake
+
+
+def test_verdicts_are_cached_by_normalized_text(guardrail):
+    assert gatekeeper.security_check("Late  delivery", logger)["is_blocked"] is False
+    assert gatekeeper.security_check("late delivery ", logger)["is_blocked"] is False
+    assert guardrail.calls == [["Late  delivery"]]
+
+
+def test_blocked_and_allowed_verdicts_have_their_own_ttl(guardrail, monkeypatch):
+    ttls = []
+    monkeypatch.setattr(gatekeeper.verdict_cache, "set", lambda key, value, ttl=None: ttls.append(ttl))
+    gatekeeper.security_check("fine", logger)
+    gatekeeper.security_check("attack", logger)
+    assert ttls == [guard_config["allowed_ttl"], guard_config["blocked_ttl"]]
+
+
+def test_failed_checks_are_not_cached(guardrail, monkeypatch):
+    def failing(texts):
+        raise RuntimeError("throttled")
+
+    monkeypatch.setattr(gatekeeper, "_apply_guardrail", failing)
+    assert "error" in gatekeeper.security_check("fine", logger)
+    monkeypatch.setattr(gatekeeper, "_apply_guardrail", guardrail)
+    assert gatekeeper.security_check("fine", logger)["is_blocked"] is False
+    assert guardrail.calls == [["fine"]]
+
+
+def test_batch_groups_texts_by_size_and_checks_duplicates_once(guardrail, monkeypatch):
+    monkeypatch.setitem(guard_config, "batch_max_chars", 10)
+    verdicts = gatekeeper.security_check_batch(["aaaa", "bbbb", "aaaa", "cccc"], logger)
+    assert [verdict["is_blocked"] for verdict in verdicts] == [False] * 4
+    assert guardrail.calls == [["aaaa", "bbbb"], ["cccc"]]
+    # The per-record checks of the batch hit the cache
+    gatekeeper.security_check("bbbb", logger)
+    assert len(guardrail.calls) == 2
+
+
+def test_blocked_group_is_checked_text_by_text(guardrail):
+    verdicts = gatekeeper.security_check_batch(["fine", "attack", "also fine"], logger)
+    assert [verdict["is_blocked"] for verdict in verdicts] == [False, True, False]
+    assert guardrail.calls == [["fine", "attack", "also fine"], ["fine"], ["attack"], ["also fine"]]
+
+
+def test_cached_verdicts_skip_the_guardrail(guardrail):
+    gatekeeper.security_check("attack", logger)
+    verdicts = gatekeeper.security_check_batch(["attack", "fine"], logger)
+    assert [verdict["is_blocked"] for verdict in verdicts] == [True, False]
+    assert guardrail.calls == [["attack"], ["fine"]]
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import pytest
+from jobs.job_queue import JobQueue, SQLiteJobQueue
+from jobs.worker import JobWorker
+
+logger = logging.getLogger("tests")
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SQLiteJobQueue(str(tmp_path / "jobs.db"), max_attempts=2)
+
+
+def test_job_queue_is_abstract():
+    with pytest.raises(TypeError):
+        JobQueue()
+
+
+def test_submit_receive_ack(queue):
+    job_id = queue.submit([{"feedback_id": "1"}, {"feedback_id": "2"}])
+    assert queue.status(job_id)["status"] == "pending"
+
+    messages = queue.receive(10, visibility_timeout=60)
+    assert [(message["index"], message["attempts"], message["record"]) for message in messages] == [
+        (0, 1, {"feedback_id": "1"}), (1, 1, {"feedback_id": "2"})
+    ]
+    # Claimed records are hidden until the visibility timeout
+    assert queue.receive(10, visibility_timeout=60) == []
+    assert queue.status(job_id)["running"] == 2
+
+    queue.ack(job_id, 1, {"ok": 2})
+    queue.ack(job_id, 0, {"ok": 1})
+    status = queue.status(job_id)
+    assert (status["status"], status["done"]) == ("completed", 2)
+    assert queue.results(job_id) == [{"index": 0, "result": {"ok": 1}}, {"index": 1, "result": {"ok": 2}}]
+    assert queue.results(job_id, offset=1, limit=1) == [{"index": 1, "result": {"ok": 2}}]
+
+
+def test_receive_respects_max_messages(queue):
+    queue.submit([{"feedback_id": str(index)} for index in range(5)])
+    assert len(queue.receive(3, visibility_timeout=60)) == 3
+    assert len(queue.receive(3, visibility_timeout=60)) == 2
+
+
+def test_unknown_job(queue):
+    assert queue.status("missing") is None
+    assert queue.results("missing") == []
+
+
+def test_unacknowledged_records_are_redelivered_then_dead_lettered(queue):
+    job_id = queue.submit([{"feedback_id": "1"}])
+    assert queue.receive(1, visibility_timeout=0)[0]["attempts"] == 1
+    assert queue.receive(1, visibility_timeout=0)[0]["attempts"] == 2
+    # max_attempts reached: no third delivery, the record completes with an error
+    assert queue.receive(1, visibility_timeout=0) == []
+    status = queue.status(job_id)
+    assert (status["status"], status["dead"]) == ("completed", 1)
+    assert "error" in queue.results(job_id)[0]["result"]
+
+
+def test_queue_is_shared_by_connections(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    job_id = SQLiteJobQueue(path).submit([{"feedback_id": "1"}])
+    other = SQLiteJobQueue(path)
+    assert other.receive(1, visibility_timeout=60)[0]["job_id"] == job_id
+    assert other.receive(1, visibility_timeout=60) == []
+
+
+def run_worker(queue, job_id, process, **kwargs):
+    async def run():
+        worker = JobWorker(queue, process, max_workers=2, poll_interval=0.01, visibility_timeout=0,
+                           max_attempts=queue.max_attempts, logger=logger, **kwargs)
+        task = asyncio.create_task(worker.run())
+        while queue.status(job_id)["status"] != "completed":
+            await asyncio.sleep(0.01)
+        worker.stop()
+        await asyncio.wait_for(task, 5)
+    asyncio.run(asyncio.wait_for(run(), 10))
+    return queue.results(job_id)
+
+
+def test_worker_processes_every_record(queue):
+    job_id = queue.submit([{"feedback_id": str(index)} for index in range(5)])
+
+    async def process(record):
+        return {"feedback_id": record["feedback_id"], "agent_response": "ok"}
+
+    results = run_worker(queue, job_id, process)
+    assert [result["result"]["feedback_id"] for result in results] == ["0", "1", "2", "3", "4"]
+
+
+def test_worker_poison_record_is_acknowledged_after_max_attempts(queue):
+    job_id = queue.submit([{"feedback_id": "poison"}, {"feedback_id": "ok"}])
+    attempts = []
+
+    async def process(record):
+        if record["feedback_id"] == "poison":
+            attempts.append(record)
+            raise RuntimeError("boom")
+        return {"feedback_id": "ok"}
+
+    results = run_worker(queue, job_id, process)
+    assert len(attempts) == queue.max_attempts
+    assert results[0]["result"] == {"feedback_id": "poison", "error": "boom"}
+    assert results[1]["result"] == {"feedback_id": "ok"}
+
+
+def test_worker_times_out_hanging_records(queue):
+    job_id = queue.submit([{"feedback_id": "slow"}])
+
+    async def process(record):
+        await asyncio.sleep(60)
+
+    results = run_worker(queue, job_id, process, record_timeout=0.05)
+    assert "Timed out" in results[0]["result"]["error"]
+    assert queue.status(job_id)["done"] == 1
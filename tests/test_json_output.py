@@ -0,0 +1,43 @@
+import pytest
+from utils.json_output import extract_json
+
+
+def test_plain_json():
+    assert extract_json('{"positive": 0.8, "negative": 0.1, "neutral": 0.1}') == {"positive": 0.8, "negative": 0.1, "neutral": 0.1}
+
+
+def test_fenced_block_with_prose():
+    content = 'Here is the result:\n```json\n{"category": "Delivery", "score": 0.9}\n```\nHope this helps.'
+    assert extract_json(content) == {"category": "Delivery", "score": 0.9}
+
+
+def test_first_value_in_prose():
+    assert extract_json('The keywords are [{"keyword": "battery", "relevance": 0.7}] as requested.') == [{"keyword": "battery", "relevance": 0.7}]
+
+
+def test_prose_braces_before_the_value_are_skipped():
+    assert extract_json('Scores {see below}: {"positive": 1}') == {"positive": 1}
+
+
+@pytest.mark.parametrize("content, expected", [
+    ('{"a": 1, "b": [1, 2,],}', {"a": 1, "b": [1, 2]}),
+    ('{“a”: “x”}', {"a": "x"}),
+    ('{"ok": True, "missing": None}', {"ok": True, "missing": None}),
+])
+def test_repairs(content, expected):
+    assert extract_json(content) == expected
+
+
+def test_python_literals_inside_strings_are_kept():
+    assert extract_json('{"text": "True story", "ok": True,}') == {"text": "True story", "ok": True}
+
+
+def test_repairs_leave_string_values_untouched():
+    content = '{"summary": "None of the items, ] were False, }", "note": "say \\"None, ]\\"", "ok": None,}'
+    assert extract_json(content) == {"summary": "None of the items, ] were False, }", "note": 'say "None, ]"', "ok": None}
+
+
+@pytest.mark.parametrize("content", ["", None, "   ", "no json here", "{not: json"])
+def test_malformed_output_raises(content):
+    with pytest.raises(ValueError):
+        extract_json(content)
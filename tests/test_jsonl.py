@@ -0,0 +1,18 @@
+import json
+from utils.jsonl import iter_jsonl_file, iter_lines, to_ndjson
+
+
+def test_iter_lines_skips_blank_lines():
+    assert list(iter_lines(b'{"a": 1}\n\n  \n{"b": 2}')) == [b'{"a": 1}', b'{"b": 2}']
+
+
+def test_iter_jsonl_file_skips_blank_lines(tmp_path):
+    path = tmp_path / "feedback.jsonl"
+    path.write_text('{"a": 1}\n\n{"b": 2}\n', encoding="utf-8")
+    assert [json.loads(line) for line in iter_jsonl_file(str(path))] == [{"a": 1}, {"b": 2}]
+
+
+def test_to_ndjson_writes_one_line_per_result():
+    line = to_ndjson(3, {"feedback_id": "1"})
+    assert line.endswith("\n") and line.count("\n") == 1
+    assert json.loads(line) == {"index": 3, "result": {"feedback_id": "1"}}
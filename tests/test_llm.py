@@ -0,0 +1,109 @@
+import asyncio
+import pytest
+import core.llm as llm
+from config import resilience_config
+from core.llm import DeploymentRouter, RateLimiter
+
+
+class APIError(Exception):
+    def __init__(self, status_code: int) -> None:
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class Response:
+    def __init__(self, model: str) -> None:
+        self.model = model
+        self.usage = None
+
+
+@pytest.fixture
+def deployments(monkeypatch):
+    router = DeploymentRouter([{"model": "a"}, {"model": "b"}])
+    monkeypatch.setattr(llm, "router", router)
+    monkeypatch.setattr(llm, "rate_limiter", RateLimiter(tpm=60000, burst_seconds=1))
+    monkeypatch.setattr(llm, "latency_tracker", llm.LatencyTracker())
+    monkeypatch.setattr(llm, "backoff", lambda attempt, error: 0)
+    monkeypatch.setitem(resilience_config, "max_retries", 2)
+    monkeypatch.setitem(resilience_config, "hedge_enabled", False)
+    return router
+
+
+def completion(behaviour: dict, calls: list):
+    """behaviour: model -> (delay, error or None)"""
+    async def acompletion(model, messages, **kwargs):
+        calls.append(model)
+        delay, error = behaviour[model]
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return Response(model)
+    return acompletion
+
+
+def chat():
+    return asyncio.run(llm.achat_completion({"model": "default"}, [{"role": "user", "content": "hi"}]))
+
+
+def test_transient_error_fails_over_to_the_other_deployment(deployments, monkeypatch):
+    calls = []
+    monkeypatch.setattr(llm, "acompletion", completion({"a": (0, APIError(503)), "b": (0, None)}, calls))
+    monkeypatch.setattr(deployments, "choose", lambda exclude=(): 0 if not exclude else 1)
+    assert chat().model == "b"
+    assert calls == ["a", "b"]
+    assert deployments.unhealthy_until[0] > 0 and deployments.unhealthy_until[1] == 0
+
+
+def test_permanent_error_is_not_retried_and_keeps_the_deployment_healthy(deployments, monkeypatch):
+    calls = []
+    monkeypatch.setattr(llm, "acompletion", completion({"a": (0, APIError(400)), "b": (0, APIError(400))}, calls))
+    with pytest.raises(APIError):
+        chat()
+    assert len(calls) == 1
+    assert deployments.unhealthy_until == [0.0, 0.0]
+
+
+def test_retries_are_bounded(deployments, monkeypatch):
+    calls = []
+    monkeypatch.setattr(llm, "acompletion", completion({"a": (0, APIError(500)), "b": (0, APIError(500))}, calls))
+    with pytest.raises(APIError):
+        chat()
+    assert len(calls) == resilience_config["max_retries"] + 1
+
+
+def test_router_skips_unhealthy_deployments(deployments):
+    deployments.failure(0)
+    assert {deployments.choose() for _ in range(20)} == {1}
+    deployments.success(0)
+    assert deployments.unhealthy_until[0] == 0
+
+
+def test_slow_call_is_hedged_and_the_loser_settled(deployments, monkeypatch):
+    calls = []
+    monkeypatch.setattr(llm, "acompletion", completion({"a": (1, None), "b": (0.01, None)}, calls))
+    monkeypatch.setattr(deployments, "choose", lambda exclude=(): 0 if not exclude else 1)
+    monkeypatch.setattr(llm, "hedge_delay", lambda: 0.05)
+    records = []
+    record = llm.rate_limiter.record
+    monkeypatch.setattr(llm.rate_limiter, "record", lambda *args, **kwargs: records.append(kwargs) or record(*args, **kwargs))
+
+    async def run():
+        response = await llm.achat_completion({"model": "default"}, [{"role": "user", "content": "hi"}])
+        # Let the cancelled loser unwind
+        await asyncio.sleep(0.01)
+        return response
+
+    assert asyncio.run(run()).model == "b"
+    assert calls == ["a", "b"]
+    # Both calls are settled: the winner on its usage, the cancelled loser refunded
+    assert len(records) == 2
+    assert [kwargs.get("failed", False) for kwargs in records] == [False, True]
+
+def test_no_hedge_while_the_limiter_holds_calls_back(deployments, monkeypatch):
+    calls = []
+    monkeypatch.setattr(llm, "acompletion", completion({"a": (0.1, None), "b": (0, None)}, calls))
+    monkeypatch.setattr(llm, "hedge_delay", lambda: 0.01)
+    monkeypatch.setattr(llm.rate_limiter, "try_acquire", lambda tokens, priority=None: False)
+    monkeypatch.setattr(deployments, "choose", lambda exclude=(): 0)
+    assert chat().model == "a"
+    assert calls == ["a"]
@@ -0,0 +1,64 @@
+import logging
+import pytest
+from customLogger.cw_logger import AsyncQueueHandler, JsonFormatter
+from utils.metrics import metrics
+
+
+class ListSink(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.setFormatter(JsonFormatter())
+        self.lines = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.lines.append(self.format(record))
+
+
+@pytest.fixture
+def logged():
+    sink = ListSink()
+    handler = AsyncQueueHandler([sink], max_message_chars=200)
+    logger = logging.getLogger("tests.cw_logger")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(handler)
+    yield logger, handler, sink
+    logger.removeHandler(handler)
+    handler.close()
+
+
+def test_message_is_built_on_the_caller(logged):
+    logger, handler, sink = logged
+    payload = {"a": 1}
+    logger.info("payload %s", payload)
+    payload["b"] = 2
+    handler.flush()
+    assert '"message": "payload {\'a\': 1}"' in sink.lines[0]
+
+
+def test_large_payloads_are_bounded(logged):
+    logger, handler, sink = logged
+    logger.info("response %s", {"agent_response": [{"text": "x" * 10000} for _ in range(1000)]})
+    logger.info("text %s", "y" * 10000)
+    handler.flush()
+    assert all(len(line) < 600 for line in sink.lines)
+    assert "truncated" in sink.lines[0]
+
+
+def dropped_total() -> float:
+    lines = [line for line in metrics.render().splitlines() if line.startswith("log_records_dropped_total ")]
+    return float(lines[0].split()[1]) if lines else 0
+
+
+def test_dropped_records_are_counted():
+    handler = AsyncQueueHandler([ListSink()], queue_size=1)
+    # Nothing drains the queue while the listener is stopped
+    handler.listener.stop()
+    before = dropped_total()
+    record = logging.makeLogRecord({"msg": "message", "levelno": logging.INFO, "levelname": "INFO"})
+    for _ in range(3):
+        handler.enqueue(handler.prepare(record))
+    assert handler.dropped == 2
+    assert dropped_total() == before + 2
+    handler.listener.start()
+    handler.close()
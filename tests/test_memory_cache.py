@@ -0,0 +1,65 @@
+import time
+from cache.memory_cache import MemoryCache, MISS, NEGATIVE
+
+
+def test_get_set_delete():
+    cache = MemoryCache()
+    assert cache.get("key") is MISS
+    cache.set("key", {"value": 1})
+    assert cache.get("key") == {"value": 1}
+    cache.delete("key")
+    assert cache.get("key") is MISS
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = MemoryCache(ttl=10)
+    cache.set("default", 1)
+    cache.set("short", 2, ttl=1)
+    now[0] += 5
+    assert cache.get("short") is MISS
+    assert cache.get("default") == 1
+    now[0] += 10
+    assert cache.get("default") is MISS
+    assert cache.stats()["entries"] == 0
+
+
+def test_negative_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = MemoryCache(negative_ttl=5)
+    cache.set_negative("key")
+    assert cache.get("key") is NEGATIVE
+    now[0] += 6
+    assert cache.get("key") is MISS
+
+
+def test_least_recently_used_is_evicted():
+    cache = MemoryCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is MISS
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_byte_bound():
+    cache = MemoryCache(max_bytes=20)
+    cache.set("a", "x" * 10)
+    cache.set("b", "y" * 10)
+    assert cache.get("a") is MISS
+    assert cache.stats() == {"entries": 1, "bytes": 12}
+    # Larger than the whole cache, not stored
+    cache.set("c", "z" * 100)
+    assert cache.get("c") is MISS
+    assert cache.get("b") == "y" * 10
+
+
+def test_overwrite_updates_size():
+    cache = MemoryCache()
+    cache.set("a", "x" * 10)
+    cache.set("a", "x")
+    assert cache.stats() == {"entries": 1, "bytes": 3}
@@ -0,0 +1,87 @@
+import asyncio
+import json
+from types import SimpleNamespace
+import utils.metrics as metrics_module
+from config import metrics_config
+from utils.metrics import MetricsRegistry, RequestTimingMiddleware, emit_emf, record_llm_call, request_spans, span, EMF_MAX_VALUES
+
+
+def test_render_counters_and_histograms():
+    registry = MetricsRegistry(buckets=(0.1, 1))
+    registry.describe("calls_total", "Calls")
+    registry.inc("calls_total", route="/invoke")
+    registry.inc("calls_total", 2, route="/invoke")
+    registry.observe("duration_seconds", 0.5, stage="llm")
+    assert registry.render().splitlines() == [
+        "# HELP calls_total Calls",
+        "# TYPE calls_total counter",
+        'calls_total{route="/invoke"} 3',
+        "# TYPE duration_seconds histogram",
+        'duration_seconds_bucket{stage="llm",le="0.1"} 0',
+        'duration_seconds_bucket{stage="llm",le="1"} 1',
+        'duration_seconds_bucket{stage="llm",le="+Inf"} 1',
+        'duration_seconds_sum{stage="llm"} 0.5',
+        'duration_seconds_count{stage="llm"} 1',
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.inc("calls_total", model='a"b\\c\nd')
+    assert 'calls_total{model="a\\"b\\\\c\\nd"} 1' in registry.render()
+
+
+def test_span_records_the_stage_and_the_request_spans(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics_module, "metrics", registry)
+    spans = []
+    token = request_spans.set(spans)
+    try:
+        with span("feedback_cache"):
+            pass
+    finally:
+        request_spans.reset(token)
+    assert [stage for stage, _ in spans] == ["feedback_cache"]
+    assert 'stage_duration_seconds_count{stage="feedback_cache"} 1' in registry.render()
+
+
+def test_llm_cost_is_estimated_from_usage(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics_module, "metrics", registry)
+    monkeypatch.setitem(metrics_config, "prompt_cost_per_1k", 1.0)
+    monkeypatch.setitem(metrics_config, "completion_cost_per_1k", 2.0)
+    record_llm_call("gpt", 0, 0.2, "ok", SimpleNamespace(prompt_tokens=1000, completion_tokens=500))
+    rendered = registry.render()
+    assert 'llm_tokens_total{model="gpt",type="prompt"} 1000' in rendered
+    assert 'llm_cost_total{model="gpt"} 2.0' in rendered
+
+
+def test_emf_is_split_at_the_value_limit(capsys):
+    emit_emf([("llm", 0.001)] * (EMF_MAX_VALUES + 1) + [("request", 1.0)], "/invoke")
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert len(records) == 2
+    assert len(records[0]["llm"]) == EMF_MAX_VALUES and records[0]["request"] == 1000.0
+    assert records[1]["llm"] == 1.0 and "request" not in records[1]
+    assert [metric["Name"] for metric in records[1]["_aws"]["CloudWatchMetrics"][0]["Metrics"]] == ["llm"]
+    assert all(record["Route"] == "/invoke" for record in records)
+
+
+def test_middleware_times_streamed_responses_by_route(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics_module, "metrics", registry)
+    sent = []
+
+    async def app(scope, receive, send):
+        scope["route"] = SimpleNamespace(path="/jobs/{job_id}")
+        await send({"type": "http.response.start", "status": 200})
+        await send({"type": "http.response.body", "body": b"a", "more_body": True})
+        await send({"type": "http.response.body", "body": b"b"})
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(RequestTimingMiddleware(app)({"type": "http", "path": "/jobs/123"}, None, send))
+    assert len(sent) == 3
+    rendered = registry.render()
+    assert 'stage_duration_seconds_count{route="/jobs/{job_id}",stage="request"} 1' in rendered
+    assert "/jobs/123" not in rendered
@@ -0,0 +1,58 @@
+import pytest
+import tools.packing as packing
+from core.batch import in_batch
+from tools.packing import PackedBatcher
+
+TOOLS = ["SentimentAnalysisTool"]
+
+
+@pytest.fixture
+def packs(monkeypatch):
+    calls = []
+
+    def packed_analysis_tool(items, tool_names, config, logger=None):
+        calls.append((dict(items), in_batch()))
+        return {item_id: {tool_names[0]: query.upper()} for item_id, query in items.items()}
+
+    monkeypatch.setattr(packing, "packed_analysis_tool", packed_analysis_tool)
+    return calls
+
+
+def test_full_pack_is_flushed_at_once(packs):
+    batcher = PackedBatcher(max_items=2, window=10)
+    first = batcher.submit("1", "late", TOOLS, config={})
+    second = batcher.submit("2", "broken", TOOLS, config={})
+    assert first.result(timeout=1) == {"SentimentAnalysisTool": "LATE"}
+    assert second.result(timeout=1) == {"SentimentAnalysisTool": "BROKEN"}
+    assert packs == [({"1": "late", "2": "broken"}, True)]
+
+
+def test_partial_pack_is_flushed_after_the_window(packs):
+    batcher = PackedBatcher(max_items=10, window=0.01)
+    assert batcher.submit("1", "late", TOOLS, config={}).result(timeout=1) == {"SentimentAnalysisTool": "LATE"}
+    assert len(packs) == 1
+
+
+def test_identical_texts_share_one_item(packs):
+    batcher = PackedBatcher(max_items=10, window=0.01)
+    futures = [batcher.submit(str(n), "late", TOOLS, config={}) for n in range(3)]
+    assert [future.result(timeout=1) for future in futures] == [{"SentimentAnalysisTool": "LATE"}] * 3
+    assert packs[0][0] == {"0": "late"}
+
+
+def test_token_budget_splits_packs_and_oversized_items_are_not_packed(packs):
+    batcher = PackedBatcher(max_items=10, max_tokens=packing.ITEM_OVERHEAD_TOKENS + 10, window=0.01)
+    assert batcher.submit("big", "x" * 1000, TOOLS, config={}).result(timeout=1) is None
+    futures = [batcher.submit(str(n), "word " * n + "a", TOOLS, config={}) for n in (6, 7)]
+    for future in futures:
+        future.result(timeout=1)
+    assert [list(items) for items, _ in packs] == [["6"], ["7"]]
+
+
+def test_failed_pack_falls_back(monkeypatch):
+    def packed_analysis_tool(items, tool_names, config, logger=None):
+        raise RuntimeError("provider down")
+
+    monkeypatch.setattr(packing, "packed_analysis_tool", packed_analysis_tool)
+    batcher = PackedBatcher(max_items=1)
+    assert batcher.submit("1", "late", TOOLS, config={}).result(timeout=1) is None
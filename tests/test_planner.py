@@ -0,0 +1,42 @@
+import pytest
+from core.planner import plan_tools, ALL_TOOLS
+
+
+@pytest.mark.parametrize("instructions", ["", None, "N/A", "none", "-", " n/a. "])
+def test_empty_instructions_run_all_tools(instructions):
+    assert plan_tools(instructions) == ALL_TOOLS
+
+
+@pytest.mark.parametrize("instructions, expected", [
+    ("What is the tone of this feedback?", ["SentimentAnalysisTool"]),
+    ("Categorize the feedback", ["TopicCategorizationTool"]),
+    ("Extract the key phrases", ["KeywordContextualizationTool"]),
+    ("Summarise it and give recommendations", ["SummarizationTool"]),
+    ("Give me the sentiment and a summary", ["SentimentAnalysisTool", "SummarizationTool"]),
+    ("Run a full analysis", ALL_TOOLS),
+])
+def test_keywords_select_tools(instructions, expected):
+    assert plan_tools(instructions) == expected
+
+
+@pytest.mark.parametrize("instructions", ["Check the toner cartridge", "Is the customer moody?", "Look at the categorical data"])
+def test_keywords_match_whole_words(instructions):
+    assert plan_tools(instructions) is None
+
+
+@pytest.mark.parametrize("instructions", [
+    "Do not summarize",
+    "Everything except the sentiment",
+    "Skip the keywords",
+    "Give me insights on this feedback",
+    "Focus on identifying the sentiment and summarizing actionable insights.",
+    "Summarize the negative points",
+    "List the positive keywords",
+    "Is it positive or negative?",
+])
+def test_ambiguous_instructions_go_to_the_router(instructions):
+    assert plan_tools(instructions) is None
+
+
+def test_unknown_instructions_go_to_the_router():
+    assert plan_tools("Translate this to French") is None
@@ -0,0 +1,47 @@
+import pytest
+import core.prompts as prompts
+from cache.cache import build_cache_key, build_tool_cache_key
+from config import cache_config
+from core.prompts import PromptTemplate, compact, prompt_version, register_plain_prompt, templates_version
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    # Templates registered by a test do not leak into the module registry
+    monkeypatch.setattr(prompts, "TEMPLATES", dict(prompts.TEMPLATES))
+    monkeypatch.setattr(prompts, "PLAIN_PROMPTS", dict(prompts.PLAIN_PROMPTS))
+    prompts._invalidate_version()
+    yield
+    prompts._invalidate_version()
+
+
+def test_compact_strips_indentation_and_blank_runs():
+    assert compact("\n    first  \n\n\n    second\n  ") == "first\n\nsecond"
+
+
+def test_system_prefix_is_static(registry):
+    template = PromptTemplate("test_static", system="Analyze {{ json }}", user="Feedback: {query}")
+    first, second = template.messages(query="late"), template.messages(query="broken")
+    assert first[0] == second[0] == {"role": "system", "content": "Analyze { json }"}
+    assert second[1] == {"role": "user", "content": "Feedback: broken"}
+
+
+def test_version_changes_with_templates_and_plain_prompts(registry):
+    version = templates_version()
+    assert templates_version() == version
+    PromptTemplate("test_new", system="New instructions", user="{query}")
+    changed = templates_version()
+    assert changed != version
+    register_plain_prompt("TestTool", "Classify {query}")
+    assert templates_version() not in (version, changed)
+
+
+def test_cache_keys_follow_the_prompt_version(registry, monkeypatch):
+    feedback_key = build_cache_key("late delivery", "sentiment")
+    tool_key = build_tool_cache_key("SentimentAnalysisTool", "late delivery")
+    PromptTemplate("test_new", system="New instructions", user="{query}")
+    assert build_cache_key("late delivery", "sentiment") != feedback_key
+    assert build_tool_cache_key("SentimentAnalysisTool", "late delivery") != tool_key
+
+    monkeypatch.setitem(cache_config, "prompt_version", "manual-bump")
+    assert prompt_version().startswith("manual-bump-")
@@ -0,0 +1,112 @@
+import asyncio
+import time
+import pytest
+from core.llm import RateLimiter, INTERACTIVE, BATCH
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_burst_then_wait(clock):
+    limiter = RateLimiter(rpm=60, burst_seconds=5)
+    assert all(limiter.try_acquire(10) for _ in range(5))
+    assert not limiter.try_acquire(10)
+    clock[0] += 1
+    assert limiter.try_acquire(10)
+
+
+def test_token_bucket(clock):
+    limiter = RateLimiter(tpm=6000, burst_seconds=1)
+    assert limiter.try_acquire(150)
+    # The bucket may go negative, the next call waits for it to refill
+    assert not limiter.try_acquire(10)
+    clock[0] += 0.6
+    assert limiter.try_acquire(10)
+
+
+def test_batch_leaves_a_reserve(clock):
+    limiter = RateLimiter(rpm=60, burst_seconds=5, batch_reserve=0.2)
+    admitted = 0
+    while limiter.try_acquire(1, BATCH):
+        admitted += 1
+    assert admitted == 4
+    assert limiter.try_acquire(1, INTERACTIVE)
+
+
+def test_batch_waits_for_interactive_callers(clock):
+    limiter = RateLimiter(rpm=60)
+    limiter._waiting(INTERACTIVE, 1)
+    assert not limiter.try_acquire(1, BATCH)
+    limiter._waiting(INTERACTIVE, -1)
+    assert limiter.try_acquire(1, BATCH)
+
+
+def test_rate_limited_decreases_once_per_cooldown(clock):
+    limiter = RateLimiter(rpm=60, cooldown=1, decrease=0.5)
+    limiter.record(10, 0.1, rate_limited=True, failed=True, retry_after=2)
+    limiter.record(10, 0.1, rate_limited=True, failed=True)
+    assert limiter.scale == 0.5
+    # Paused for the retry-after
+    assert not limiter.try_acquire(1)
+    clock[0] += 2
+    assert limiter.try_acquire(1)
+    limiter.record(10, 0.1, rate_limited=True, failed=True)
+    assert limiter.scale == 0.25
+
+
+def test_scale_has_a_floor(clock):
+    limiter = RateLimiter(min_scale=0.1, cooldown=0)
+    for _ in range(10):
+        clock[0] += 1
+        limiter.record(10, 0.1, rate_limited=True, failed=True)
+    assert limiter.scale == 0.1
+
+
+def test_healthy_calls_increase_and_slow_calls_decrease(clock):
+    limiter = RateLimiter(increase=0.1, decrease=0.5, latency_threshold=5)
+    limiter.scale = 0.5
+    limiter.record(10, 1)
+    assert limiter.scale == pytest.approx(0.6)
+    limiter.record(10, 10)
+    assert limiter.scale == pytest.approx(0.3)
+    limiter.scale = 0.95
+    limiter.record(10, 1)
+    assert limiter.scale == 1.0
+
+
+def test_other_errors_keep_the_scale_and_refund_tokens(clock):
+    limiter = RateLimiter(tpm=6000, burst_seconds=1, latency_threshold=5)
+    limiter.scale = 0.5
+    assert limiter.try_acquire(60)
+    level = limiter.buckets["tokens"].level
+    limiter.record(60, 30, failed=True)
+    assert limiter.scale == 0.5
+    assert limiter.buckets["tokens"].level == level + 60
+
+
+def test_usage_settles_the_estimate(clock):
+    limiter = RateLimiter(tpm=6000, burst_seconds=1)
+    assert limiter.try_acquire(80)
+    limiter.record(80, 1, used_tokens=30)
+    assert limiter.buckets["tokens"].level == 100 - 30
+
+
+def test_estimate_reserves_the_completion():
+    limiter = RateLimiter(completion_tokens=500)
+    messages = [{"role": "user", "content": "x" * 400}]
+    assert limiter.estimate(messages) - limiter.estimate(messages, max_tokens=100) == 400
+    assert limiter.estimate(messages * 2) - limiter.estimate(messages) == 100
+
+
+def test_aacquire_waits_without_blocking():
+    limiter = RateLimiter(tpm=60000, burst_seconds=0.05)
+
+    async def run():
+        assert await limiter.aacquire(100) == 0
+        return await limiter.aacquire(100)
+
+    assert asyncio.run(run()) > 0
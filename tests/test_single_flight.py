@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import time
+import pytest
+from cache.single_flight import SingleFlight
+
+
+def test_do_shares_one_call_between_threads():
+    single_flight = SingleFlight()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(single_flight.do("key", compute))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert {result for result, _ in results} == {"result"}
+
+
+def test_do_raises_the_error_to_every_caller():
+    single_flight = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        single_flight.do("key", fail)
+    # Nothing is kept once the call completes
+    assert single_flight.do("key", lambda: 1) == (1, False)
+
+
+def test_ado_shares_one_run():
+    single_flight = SingleFlight()
+    calls = []
+
+    async def compute(value):
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        return value
+
+    async def run():
+        return await asyncio.gather(*[single_flight.ado("key", compute, index) for index in range(3)])
+
+    results = asyncio.run(run())
+    assert calls == [0]
+    assert results == [(0, False), (0, True), (0, True)]
+
+
+def test_a_cancelled_caller_does_not_cancel_the_run():
+    single_flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run():
+        first = asyncio.ensure_future(single_flight.ado("key", compute))
+        second = asyncio.ensure_future(single_flight.ado("key", compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == ("result", True)
+
+
+def test_cancel_stops_a_run_with_a_single_waiter():
+    single_flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(10)
+
+    async def run():
+        waiter = asyncio.ensure_future(single_flight.ado("key", compute))
+        await asyncio.sleep(0)
+        assert single_flight.cancel("key")
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(asyncio.wait_for(run(), 1))
+
+
+def test_cancel_leaves_a_shared_run_to_its_followers():
+    single_flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run():
+        leader = asyncio.ensure_future(single_flight.ado("key", compute))
+        follower = asyncio.ensure_future(single_flight.ado("key", compute))
+        await asyncio.sleep(0)
+        assert not single_flight.cancel("key")
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(run()) == ("result", True)
+
+
+def test_followers_of_a_cancelled_run_start_it_again():
+    single_flight = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run():
+        follower = asyncio.ensure_future(single_flight.ado("key", compute))
+        await asyncio.sleep(0.01)
+        # Cancelled for another caller, e.g. a blocked speculative run
+        single_flight._tasks["key"].cancel()
+        return await follower
+
+    assert asyncio.run(run()) == ("result", False)
+    assert len(calls) == 2
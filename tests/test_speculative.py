@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import pytest
+import main
+from cache import cache
+from cache.cache import astore_tool_cache
+
+BLOCKED = {"status": "GUARDRAIL_INTERVENED", "is_blocked": True, "reasons": [], "details": {}}
+ALLOWED = {"status": "NONE", "is_blocked": False, "reasons": [], "details": {}}
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.puts = []
+
+    def put_item(self, TableName, Item):
+        self.puts.append(Item["feedback_id"]["S"])
+
+
+@pytest.fixture
+def dynamodb(monkeypatch):
+    recorder = Recorder()
+    monkeypatch.setattr(cache, "get_client", lambda name: recorder)
+    monkeypatch.setattr(main, "logger", logging.getLogger("tests"))
+    monkeypatch.setattr(main, "single_flight", main.SingleFlight())
+    return recorder
+
+
+def request(feedback_id: str = "f1") -> main.Request:
+    return main.Request(feedback_id=feedback_id, customer_name="c", feedback_text="text", timestamp="t", instructions="i")
+
+
+def guardrail(verdict: dict, delay: float = 0.02):
+    async def asecurity_check(text, logger=None):
+        await asyncio.sleep(delay)
+        return verdict
+    return asecurity_check
+
+
+def agent(events: list, delay: float = 0.05):
+    async def amaster_agent(input_request, tools, config, logger=None):
+        events.append("started")
+        try:
+            await astore_tool_cache("SentimentAnalysisTool", input_request["feedback_text"], {"positive": 1}, logger)
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+        return {**input_request, "agent_response": ["done"]}
+    return amaster_agent
+
+
+def agent_kwargs(request: main.Request) -> dict:
+    return {"input_request": request.model_dump(exclude_none=True), "tools": [], "config": {}, "logger": main.logger}
+
+
+def test_cleared_request_flushes_the_deferred_writes(dynamodb, monkeypatch):
+    events = []
+    monkeypatch.setattr(main, "asecurity_check", guardrail(ALLOWED))
+    monkeypatch.setattr(main, "amaster_agent", agent(events))
+
+    response, shared = asyncio.run(main.speculative_agent(request(), "key", agent_kwargs(request())))
+    assert response["agent_response"] == ["done"] and shared is False
+    assert len(dynamodb.puts) == 1 and dynamodb.puts[0].startswith("tool#")
+
+
+def test_blocked_request_cancels_the_run_without_cache_writes(dynamodb, monkeypatch):
+    events = []
+    monkeypatch.setattr(main, "asecurity_check", guardrail(BLOCKED))
+    monkeypatch.setattr(main, "amaster_agent", agent(events))
+
+    async def run():
+        result = await main.speculative_agent(request(), "key", agent_kwargs(request()))
+        await asyncio.sleep(0.01)
+        return result
+
+    assert asyncio.run(run()) == (BLOCKED, None)
+    assert events == ["started", "cancelled"]
+    assert dynamodb.puts == []
+
+
+def test_blocked_request_leaves_a_shared_run_to_the_others(dynamodb, monkeypatch):
+    events = []
+    monkeypatch.setattr(main, "amaster_agent", agent(events))
+
+    async def run():
+        monkeypatch.setattr(main, "asecurity_check", guardrail(BLOCKED))
+        blocked = asyncio.ensure_future(main.speculative_agent(request("f1"), "key", agent_kwargs(request("f1"))))
+        await asyncio.sleep(0)
+        monkeypatch.setattr(main, "asecurity_check", guardrail(ALLOWED, delay=0.03))
+        cleared = asyncio.ensure_future(main.speculative_agent(request("f2"), "key", agent_kwargs(request("f2"))))
+        return await asyncio.gather(blocked, cleared)
+
+    (blocked, _), (response, shared) = asyncio.run(run())
+    assert blocked == BLOCKED
+    assert response["agent_response"] == ["done"] and shared is True
+    assert events == ["started"]
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import logging
+from types import SimpleNamespace
+import pytest
+import tools.tool_executor as tool_executor
+from tools.registry import ToolRegistry
+from tools.tool_executor import ToolExecutor
+from tools.tool_schemas import SentimentAnalysisTool, TopicCategorizationTool, KeywordContextualizationTool, SummarizationTool
+
+logger = logging.getLogger("test")
+SCHEMAS = [SentimentAnalysisTool, TopicCategorizationTool, KeywordContextualizationTool, SummarizationTool]
+
+
+class Tools:
+    """Fake analysis tools that record how many run at once."""
+    def __init__(self, delays: dict) -> None:
+        self.delays = delays
+        self.calls = []
+        self.running = 0
+        self.peak = 0
+
+    def tool(self, name: str):
+        async def async_tool(query: str, config: dict, logger=None):
+            self.calls.append(name)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            await asyncio.sleep(self.delays.get(name, 0.01))
+            self.running -= 1
+            return {"tool": name, "query": query}
+        return async_tool
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    store = {}
+
+    async def aretrieve_tool_cache(tool_name, query, logger=None):
+        return store.get((tool_name, query))
+
+    async def astore_tool_cache(tool_name, query, result, logger=None):
+        store[(tool_name, query)] = result
+
+    monkeypatch.setattr(tool_executor, "aretrieve_tool_cache", aretrieve_tool_cache)
+    monkeypatch.setattr(tool_executor, "astore_tool_cache", astore_tool_cache)
+    return store
+
+
+def executor(tools: Tools, **kwargs) -> ToolExecutor:
+    registry = ToolRegistry()
+    for schema in SCHEMAS:
+        registry.register(schema, async_tool=tools.tool(schema.__name__))
+    return ToolExecutor(config={}, fused=False, packed=False, registry=registry, **kwargs)
+
+
+def tool_calls(names: list, query: str = "late delivery") -> list:
+    return [SimpleNamespace(function=SimpleNamespace(name=name, arguments=json.dumps({"query": query}))) for name in names]
+
+
+def test_output_keeps_the_tool_call_order(cache):
+    # The first tool finishes last
+    tools = Tools({"SentimentAnalysisTool": 0.05})
+    names = [schema.__name__ for schema in SCHEMAS]
+    output = asyncio.run(executor(tools, parallel=True, max_concurrency=4).acall({}, tool_calls(names), logger))
+    assert [list(entry) for entry in output["agent_response"]] == [
+        ["sentimentanalysis"], ["topiccategorization"], ["keywordcontextualization"], ["summarization"]
+    ]
+    assert [entry[key]["tool"] for entry in output["agent_response"] for key in entry] == names
+
+
+@pytest.mark.parametrize("parallel, max_concurrency, peak", [(True, 4, 4), (True, 2, 2), (False, 4, 1)])
+def test_concurrency_is_bounded(cache, parallel, max_concurrency, peak):
+    tools = Tools({})
+    names = [schema.__name__ for schema in SCHEMAS]
+    asyncio.run(executor(tools, parallel=parallel, max_concurrency=max_concurrency).acall({}, tool_calls(names), logger))
+    assert tools.peak == peak
+
+
+def test_cached_results_skip_the_tool(cache):
+    cache[("SummarizationTool", "late delivery")] = {"summary": "cached"}
+    tools = Tools({})
+    output = asyncio.run(executor(tools).acall({}, tool_calls(["SentimentAnalysisTool", "SummarizationTool"]), logger))
+    assert tools.calls == ["SentimentAnalysisTool"]
+    assert output["agent_response"][1] == {"summarization": {"summary": "cached"}}
+    assert ("SentimentAnalysisTool", "late delivery") in cache
+
+
+def test_fused_mode_runs_one_completion_and_falls_back_per_tool(cache, monkeypatch):
+    fused_calls = []
+
+    async def afused_analysis_tool(query, tool_names, config, logger=None):
+        fused_calls.append(tool_names)
+        # The summary section is missing from the response
+        return {tool_name: {"fused": tool_name} if tool_name != "SummarizationTool" else None for tool_name in tool_names}
+
+    monkeypatch.setattr(tool_executor, "afused_analysis_tool", afused_analysis_tool)
+    tools = Tools({})
+    names = ["SentimentAnalysisTool", "TopicCategorizationTool", "SummarizationTool"]
+    fused = executor(tools).bind({}, fused=True)
+    output = asyncio.run(fused.acall({}, tool_calls(names), logger))
+    assert fused_calls == [names]
+    assert tools.calls == ["SummarizationTool"]
+    assert output["agent_response"] == [
+        {"sentimentanalysis": {"fused": "SentimentAnalysisTool"}},
+        {"topiccategorization": {"fused": "TopicCategorizationTool"}},
+        {"summarization": {"tool": "SummarizationTool", "query": "late delivery"}}
+    ]
+
+
+def test_fused_mode_groups_by_query(cache):
+    fused = executor(Tools({})).bind({}, fused=True)
+    calls = tool_calls(["SentimentAnalysisTool", "SummarizationTool"], "a") + tool_calls(["SentimentAnalysisTool"], "b")
+    assert fused._group_tool_calls(calls) == [[0, 1], [2]]
@@ -0,0 +1,35 @@
+from tools.tools import split_fused_output, fused_analysis_messages, split_packed_output
+
+SENTIMENT = {"positive": 0.1, "negative": 0.8, "neutral": 0.1}
+SUMMARY = {"summary": "Late delivery", "recommendations": ["Ship faster"]}
+
+
+def test_fused_output_is_split_into_tool_results():
+    output = {"sentiment": SENTIMENT, "summary": SUMMARY, "topic": {"category": "Delivery", "score": 0.9}}
+    assert split_fused_output(output, ["SentimentAnalysisTool", "SummarizationTool"]) == {
+        "SentimentAnalysisTool": SENTIMENT,
+        "SummarizationTool": SUMMARY
+    }
+
+
+def test_missing_or_malformed_sections_fall_back():
+    output = {"sentiment": {"positive": "high"}, "summary": SUMMARY}
+    results = split_fused_output(output, ["SentimentAnalysisTool", "SummarizationTool", "TopicCategorizationTool"])
+    assert results == {"SentimentAnalysisTool": None, "SummarizationTool": SUMMARY, "TopicCategorizationTool": None}
+    assert split_fused_output(None, ["SummarizationTool"]) == {"SummarizationTool": None}
+
+
+def test_fused_prompt_asks_only_for_the_requested_sections():
+    prompt = "\n".join(message["content"] for message in fused_analysis_messages("late delivery", ["SummarizationTool"]))
+    assert '"summary"' in prompt and '"sentiment"' not in prompt
+    assert "late delivery" in prompt
+
+
+def test_packed_output_is_split_per_item():
+    output = [{"id": "b", "summary": SUMMARY}, {"id": "a", "summary": {"summary": "x"}}, "garbage"]
+    assert split_packed_output(output, {"a": "text a", "b": "text b", "c": "text c"}, ["SummarizationTool"]) == {
+        "a": {"SummarizationTool": None},
+        "b": {"SummarizationTool": SUMMARY},
+        "c": None
+    }
+    assert split_packed_output({"id": "a"}, {"a": "text a"}, ["SummarizationTool"]) == {"a": None}
@@ -0,0 +1,116 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from config import tool_executor_config
+from core.batch import batch_context
+from tools.tools import packed_analysis_tool
+from utils.utils import estimate_tokens
+
+# Approximate prompt overhead per packed item (id, JSON quoting, separators)
+ITEM_OVERHEAD_TOKENS = 20
+
+
+class _Pack:
+    def __init__(self, config: dict, logger=None) -> None:
+        self.config = config
+        self.logger = logger
+        self.items = {}     # item id -> feedback text
+        self.futures = {}   # item id -> futures waiting for the item
+        self.queries = {}   # feedback text -> item id, identical texts share one item
+        self.tokens = 0
+        self.timer = None
+
+
+class PackedBatcher:
+    """
+    This class collects analysis requests from concurrently running records and sends them
+    as packed completions (several feedback texts in one prompt). A pack is flushed when it
+    reaches max_items, when the next item would exceed max_tokens, or after window seconds.
+
+    Every submitted item resolves to {tool_name: result or None}, or None when the item is
+    missing from the packed response; the caller then falls back to the single-record path.
+    """
+    def __init__(self, max_items: int = 10, max_tokens: int = 4000, window: float = 0.05, max_workers: int = 4) -> None:
+        self.max_items = max(1, max_items)
+        self.max_tokens = max_tokens
+        self.window = window
+        self._lock = threading.Lock()
+        self._packs = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="packed-batcher")
+
+    def submit(self, item_id: str, query: str, tool_names: list, config: dict, logger=None) -> Future:
+        group = tuple(tool_names)
+        tokens = estimate_tokens(query) + ITEM_OVERHEAD_TOKENS
+        future = Future()
+
+        # An item that does not fit in a pack on its own goes to the single-record path
+        if tokens > self.max_tokens:
+            future.set_result(None)
+            return future
+
+        ready = []
+        with self._lock:
+            pack = self._packs.get(group)
+            if pack is not None and pack.tokens + tokens > self.max_tokens and query not in pack.queries:
+                ready.append(self._take(group))
+                pack = None
+            if pack is None:
+                pack = self._packs[group] = _Pack(config, logger)
+
+            if query in pack.queries:
+                pack.futures[pack.queries[query]].append(future)
+            else:
+                if item_id in pack.items:
+                    item_id = f"{item_id}#{len(pack.items)}"
+                pack.items[item_id] = query
+                pack.futures[item_id] = [future]
+                pack.queries[query] = item_id
+                pack.tokens += tokens
+
+            if len(pack.items) >= self.max_items:
+                ready.append(self._take(group))
+            elif pack.timer is None:
+                pack.timer = threading.Timer(self.window, self._flush_expired, args=(group, pack))
+                pack.timer.daemon = True
+                pack.timer.start()
+
+        for ready_pack in ready:
+            self._pool.submit(self._flush, group, ready_pack)
+        return future
+
+    def _take(self, group: tuple) -> _Pack:
+        # Caller holds the lock
+        pack = self._packs.pop(group)
+        if pack.timer is not None:
+            pack.timer.cancel()
+        return pack
+
+    def _flush_expired(self, group: tuple, pack: _Pack) -> None:
+        with self._lock:
+            if self._packs.get(group) is not pack:
+                return
+            self._packs.pop(group)
+        self._flush(group, pack)
+
+    def _flush(self, group: tuple, pack: _Pack) -> None:
+        # Packs only hold batch records, the flush thread does not inherit their context
+        token = batch_context.set(True)
+        try:
+            if pack.logger:
+                pack.logger.info(f"Packed analysis initiated for {len(pack.items)} items with tools: {list(group)}")
+            results = packed_analysis_tool(pack.items, list(group), config=pack.config, logger=pack.logger)
+        except Exception as e:
+            if pack.logger:
+                pack.logger.error(f"Error in packed analysis with error: {e}")
+            results = {}
+        finally:
+            batch_context.reset(token)
+        for item_id, futures in pack.futures.items():
+            for future in futures:
+                future.set_result(results.get(item_id))
+
+
+packed_batcher = PackedBatcher(
+    max_items=tool_executor_config["packed_max_items"],
+    max_tokens=tool_executor_config["packed_max_tokens"],
+    window=tool_executor_config["packed_window"]
+)
@@ -0,0 +1,142 @@
+import asyncio
+import importlib
+import threading
+from config import tool_executor_config
+from utils.utils import generate_function_schema
+from utils.event_loop import run_sync
+from core.prompts import (
+    PromptTemplate, register_plain_prompt,
+    SENTIMENT_ANALYSIS_PROMPT, TOPIC_CATEGORIZATION_PROMPT, KEYWORD_CONTEXTUALIZATION_PROMPT, SUMMARIZATION_PROMPT
+)
+from tools.tools import (
+    arun_tool, asentiment_analysis_tool, atopic_categorization_tool, akeyword_contextualization_tool, asummarization_tool
+)
+from tools.tool_schemas import SentimentAnalysisTool, TopicCategorizationTool, KeywordContextualizationTool, SummarizationTool
+
+
+def _to_async(tool):
+    # Sync only tools run on a worker thread in the async path
+    async def async_tool(*args, **kwargs):
+        return await asyncio.to_thread(tool, *args, **kwargs)
+    return async_tool
+
+
+def _to_sync(async_tool):
+    # Async tools run on the shared event loop in the sync path
+    def tool(*args, **kwargs):
+        return run_sync(async_tool(*args, **kwargs))
+    return tool
+
+
+class RegisteredTool:
+    """
+    A tool with its function schema, generated once at registration.
+    """
+    def __init__(self, schema: type, tool=None, async_tool=None, sub_agent: bool = True, prompt: str = None) -> None:
+        if tool is None and async_tool is None:
+            raise ValueError(f"Tool {schema.__name__} needs a sync or an async callable")
+        self.function_schema = generate_function_schema(base_model=schema)
+        if "error" in self.function_schema:
+            raise ValueError(f"Invalid schema for tool {schema.__name__}: {self.function_schema['error']}")
+        self.name = self.function_schema["function"]["name"]
+        self.schema = schema
+        self.tool = tool or _to_sync(async_tool)
+        self.async_tool = async_tool or _to_async(tool)
+        # Offered to the sub agent LLM
+        self.sub_agent = sub_agent
+        self.prompt = prompt
+
+
+class ToolRegistry:
+    """
+    This class holds the tools by name: their function schemas, sync and async callables and
+    prompt templates. Schemas are generated at registration, the request path only reads them.
+    """
+    def __init__(self) -> None:
+        self._tools = {}
+        self._schemas = {}  # tool names -> function schema list
+        self._lock = threading.Lock()
+
+    def register(self, schema: type, tool=None, async_tool=None, sub_agent: bool = True, prompt: str = None, replace: bool = False) -> RegisteredTool:
+        """Register a tool, with a sync or an async callable (or both).
+
+        Args:
+            schema (type): The pydantic model of the tool arguments, its title is the tool name.
+            tool (callable): tool(**arguments, config=config, logger=logger), defaults to the
+                async tool run on the shared event loop.
+            async_tool (callable): Async version, defaults to the sync tool on a worker thread.
+            sub_agent (bool): Offer the tool to the sub agent.
+            prompt (str): The prompt template of the tool, if any.
+            replace (bool): Replace a tool registered under the same name.
+
+        Returns:
+            RegisteredTool: The registered tool.
+        """
+        registered = RegisteredTool(schema, tool, async_tool, sub_agent, prompt)
+        with self._lock:
+            if registered.name in self._tools and not replace:
+                raise ValueError(f"Tool {registered.name} is already registered")
+            self._tools[registered.name] = registered
+            self._schemas.clear()
+        return registered
+
+    def register_prompt_tool(self, schema: type, prompt, result_model: type = None, sub_agent: bool = True, replace: bool = False) -> RegisteredTool:
+        """
+        Register a tool that runs one completion of a prompt with a {query} field and returns
+        the parsed JSON of the response, validated against result_model when given. The prompt
+        is a PromptTemplate (static system prefix) or a plain str.format template.
+        """
+        name = schema.__name__
+
+        def messages(query: str) -> list:
+            if isinstance(prompt, PromptTemplate):
+                return prompt.messages(query=query)
+            return [{"role": "user", "content": prompt.format(query=query)}]
+
+        if not isinstance(prompt, PromptTemplate):
+            register_plain_prompt(name, prompt)
+
+        async def async_tool(query: str, config: dict, logger=None):
+            return await arun_tool(name, messages(query), config, logger, result_model)
+
+        return self.register(schema, async_tool=async_tool, sub_agent=sub_agent, prompt=prompt, replace=replace)
+
+    def get(self, name: str) -> RegisteredTool:
+        return self._tools[name]
+
+    def names(self) -> list:
+        return list(self._tools)
+
+    def schemas(self, names: list) -> list:
+        """
+        Function schemas of the named tools, the same list object is returned on every call
+        and must not be modified.
+        """
+        key = tuple(names)
+        schemas = self._schemas.get(key)
+        if schemas is None:
+            with self._lock:
+                schemas = self._schemas[key] = [self._tools[name].function_schema for name in key]
+        return schemas
+
+    def sub_agent_schemas(self) -> list:
+        return self.schemas([name for name, tool in self._tools.items() if tool.sub_agent])
+
+
+def load_plugins(registry: ToolRegistry, modules: list) -> None:
+    """
+    Import the plugin modules, each one registers its tools in register_tools(registry).
+    """
+    for module_name in modules:
+        importlib.import_module(module_name).register_tools(registry)
+
+
+tool_registry = ToolRegistry()
+
+# Built-in analysis tools, the sub agent is registered by core.agents
+tool_registry.register(SentimentAnalysisTool, async_tool=asentiment_analysis_tool, prompt=SENTIMENT_ANALYSIS_PROMPT)
+tool_registry.register(TopicCategorizationTool, async_tool=atopic_categorization_tool, prompt=TOPIC_CATEGORIZATION_PROMPT)
+tool_registry.register(KeywordContextualizationTool, async_tool=akeyword_contextualization_tool, prompt=KEYWORD_CONTEXTUALIZATION_PROMPT)
+tool_registry.register(SummarizationTool, async_tool=asummarization_tool, prompt=SUMMARIZATION_PROMPT)
+
+load_plugins(tool_registry, tool_executor_config["plugins"])
@@ -1,55 +1,197 @@
 import json
-from utils.utils import generate_function_schema
-from tools.tools import *
-from tools.tool_schemas import *
+import asyncio
+import copy
+from types import SimpleNamespace
+from config import tool_executor_config
+from cache.cache import aretrieve_tool_cache, astore_tool_cache
+from core.batch import in_batch
+from utils.metrics import span
+from utils.event_loop import run_sync
+from tools.packing import packed_batcher
+from tools.tools import FUSED_SECTIONS, afused_analysis_tool
+from tools.registry import tool_registry, ToolRegistry
+
+
+def serialize_tool_calls(tool_calls: list) -> list:
+    """
+    Convert LLM tool calls to plain dicts so a routing decision can be cached.
+    """
+    return [{"name": tool_call.function.name, "arguments": tool_call.function.arguments} for tool_call in tool_calls]
+
+
+def deserialize_tool_calls(tool_calls: list) -> list:
+    """
+    Rebuild tool call objects (tool_call.function.name / .arguments) from serialized dicts.
+    """
+    return [
+        SimpleNamespace(function=SimpleNamespace(name=tool_call["name"], arguments=tool_call["arguments"]))
+        for tool_call in tool_calls
+    ]
 
 
 class ToolExecutor:
     """
-    This class is responsible for executing the tools.
+    This class is responsible for executing the tools. The tools are looked up in the registry,
+    the per request options are set with bind().
     """
-    def __init__(self, config: dict) -> None:
-        from core.agents import sub_agent
+    def __init__(self, config: dict = None, parallel: bool = None, max_concurrency: int = None, fused: bool = None,
+                 packed: bool = None, registry: ToolRegistry = None) -> None:
         self.config = config
-        self.tools = [
-            (SubAgent, sub_agent),
-            (SentimentAnalysisTool, sentiment_analysis_tool),
-            (TopicCategorizationTool, topic_categorization_tool),
-            (KeywordContextualizationTool, keyword_contextualization_tool),
-            (SummarizationTool, summarization_tool)
-        ]
-        self.tools_by_name = {schema.model_json_schema().get("title", "N/A"): tool for schema, tool in self.tools}
-
-        # sub agent tools
-        sub_agent_tools = [SentimentAnalysisTool, TopicCategorizationTool, KeywordContextualizationTool, SummarizationTool]
-        self.sub_agent_tools = [generate_function_schema(base_model=schema) for schema in sub_agent_tools]
+        self.fused = tool_executor_config["fused"] if fused is None else fused
+        # Packing only pays off when other records are running at the same time
+        self.packed = tool_executor_config["packed"] and in_batch() if packed is None else packed
+        self.parallel = tool_executor_config["parallel"] if parallel is None else parallel
+        self.max_concurrency = max(1, max_concurrency or tool_executor_config["max_concurrency"])
+        self.registry = registry or tool_registry
 
-    def __call__(self, input_request: dict, tool_calls: list, logger=None):
-        try:
-            output = []
-            for tool_call in tool_calls:
-                tool_name = tool_call.function.name
-                tool_args = json.loads(tool_call.function.arguments)
-
-                logger.info(f"Action Name: {tool_name}\nAction Input: {tool_args}")
-                
-                if tool_name != "SubAgent":
-                    tool_result = self.tools_by_name[tool_name](**tool_args, config=self.config, logger=logger)
+    def bind(self, config: dict, fused: bool = None, packed: bool = None) -> "ToolExecutor":
+        """
+        Shallow copy of the executor with the options of one request, nothing is rebuilt.
+        """
+        executor = copy.copy(self)
+        executor.config = config
+        executor.fused = tool_executor_config["fused"] if fused is None else fused
+        executor.packed = tool_executor_config["packed"] and in_batch() if packed is None else packed
+        return executor
+
+    def _output_key(self, tool_name: str) -> str:
+        return f'{tool_name.lower().replace("tool","")}'
+
+    def _group_tool_calls(self, tool_calls: list) -> list:
+        """
+        Group the tool call indexes into jobs. In fused and packed mode the analysis tools that
+        share a query form a single job, every other tool call is a job of its own.
+        """
+        if not (self.fused or self.packed):
+            return [[index] for index in range(len(tool_calls))]
+        jobs, fused_jobs = [], {}
+        for index, tool_call in enumerate(tool_calls):
+            if tool_call.function.name in FUSED_SECTIONS:
+                query = json.loads(tool_call.function.arguments).get("query", "")
+                if query in fused_jobs:
+                    fused_jobs[query].append(index)
+                    continue
+                fused_jobs[query] = [index]
+                jobs.append(fused_jobs[query])
+            else:
+                jobs.append([index])
+        return jobs
+
+    async def _aexecute_tool(self, input_request: dict, tool_call, semaphore: asyncio.Semaphore, logger=None) -> dict:
+        async with semaphore:
+            tool_name = tool_call.function.name
+            tool_args = json.loads(tool_call.function.arguments)
+
+            logger.info("Action Name: %s\nAction Input: %s", tool_name, tool_args)
+
+            if tool_name != "SubAgent":
+                # Only call the LLM for tool results that are not cached yet
+                tool_result = await aretrieve_tool_cache(tool_name, tool_args.get("query", ""), logger)
+                if tool_result is None:
+                    with span("tool", tool=tool_name):
+                        tool_result = await self.registry.get(tool_name).async_tool(**tool_args, config=self.config, logger=logger)
+                    await astore_tool_cache(tool_name, tool_args.get("query", ""), tool_result, logger)
                 else:
-                    tool_result = self.tools_by_name[tool_name](
+                    logger.info(f"Action Result served from cache for: {tool_name}")
+            else:
+                with span("tool", tool=tool_name):
+                    tool_result = await self.registry.get(tool_name).async_tool(
                         input_request=input_request,
-                        tools = self.sub_agent_tools,
+                        tools = self.registry.sub_agent_schemas(),
                         config=self.config,
                         logger=logger
                         )
-                    
-                logger.info(f"Action Result: {tool_result}")
-                output.append({f'{tool_name.lower().replace("tool","")}': tool_result})
+
+            logger.info("Action Result: %s", tool_result)
+            return {self._output_key(tool_name): tool_result}
+
+    async def _aexecute_fused(self, input_request: dict, tool_calls: list, semaphore: asyncio.Semaphore, logger=None) -> list:
+        query = json.loads(tool_calls[0].function.arguments).get("query", "")
+        tool_names = list(dict.fromkeys(tool_call.function.name for tool_call in tool_calls))
+        cached = await asyncio.gather(*[aretrieve_tool_cache(tool_name, query, logger) for tool_name in tool_names])
+        results = dict(zip(tool_names, cached))
+        missing = [tool_name for tool_name, result in results.items() if result is None]
+
+        if len(missing) > 1:
+            logger.info("Fused Action Names: %s\nAction Input: %s", missing, query)
+            async with semaphore:
+                with span("fused_analysis"):
+                    fused_results = await afused_analysis_tool(query, missing, config=self.config, logger=logger)
+            for tool_name, result in fused_results.items():
+                if result is not None:
+                    results[tool_name] = result
+                    await astore_tool_cache(tool_name, query, result, logger)
+            logger.info("Fused Action Result: %s", results)
+
+        async def resolve(tool_call) -> dict:
+            if results[tool_call.function.name] is not None:
+                return {self._output_key(tool_call.function.name): results[tool_call.function.name]}
+            return await self._aexecute_tool(input_request, tool_call, semaphore, logger)
+
+        return list(await asyncio.gather(*[resolve(tool_call) for tool_call in tool_calls]))
+
+    async def _aexecute_packed(self, input_request: dict, tool_calls: list, semaphore: asyncio.Semaphore, logger=None) -> list:
+        query = json.loads(tool_calls[0].function.arguments).get("query", "")
+        tool_names = list(dict.fromkeys(tool_call.function.name for tool_call in tool_calls))
+        cached = await asyncio.gather(*[aretrieve_tool_cache(tool_name, query, logger) for tool_name in tool_names])
+        results = dict(zip(tool_names, cached))
+        missing = [tool_name for tool_name, result in results.items() if result is None]
+
+        if missing:
+            logger.info("Packed Action Names: %s\nAction Input: %s", missing, query)
+            with span("packed_analysis"):
+                packed_results = await asyncio.wrap_future(packed_batcher.submit(
+                    input_request.get("feedback_id", "N/A"), query, missing, config=self.config, logger=logger
+                ))
+            for tool_name, result in (packed_results or {}).items():
+                if result is not None:
+                    results[tool_name] = result
+                    await astore_tool_cache(tool_name, query, result, logger)
+            logger.info("Packed Action Result: %s", results)
+
+        async def resolve(tool_call) -> dict:
+            if results[tool_call.function.name] is not None:
+                return {self._output_key(tool_call.function.name): results[tool_call.function.name]}
+            return await self._aexecute_tool(input_request, tool_call, semaphore, logger)
+
+        return list(await asyncio.gather(*[resolve(tool_call) for tool_call in tool_calls]))
+
+    async def _aexecute_job(self, input_request: dict, tool_calls: list, semaphore: asyncio.Semaphore, logger=None) -> list:
+        if self.packed and tool_calls[0].function.name in FUSED_SECTIONS:
+            return await self._aexecute_packed(input_request, tool_calls, semaphore, logger)
+        if len(tool_calls) == 1:
+            return [await self._aexecute_tool(input_request, tool_calls[0], semaphore, logger)]
+        return await self._aexecute_fused(input_request, tool_calls, semaphore, logger)
+
+    async def acall(self, input_request: dict, tool_calls: list, logger=None):
+        """
+        Execute the tool calls of one LLM turn. They are independent, so they are gathered on
+        the event loop, at most max_concurrency at a time (one at a time when parallel is off).
+        """
+        try:
+            max_concurrency = self.max_concurrency if self.parallel else 1
+            semaphore = asyncio.Semaphore(max_concurrency)
+            jobs = self._group_tool_calls(tool_calls)
+            job_outputs = await asyncio.gather(*[
+                self._aexecute_job(input_request, [tool_calls[index] for index in job], semaphore, logger)
+                for job in jobs
+            ])
+
+            # Reassemble the output in the same order as the tool calls
+            output = [None] * len(tool_calls)
+            for job, job_output in zip(jobs, job_outputs):
+                for index, entry in zip(job, job_output):
+                    output[index] = entry
             input_request["agent_response"] = output
             return input_request
         except Exception as e:
             logger.error(f"Error in tool executor with error: {e}")
             return {"error": str(e)}
 
-    
+    def __call__(self, input_request: dict, tool_calls: list, logger=None):
+        """Sync version of acall, for the Lambda path."""
+        return run_sync(self.acall(input_request, tool_calls, logger))
+
 
+# Shared by the agents, bound per request
+tool_executor = ToolExecutor()
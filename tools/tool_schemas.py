@@ -35,3 +35,21 @@ class SummarizationTool(BaseModel):
     Useful when to summarize the text.
     """
     query: str
+
+
+# Tool result schemas, the shapes the analysis tools return
+class SentimentResult(BaseModel):
+    positive: float
+    negative: float
+    neutral: float
+
+class TopicResult(BaseModel):
+    category: str
+    score: float
+
+class KeywordResult(BaseModel):
+    keywords: dict[str, float]
+
+class SummaryResult(BaseModel):
+    summary: str
+    recommendations: list[str]
@@ -1,132 +1,184 @@
-from litellm import completion
+from core.llm import achat_completion
+from config import tool_executor_config
+from core.prompts import (
+    SENTIMENT_ANALYSIS_PROMPT, TOPIC_CATEGORIZATION_PROMPT, KEYWORD_CONTEXTUALIZATION_PROMPT, SUMMARIZATION_PROMPT,
+    SECTION_FORMATS, FUSED_ANALYSIS_PROMPT, PACKED_ANALYSIS_PROMPT, REPAIR_PROMPT
+)
+from tools.tool_schemas import SentimentResult, TopicResult, KeywordResult, SummaryResult
+from utils.json_output import extract_json
+from utils.metrics import metrics
+from utils.event_loop import run_sync
+from functools import lru_cache
 import json
 
 
-# Sentiment Analysis Tool
-def sentiment_analysis_tool(query: str, config: dict, logger=None):
-    try:
-        # Prompt
-        prompt = """Analyze the sentiment of the following user feedback and provide a JSON response with sentiment scores for positive, negative, and neutral categories. 
-        
-        NOTE: Ensure the sum of all values equals 1. Do not provide any explanation.  
-
-        Output format:  
-        ```json  
-        {{ "positive": <score>, "negative": <score>, "neutral": <score>}}
-        ```
-
-        Feedback: {user_feedback}
-        """.format(user_feedback=query)
-
-        response = completion(
-            **config, 
-            messages=[
-                {"role": "user", "content": prompt},
-                ]
-        )
+def parse_tool_output(content: str, result_model: type = None):
+    """
+    Parse the JSON returned by a tool completion, validated against the result model when given.
+    Raises ValueError on malformed output.
+    """
+    output = extract_json(content)
+    if result_model is not None:
+        return result_model.model_validate(output).model_dump()
+    return output
 
-        # Parsing and Loading
-        output = response.choices[0].message.content.strip("```json").strip('```')[1:-1]
-        return json.loads(output)
-    except Exception as e:
-        logger.error(f"Error in sentiment analysis tool with error: {e}")
-        return {"error": str(e)}
 
+@lru_cache(maxsize=None)
+def result_schema(result_model: type) -> dict:
+    return result_model.model_json_schema()
 
-# Topic Categorization Tool
-def topic_categorization_tool(query: str, config: dict, logger=None):
-    try:
-        # Prompt
-        prompt = """Categorize the following user feedback into one of the predefined topics: `Product Quality`, `Delivery`, `Support`.
-    
-        NOTE: Select only one category and assign it a confidence score between 0 and 1. 
-        Do not provide any explanation.  
-
-        Output format:  
-        ```json  
-        {{ "category": <Selected Category>, "score": <confidence_score>}}
-        ```"  
-
-        Feedback: {product_info}
-        """.format(product_info=query)
-
-        response = completion(
-            **config, 
-            messages=[
-                {"role": "user", "content": prompt},
-                ]
-        )
 
-        # Parsing and Loading
-        output = response.choices[0].message.content.strip("```json").strip('```')[1:-1]
-        return json.loads(output)
-    except Exception as e:
-        logger.error(f"Error in topic categorization tool with error: {e}")
-        return {"error": str(e)}
+def completion_kwargs(result_model: type = None, array: bool = False) -> dict:
+    """
+    Provider JSON mode of a tool completion. It only returns objects, array outputs are left as text.
+    """
+    mode = tool_executor_config["json_mode"]
+    if mode == "off" or array:
+        return {}
+    if mode == "json_schema" and result_model is not None:
+        return {"response_format": {"type": "json_schema", "json_schema": {"name": result_model.__name__, "schema": result_schema(result_model)}}}
+    return {"response_format": {"type": "json_object"}}
 
 
-# Keyword Contextualization Tool
-def keyword_contextualization_tool(query: str, config: dict, logger=None):
-    try:
-        # Prompt
-        prompt = """Extract context-aware keywords from the following user feedback along with their relevance scores. 
-        
-        NOTE: Provide a JSON response where each keyword is mapped to a relevance score between 0 and 1. 
-        Do not provide any explanation. 
-
-        Output format:  
-        ```json  
-        {{ "keywords": {{ "<keyword1>": <score>, "<keyword2>": <score>, "<keyword3>": <score> }}}}
-        ```"  
-
-        Feedback: {user_feedback}
-        """.format(user_feedback=query)
-
-        response = completion(
-            **config, 
-            messages=[
-                {"role": "user", "content": prompt},
-                ]
-        )
+def repair_messages(content: str, error: Exception, result_model: type = None) -> list:
+    expected = f" matching this JSON schema: {json.dumps(result_schema(result_model))}" if result_model else ""
+    return REPAIR_PROMPT.messages(error=str(error)[:300], expected=expected, output=content)
 
-        # Parsing and Loading
-        output = response.choices[0].message.content.strip("```json").strip('```')[1:-1]
-        return json.loads(output)
-    except Exception as e:
-        logger.error(f"Error in keyword contextualization tool with error: {e}")
-        return {"error": str(e)}
 
+def repairable(tool_name: str, content: str, error: Exception, logger=None) -> bool:
+    # The completion was paid for: a short repair call is cheaper than running the tool again
+    metrics.inc("tool_output_parse_failures_total", tool=tool_name)
+    logger.warning(f"Malformed output of {tool_name} tool with error: {error}")
+    return bool(tool_executor_config["json_repair"] and content and len(content) <= tool_executor_config["json_repair_max_chars"])
 
-# Summarization Tool
-def summarization_tool(query: str, config: dict, logger=None):
+
+async def arun_tool(tool_name: str, messages: list, config: dict, logger=None, result_model: type = None, array: bool = False):
     try:
-        # Prompt
-        prompt = """Summarize the following user feedback concisely and provide actionable recommendations. 
-        
-        NOTE: Ensure the summary captures the core message, and the recommendations are practical and relevant. 
-        Do not provide any explanation.  
-
-        Output format:  
-        ```json  
-        {{  
-        "summary": "<short concise summary>",  
-        "recommendations": ["<short actionable recommendation 1>", "<short actionable recommendation 2>"]  
-        }}  
-        ```"  
-
-        Feedback: {user_feedback}
-        """.format(user_feedback=query)
-
-        response = completion(
-            **config, 
-            messages=[
-                {"role": "user", "content": prompt},
-                ]
+        kwargs = completion_kwargs(result_model, array)
+        response = await achat_completion(
+            config,
+            messages=messages,
+            logger=logger,
+            **kwargs
         )
 
         # Parsing and Loading
-        output = response.choices[0].message.content.strip("```json").strip('```')[1:-1]
-        return json.loads(output)
+        content = response.choices[0].message.content
+        try:
+            return parse_tool_output(content, result_model)
+        except ValueError as e:
+            if not repairable(tool_name, content, e, logger):
+                raise
+            error = e
+
+        response = await achat_completion(
+            config,
+            messages=repair_messages(content, error, result_model),
+            logger=logger,
+            **kwargs
+        )
+        try:
+            result = parse_tool_output(response.choices[0].message.content, result_model)
+        except ValueError:
+            metrics.inc("tool_output_repairs_total", tool=tool_name, outcome="failed")
+            raise
+        metrics.inc("tool_output_repairs_total", tool=tool_name, outcome="ok")
+        return result
     except Exception as e:
-        logger.error(f"Error in summarization tool with error: {e}")
+        logger.error(f"Error in {tool_name} tool with error: {e}")
         return {"error": str(e)}
+
+
+# Sentiment Analysis Tool
+async def asentiment_analysis_tool(query: str, config: dict, logger=None):
+    return await arun_tool("sentiment analysis", SENTIMENT_ANALYSIS_PROMPT.messages(user_feedback=query), config, logger, SentimentResult)
+
+
+# Topic Categorization Tool
+async def atopic_categorization_tool(query: str, config: dict, logger=None):
+    return await arun_tool("topic categorization", TOPIC_CATEGORIZATION_PROMPT.messages(user_feedback=query), config, logger, TopicResult)
+
+
+# Keyword Contextualization Tool
+async def akeyword_contextualization_tool(query: str, config: dict, logger=None):
+    return await arun_tool("keyword contextualization", KEYWORD_CONTEXTUALIZATION_PROMPT.messages(user_feedback=query), config, logger, KeywordResult)
+
+
+# Summarization Tool
+async def asummarization_tool(query: str, config: dict, logger=None):
+    return await arun_tool("summarization", SUMMARIZATION_PROMPT.messages(user_feedback=query), config, logger, SummaryResult)
+
+
+# Fused Analysis Tool
+# Section name in the fused response and the result schema of each tool
+FUSED_SECTIONS = {
+    "SentimentAnalysisTool": ("sentiment", SentimentResult),
+    "TopicCategorizationTool": ("topic", TopicResult),
+    "KeywordContextualizationTool": ("keywords", KeywordResult),
+    "SummarizationTool": ("summary", SummaryResult)
+}
+
+def fused_analysis_messages(query: str, tool_names: list) -> list:
+    sections = [FUSED_SECTIONS[tool_name][0] for tool_name in tool_names]
+    return FUSED_ANALYSIS_PROMPT.messages(
+        sections="\n".join(SECTION_FORMATS[section] for section in sections),
+        section_names=", ".join(f'"{section}": <{section} result>' for section in sections),
+        user_feedback=query
+    )
+
+
+def split_fused_output(output: dict, tool_names: list) -> dict:
+    """
+    Split a fused response into per-tool results with the same shapes the individual tools return.
+    Missing or malformed sections map to None so the caller can fall back to the individual tool.
+    """
+    results = {}
+    for tool_name in tool_names:
+        section, result_model = FUSED_SECTIONS[tool_name]
+        try:
+            results[tool_name] = result_model.model_validate(output.get(section) if isinstance(output, dict) else None).model_dump()
+        except ValueError:
+            results[tool_name] = None
+    return results
+
+
+async def afused_analysis_tool(query: str, tool_names: list, config: dict, logger=None) -> dict:
+    output = await arun_tool("fused analysis", fused_analysis_messages(query, tool_names), config, logger)
+    return split_fused_output(output, tool_names)
+
+
+# Packed Analysis Tool
+def packed_analysis_messages(items: dict, tool_names: list) -> list:
+    sections = [FUSED_SECTIONS[tool_name][0] for tool_name in tool_names]
+    return PACKED_ANALYSIS_PROMPT.messages(
+        sections="\n".join(SECTION_FORMATS[section] for section in sections),
+        section_names=", ".join(f'"{section}": <{section} result>' for section in sections),
+        items="\n".join(json.dumps({"id": item_id, "feedback": query}) for item_id, query in items.items())
+    )
+
+
+def split_packed_output(output, items: dict, tool_names: list) -> dict:
+    """
+    Split a packed response into per-item, per-tool results.
+    Items missing from the response map to None so the caller can fall back to the single-record path.
+    """
+    by_id = {}
+    if isinstance(output, list):
+        by_id = {str(entry.get("id")): entry for entry in output if isinstance(entry, dict)}
+    return {
+        item_id: split_fused_output(by_id[item_id], tool_names) if item_id in by_id else None
+        for item_id in items
+    }
+
+
+async def apacked_analysis_tool(items: dict, tool_names: list, config: dict, logger=None) -> dict:
+    """
+    Run the analysis tools for several feedback texts (item id -> text) with one completion.
+    """
+    output = await arun_tool("packed analysis", packed_analysis_messages(items, tool_names), config, logger, array=True)
+    return split_packed_output(output, items, tool_names)
+
+
+def packed_analysis_tool(items: dict, tool_names: list, config: dict, logger=None) -> dict:
+    """Sync version of apacked_analysis_tool, called by the packed batcher threads."""
+    return run_sync(apacked_analysis_tool(items, tool_names, config, logger))
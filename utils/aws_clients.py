@@ -0,0 +1,54 @@
+import threading
+import boto3
+from botocore.config import Config
+from config import aws_config
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _client_config() -> Config:
+    return Config(
+        max_pool_connections=aws_config["max_pool_connections"],
+        connect_timeout=aws_config["connect_timeout"],
+        read_timeout=aws_config["read_timeout"],
+        tcp_keepalive=True,
+        retries={
+            "max_attempts": aws_config["max_attempts"],
+            "mode": aws_config["retry_mode"]
+        }
+    )
+
+
+def get_client(service_name: str):
+    """Return the shared boto3 client for a service.
+
+    Clients are created once per process (once per Lambda container) and reused,
+    so credential resolution and TLS connections are paid only on the first call.
+    boto3 clients are thread safe once created, creation itself is guarded by a lock.
+
+    Args:
+        service_name (str): The AWS service name, e.g. "dynamodb".
+
+    Returns:
+        botocore.client.BaseClient: The shared client.
+    """
+    client = _clients.get(service_name)
+    if client is None:
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                session = boto3.session.Session()
+                client = session.client(
+                    service_name,
+                    region_name=aws_config["region_name"],
+                    config=_client_config()
+                )
+                _clients[service_name] = client
+    return client
+
+
+def warm_clients(service_names: tuple = ("dynamodb", "bedrock-runtime")) -> None:
+    """Create the clients up front, e.g. at startup or Lambda cold start."""
+    for service_name in service_names:
+        get_client(service_name)
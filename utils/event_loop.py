@@ -0,0 +1,72 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import aws_config
+
+# The event loop every coroutine started from synchronous code runs on
+_loop = None
+_lock = threading.Lock()
+
+
+def install_executor(loop: asyncio.AbstractEventLoop = None) -> ThreadPoolExecutor:
+    """Set the default executor of the event loop to a thread pool sized to the boto3 connection pool.
+
+    The async wrappers run the blocking boto3 calls with asyncio.to_thread, on the default
+    executor. Left unsized it has min(32, cpu + 4) threads, which caps the concurrent DynamoDB
+    and guardrail calls far below the connection pool.
+
+    Args:
+        loop (asyncio.AbstractEventLoop): The event loop, defaults to the running loop.
+
+    Returns:
+        ThreadPoolExecutor: The installed executor.
+    """
+    executor = ThreadPoolExecutor(max_workers=aws_config["executor_workers"], thread_name_prefix="blocking-io")
+    (loop or asyncio.get_running_loop()).set_default_executor(executor)
+    return executor
+
+
+def set_loop(loop: asyncio.AbstractEventLoop = None) -> None:
+    """
+    Register the application event loop (FastAPI lifespan), run_sync then runs its coroutines
+    there. None unregisters it.
+    """
+    global _loop
+    with _lock:
+        _loop = loop
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    # The registered loop, or a background loop started on first use (Lambda)
+    global _loop
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            install_executor(_loop)
+            threading.Thread(target=_loop.run_forever, name="event-loop", daemon=True).start()
+        return _loop
+
+
+def run_sync(coroutine):
+    """Run a coroutine from synchronous code and wait for its result.
+
+    The pipeline is implemented once, async; the synchronous entry points (Lambda handler,
+    thread pool workers) are thin adapters over it. Every coroutine runs on one event loop per
+    process: litellm caches its async clients per process, they must not be shared between loops.
+    The context variables of the caller (e.g. the batch flag) are handed over to the coroutine.
+
+    Args:
+        coroutine: The coroutine to run.
+
+    Returns:
+        The result of the coroutine, its exception is raised to the caller.
+    """
+    loop = _get_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coroutine.close()
+        raise RuntimeError("run_sync() would block its own event loop, await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
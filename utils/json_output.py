@@ -0,0 +1,82 @@
+import json
+import re
+
+# ```json ... ``` (or a bare ```) fenced block
+FENCED_BLOCK = re.compile(r"```(?:json)?\s*(.*?)```", re.S | re.I)
+
+# Cheap fixes for the usual LLM slips: trailing commas, typographic quotes, Python literals
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+SMART_QUOTES = str.maketrans({"\u201c": '"', "\u201d": '"', "\u2018": "'", "\u2019": "'"})
+PYTHON_LITERALS = re.compile(r"(?<![\w\"])(True|False|None)(?![\w\"])")
+LITERALS = {"True": "true", "False": "false", "None": "null"}
+# Double quoted string literal, the repairs leave its content untouched
+STRING_LITERAL = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+
+_decoder = json.JSONDecoder()
+
+
+def _scan(text: str):
+    """
+    Decode the first JSON object or array in the text, skipping any prose around it.
+    raw_decode stops at the end of the value, so trailing text does not matter.
+    """
+    index = 0
+    while True:
+        starts = [position for position in (text.find("{", index), text.find("[", index)) if position != -1]
+        if not starts:
+            return None
+        start = min(starts)
+        try:
+            value, _ = _decoder.raw_decode(text, start)
+            return value
+        except json.JSONDecodeError:
+            index = start + 1
+
+
+def _repair_tokens(text: str) -> str:
+    text = TRAILING_COMMA.sub(r"\1", text)
+    return PYTHON_LITERALS.sub(lambda match: LITERALS[match.group(1)], text)
+
+
+def _repair(text: str) -> str:
+    # Trailing commas and Python literals are only fixed outside the string literals
+    text = text.translate(SMART_QUOTES)
+    parts, position = [], 0
+    for match in STRING_LITERAL.finditer(text):
+        parts.append(_repair_tokens(text[position:match.start()]))
+        parts.append(match.group(0))
+        position = match.end()
+    parts.append(_repair_tokens(text[position:]))
+    return "".join(parts)
+
+
+def extract_json(text: str):
+    """Extract the JSON value from an LLM completion.
+
+    Tries the whole text, then the fenced block, then the first object or array found in
+    the text, each one again after the cheap repairs.
+
+    Args:
+        text (str): The completion content.
+
+    Returns:
+        dict | list: The decoded value.
+
+    Raises:
+        ValueError: When no JSON value can be decoded.
+    """
+    text = (text or "").strip()
+    if not text:
+        raise ValueError("Empty output")
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+
+    candidates = [match.group(1).strip() for match in FENCED_BLOCK.finditer(text)] + [text]
+    for repair in (False, True):
+        for candidate in candidates:
+            value = _scan(_repair(candidate) if repair else candidate)
+            if value is not None:
+                return value
+    raise ValueError(f"No JSON value found in output: {text[:200]}")
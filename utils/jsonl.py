@@ -0,0 +1,41 @@
+import json
+
+
+def iter_jsonl_file(path: str):
+    """Lazily yield the non-empty lines of a JSONL file.
+
+    Args:
+        path (str): Path of the JSONL file.
+
+    Yields:
+        str: One JSON document per line, parsing is left to the consumer so a bad line only fails its own record.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield line
+
+
+def iter_lines(data: bytes):
+    """Lazily yield the non-empty lines of a JSONL body without building a list of records.
+
+    Args:
+        data (bytes): The raw JSONL body.
+
+    Yields:
+        bytes: One line at a time, without the trailing newline.
+    """
+    start = 0
+    while start < len(data):
+        end = data.find(b"\n", start)
+        if end == -1:
+            end = len(data)
+        line = data[start:end]
+        if line.strip():
+            yield line
+        start = end + 1
+
+
+def to_ndjson(index: int, result) -> str:
+    """Serialize one record result as an NDJSON line."""
+    return json.dumps({"index": index, "result": result}, default=str) + "\n"
@@ -0,0 +1,202 @@
+import contextvars
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from config import metrics_config
+
+# Latency buckets (seconds), from cache lookups to long LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Span durations of the current request, set per invocation on Lambda for the EMF record
+request_spans = contextvars.ContextVar("request_spans", default=None)
+
+
+def _escape_label(value) -> str:
+    # Label value escaping of the Prometheus text format
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """
+    This class aggregates counters and histograms in process and renders them in the
+    Prometheus text format. Labels are passed as keyword arguments.
+    """
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self._counters = {}     # (name, labels) -> value
+        self._histograms = {}   # (name, labels) -> [bucket counts, sum, count]
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @staticmethod
+    def _labels(labels: tuple, extra: tuple = ()) -> str:
+        pairs = [f'{key}="{_escape_label(value)}"' for key, value in labels + extra]
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> str:
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: ([*value[0]], value[1], value[2]) for key, value in self._histograms.items()}
+
+        lines = []
+        for metric_type, series in (("counter", counters), ("histogram", histograms)):
+            for name in sorted({name for name, _ in series}):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for (series_name, labels), value in sorted(series.items(), key=lambda item: str(item[0])):
+                    if series_name != name:
+                        continue
+                    if metric_type == "counter":
+                        lines.append(f"{name}{self._labels(labels)} {value}")
+                        continue
+                    bucket_counts, total, count = value
+                    for bound, bucket_count in zip(self.buckets, bucket_counts):
+                        lines.append(f"{name}_bucket{self._labels(labels, (('le', bound),))} {bucket_count}")
+                    lines.append(f"{name}_bucket{self._labels(labels, (('le', '+Inf'),))} {count}")
+                    lines.append(f"{name}_sum{self._labels(labels)} {total}")
+                    lines.append(f"{name}_count{self._labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+metrics.describe("stage_duration_seconds", "Duration of each request stage")
+metrics.describe("llm_request_duration_seconds", "Duration of each LLM call")
+metrics.describe("llm_tokens_total", "LLM tokens by model and type")
+metrics.describe("llm_cost_total", "Estimated LLM cost by model")
+metrics.describe("llm_retries_total", "Retried LLM calls")
+metrics.describe("llm_hedges_total", "Hedged LLM calls")
+metrics.describe("cache_requests_total", "Cache lookups by tier and outcome")
+metrics.describe("tool_output_parse_failures_total", "Tool completions with malformed output")
+metrics.describe("tool_output_repairs_total", "Repair completions by outcome")
+
+
+@contextmanager
+def span(stage: str, **labels):
+    """Time a stage into stage_duration_seconds (and the request spans on Lambda)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        metrics.observe("stage_duration_seconds", duration, stage=stage, **labels)
+        spans = request_spans.get()
+        if spans is not None:
+            spans.append((stage, duration))
+
+
+class RequestTimingMiddleware:
+    """
+    ASGI middleware timing every HTTP request into stage_duration_seconds, until the last
+    body chunk is sent so streamed responses are timed in full. Requests are labelled by
+    route template (not the raw path, which holds job ids).
+    """
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        timed = False
+
+        def observe() -> None:
+            nonlocal timed
+            if timed:
+                return
+            timed = True
+            route = scope.get("route")
+            metrics.observe("stage_duration_seconds", time.perf_counter() - start,
+                            stage="request", route=getattr(route, "path", "unmatched"))
+
+        async def timed_send(message) -> None:
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                observe()
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            # Failed or disconnected requests never send the last chunk
+            observe()
+
+
+def record_llm_call(model: str, deployment: int, latency: float, outcome: str, usage=None) -> None:
+    """Record the latency, tokens and estimated cost of one LLM call."""
+    metrics.observe("llm_request_duration_seconds", latency, model=model, deployment=deployment, outcome=outcome)
+    spans = request_spans.get()
+    if spans is not None:
+        spans.append(("llm", latency))
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    metrics.inc("llm_tokens_total", prompt_tokens, model=model, type="prompt")
+    metrics.inc("llm_tokens_total", completion_tokens, model=model, type="completion")
+    cost = (
+        prompt_tokens / 1000 * metrics_config["prompt_cost_per_1k"]
+        + completion_tokens / 1000 * metrics_config["completion_cost_per_1k"]
+    )
+    if cost:
+        metrics.inc("llm_cost_total", cost, model=model)
+
+
+# CloudWatch accepts at most 100 values per metric in one EMF record
+EMF_MAX_VALUES = 100
+
+
+def emit_emf(spans: list, route: str) -> None:
+    """
+    Write the stage durations of one invocation as CloudWatch embedded metric format records.
+    Lambda ships stdout to CloudWatch Logs, which extracts the metrics. A stage with more than
+    EMF_MAX_VALUES durations (e.g. the LLM calls of a large batch) is split over several records.
+    """
+    if not spans:
+        return
+    values = {}
+    for stage, duration in spans:
+        values.setdefault(stage, []).append(round(duration * 1000, 3))
+    timestamp = int(time.time() * 1000)
+    lines = []
+    for offset in range(0, max(len(durations) for durations in values.values()), EMF_MAX_VALUES):
+        chunk = {
+            stage: durations[offset:offset + EMF_MAX_VALUES]
+            for stage, durations in values.items() if len(durations) > offset
+        }
+        record = {
+            "_aws": {
+                "Timestamp": timestamp,
+                "CloudWatchMetrics": [{
+                    "Namespace": metrics_config["namespace"],
+                    "Dimensions": [["Route"]],
+                    "Metrics": [{"Name": stage, "Unit": "Milliseconds"} for stage in chunk]
+                }]
+            },
+            "Route": route,
+            **{stage: durations[0] if len(durations) == 1 else durations for stage, durations in chunk.items()}
+        }
+        lines.append(json.dumps(record) + "\n")
+    sys.stdout.write("".join(lines))
+    sys.stdout.flush()
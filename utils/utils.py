@@ -24,3 +24,8 @@ def generate_function_schema(base_model: BaseModel):
         }
     except Exception as e:
         return {"error": str(e)}
+
+
+def estimate_tokens(text: str) -> int:
+    # Rough estimate, ~4 characters per token for English text
+    return len(text or "") // 4 + 1